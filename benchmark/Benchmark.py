@@ -0,0 +1,277 @@
+import contextlib
+import getopt
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+
+from benchmark.WorldGenerator import WorldGenerator
+from common.Metrics import Metrics
+from common.ymap.EntityTable import EntityTable
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
+from worker.EntropyCreator import EntropyCreator
+from worker.clustering.Clustering import Clustering
+from worker.lod_map_creator.LodMapCreator import LodMapCreator
+from worker.reducer.Reducer import Reducer
+from worker.sanitizer.Sanitizer import Sanitizer
+from worker.static_col_creator.StaticCollisionCreator import StaticCollisionCreator
+from worker.statistics.StatisticsPrinter import StatisticsPrinter
+from worker.vegetation_creator.VegetationCreator import VegetationCreator
+
+
+class Benchmark:
+    # Generates synthetic worlds (see WorldGenerator) and runs the stages of main.py on them in the same order as main.py does,
+    # i.e. every stage processes the output of the previous one. Every stage runs in its own process so that its peak RSS
+    # can be measured. The results are written as JSON to be able to compare them across commits (see compare).
+
+    VERSION = 1
+
+    STAGES = ["vegetationCreator", "entropy", "reducer", "clustering", "sanitizer", "lodMap", "staticCol", "statistics"]
+    # vegetation creator and reducer are skipped by default since they change the number of entities considerably
+    DEFAULT_STAGES = ["entropy", "clustering", "sanitizer", "lodMap", "staticCol", "statistics"]
+    DEFAULT_NUM_ENTITIES = [1000, 10000, 100000]
+
+    PREFIX = "benchmark"
+
+    @staticmethod
+    def createWorker(stage: str, inputDir: str, outputDir: str, resourcesDir: str, jobs: int) -> Any:
+        ytypItems = ArchetypeRegistry.readDirectory(os.path.join(resourcesDir, "ytyp"))
+
+        if stage == "vegetationCreator":
+            return VegetationCreator(inputDir, outputDir, Benchmark.PREFIX)
+        elif stage == "entropy":
+            return EntropyCreator(inputDir, outputDir, False, True, False, True, ytypItems, jobs)
+        elif stage == "reducer":
+            return Reducer(inputDir, outputDir, Benchmark.PREFIX, None, False, ytypItems, jobs)
+        elif stage == "clustering":
+            return Clustering(inputDir, outputDir, Benchmark.PREFIX, None, None, None, None, ytypItems, jobs)
+        elif stage == "sanitizer":
+            return Sanitizer(inputDir, outputDir, ytypItems, jobs)
+        elif stage == "lodMap":
+            return LodMapCreator(inputDir, outputDir, Benchmark.PREFIX, False, False, ytypItems, jobs)
+        elif stage == "staticCol":
+            return StaticCollisionCreator(inputDir, outputDir, jobs, None, os.path.join(resourcesDir, "models"))
+        elif stage == "statistics":
+            return StatisticsPrinter(inputDir, ytypItems)
+        else:
+            raise ValueError("Unknown stage " + stage)
+
+    @staticmethod
+    def getNextInputDir(stage: str, worker: Any) -> Optional[str]:
+        if stage == "lodMap":
+            return worker.getOutputDirMaps(False)
+        elif stage == "staticCol":
+            return worker.getOutputDirMaps()
+        elif stage == "statistics":
+            return None
+        else:
+            return worker.outputDir
+
+    @staticmethod
+    def _runStage(stage: str, inputDir: str, outputDir: str, resourcesDir: str, jobs: int, logPath: str, connection):
+        from matplotlib import pyplot
+        pyplot.switch_backend("Agg")
+
+        worker = Benchmark.createWorker(stage, inputDir, outputDir, resourcesDir, jobs)
+
+        log = open(logPath, 'w')
+        with contextlib.redirect_stdout(log):
+            startWallTime = time.perf_counter()
+            startCpuTime = time.process_time()
+            worker.run()
+            wallTime = time.perf_counter() - startWallTime
+            cpuTime = time.process_time() - startCpuTime
+        log.close()
+
+        connection.send({
+            "wallTime": wallTime,
+            "cpuTime": cpuTime,
+            "peakRss": Metrics.getPeakRss(),
+            "peakRssPool": Metrics.getPeakRss(True),
+            "nextInputDir": Benchmark.getNextInputDir(stage, worker)
+        })
+        connection.close()
+
+    @staticmethod
+    def runStage(stage: str, inputDir: str, outputDir: str, resourcesDir: str, jobs: int) -> dict:
+        receiver, sender = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(target=Benchmark._runStage, args=(stage, inputDir, outputDir, resourcesDir, jobs, outputDir + ".log", sender))
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+        process.join()
+
+        if result is None or process.exitcode != 0:
+            raise RuntimeError("Stage " + stage + " failed (exit code " + str(process.exitcode) + "), see " + outputDir + ".log")
+
+        return result
+
+    @staticmethod
+    def countEntities(inputDir: str) -> int:
+        return len(EntityTable.readDirectory(inputDir))
+
+    @staticmethod
+    def run(numEntities: int, stages: list[str], workDir: str, jobs: int, seed: int) -> dict:
+        worldDir = os.path.join(workDir, str(numEntities))
+        generator = WorldGenerator(os.path.join(worldDir, "world"), numEntities, seed=seed)
+        generator.run()
+
+        resourcesDir = os.path.join(generator.outputDir, "resources")
+        inputDir = generator.getOutputDirMaps()
+
+        results = []
+        for stage in stages:
+            entities = Benchmark.countEntities(inputDir)
+            print("\t" + stage + " on " + str(entities) + " entities")
+
+            result = Benchmark.runStage(stage, inputDir, os.path.join(worldDir, stage), resourcesDir, jobs)
+
+            wallTime = result["wallTime"]
+            results.append({
+                "stage": stage,
+                "entities": entities,
+                "wallTime": wallTime,
+                "cpuTime": result["cpuTime"],
+                "peakRss": result["peakRss"],
+                "peakRssPool": result["peakRssPool"],
+                "entitiesPerSecond": entities / wallTime if wallTime > 0 else None
+            })
+            print("\t\t" + "{:.3f}".format(wallTime) + " s, " + Benchmark.formatBytes(result["peakRss"]) + " peak RSS")
+
+            if result["nextInputDir"] is not None:
+                inputDir = result["nextInputDir"]
+
+        return {
+            "numEntities": numEntities,
+            "numMaps": generator.numMaps,
+            "stages": results
+        }
+
+    @staticmethod
+    def formatBytes(numBytes: Optional[int]) -> str:
+        if numBytes is None:
+            return "unknown"
+        return "{:.1f}".format(numBytes / (1024 * 1024)) + " MiB"
+
+    @staticmethod
+    def getCommit() -> Optional[str]:
+        try:
+            return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def compare(baseline: dict, current: dict):
+        print("comparison to baseline of commit " + str(baseline.get("commit")) + " (wall time, negative is faster):")
+        baselineStages = {}
+        for run in baseline["runs"]:
+            for stage in run["stages"]:
+                baselineStages[(run["numEntities"], stage["stage"])] = stage
+
+        for run in current["runs"]:
+            for stage in run["stages"]:
+                baselineStage = baselineStages.get((run["numEntities"], stage["stage"]))
+                if baselineStage is None or baselineStage["wallTime"] <= 0:
+                    continue
+
+                change = stage["wallTime"] / baselineStage["wallTime"] - 1
+                print("\t" + str(run["numEntities"]) + " entities, " + stage["stage"] + ": " + "{:+.1%}".format(change))
+
+
+def main(argv):
+    numEntities = Benchmark.DEFAULT_NUM_ENTITIES
+    stages = Benchmark.DEFAULT_STAGES
+    workDir = None
+    outputFile = "benchmark.json"
+    compareFile = None
+    jobs = 1
+    seed = 0
+
+    usageMsg = "python -m benchmark --numEntities=<comma-separated list of integers (default " + ",".join(map(str, Benchmark.DEFAULT_NUM_ENTITIES)) + ")> " \
+               "--stages=<comma-separated list of " + ",".join(Benchmark.STAGES) + "> --workDir=<directory (default temporary directory)> " \
+               "--output=<JSON file (default benchmark.json)> --compare=<JSON file of a previous run> --jobs=<integer (default 1)> --seed=<integer (default 0)>"
+
+    try:
+        opts, args = getopt.getopt(argv, "h?", ["help", "numEntities=", "stages=", "workDir=", "output=", "compare=", "jobs=", "seed="])
+    except getopt.GetoptError:
+        print("ERROR: Unknown argument. Please see below for usage.")
+        print(usageMsg)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ('-h', '-?', '--help'):
+            print(usageMsg)
+            sys.exit(0)
+        elif opt == "--numEntities":
+            numEntities = list(map(int, arg.split(',')))
+            if min(numEntities) <= 0:
+                print("ERROR: numEntities must be positive")
+                sys.exit(2)
+        elif opt == "--stages":
+            stages = list(map(str.strip, arg.split(',')))
+            for stage in stages:
+                if stage not in Benchmark.STAGES:
+                    print("ERROR: Unknown stage " + stage)
+                    sys.exit(2)
+        elif opt == "--workDir":
+            workDir = os.path.abspath(arg)
+        elif opt == "--output":
+            outputFile = arg
+        elif opt == "--compare":
+            compareFile = arg
+        elif opt == "--jobs":
+            jobs = int(arg)
+            if jobs <= 0:
+                print("ERROR: jobs must be positive")
+                sys.exit(2)
+        elif opt == "--seed":
+            seed = int(arg)
+
+    removeWorkDir = workDir is None
+    if workDir is None:
+        workDir = tempfile.mkdtemp(prefix="gta5-modding-utils-benchmark-")
+    elif os.path.exists(workDir):
+        print("ERROR: workDir " + workDir + " must not exist")
+        sys.exit(2)
+
+    baseline = {
+        "version": Benchmark.VERSION,
+        "commit": Benchmark.getCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "jobs": jobs,
+        "seed": seed,
+        "runs": []
+    }
+
+    try:
+        for n in numEntities:
+            baseline["runs"].append(Benchmark.run(n, stages, workDir, jobs, seed))
+    finally:
+        if removeWorkDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    f = open(outputFile, 'w')
+    json.dump(baseline, f, indent=2)
+    f.write("\n")
+    f.close()
+    print("written results to " + outputFile)
+
+    if compareFile is not None:
+        f = open(compareFile, 'r')
+        Benchmark.compare(json.load(f), baseline)
+        f.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
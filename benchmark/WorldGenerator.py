@@ -0,0 +1,255 @@
+import math
+import os
+from typing import Optional
+
+import numpy as np
+from natsort import natsorted
+
+from common.Util import Util
+from worker.lod_map_creator.LodMapCreator import LodMapCreator
+from worker.vegetation_creator.VegetationCreator import VegetationCreator
+
+
+class WorldGenerator:
+    # Generates a synthetic project: ymap files (in maps) consisting of forest patches of the archetypes known to
+    # LodMapCreator and VegetationCreator as well as stub resources for these archetypes, i.e. a ytyp file (in resources/ytyp)
+    # and a collision model for every archetype (in resources/models). The result only depends on the given parameters.
+
+    ENTITIES_PER_MAP = 5000
+    ENTITIES_PER_PATCH = 500
+    AREA_PER_ENTITY = 150  # in square meters
+    PROBABILITY_ARCHETYPE_OF_PATCH = 0.8
+    PROBABILITY_IDENTITY_ROTATION = 0.3
+    PROBABILITY_IDENTITY_SCALE = 0.4
+    MAX_TILT = math.radians(5)
+
+    outputDir: str
+    numEntities: int
+    numMaps: int
+    seed: int
+
+    contentTemplateMap: str
+    contentTemplateEntity: str
+    contentTemplateYtyp: str
+    contentTemplateYtypItem: str
+    contentTemplateBound: str
+
+    def __init__(self, outputDir: str, numEntities: int, numMaps: Optional[int] = None, seed: int = 0):
+        self.outputDir = outputDir
+        self.numEntities = numEntities
+        self.numMaps = max(1, math.ceil(numEntities / WorldGenerator.ENTITIES_PER_MAP)) if numMaps is None else numMaps
+        self.seed = seed
+
+    def getOutputDirMaps(self) -> str:
+        return os.path.join(self.outputDir, "maps")
+
+    def getOutputDirYtyp(self) -> str:
+        return os.path.join(self.outputDir, "resources", "ytyp")
+
+    def getOutputDirModels(self) -> str:
+        return os.path.join(self.outputDir, "resources", "models")
+
+    def run(self):
+        print("generating synthetic world of " + str(self.numEntities) + " entities in " + str(self.numMaps) + " ymap files...")
+        self.readTemplates()
+        self.createOutputDirs()
+
+        archetypes = WorldGenerator.getArchetypes()
+        patchArchetypes = WorldGenerator.getPatchArchetypes(archetypes)
+        rng = np.random.default_rng(self.seed)
+
+        boundingBoxes = self.createResources(archetypes, rng)
+        self.createMaps(archetypes, patchArchetypes, boundingBoxes, rng)
+        print("generating synthetic world DONE")
+
+    def readTemplates(self):
+        templatesDir = os.path.join(os.path.dirname(__file__), "templates")
+
+        f = open(os.path.join(templatesDir, "template.ymap.xml"), 'r')
+        self.contentTemplateMap = f.read()
+        f.close()
+
+        f = open(os.path.join(templatesDir, "template_entity.ymap.xml"), 'r')
+        self.contentTemplateEntity = f.read()
+        f.close()
+
+        f = open(os.path.join(templatesDir, "template.ytyp.xml"), 'r')
+        self.contentTemplateYtyp = f.read()
+        f.close()
+
+        f = open(os.path.join(templatesDir, "template_ytyp_item.xml"), 'r')
+        self.contentTemplateYtypItem = f.read()
+        f.close()
+
+        f = open(os.path.join(templatesDir, "template.bound"), 'r')
+        self.contentTemplateBound = f.read()
+        f.close()
+
+    def createOutputDirs(self):
+        if os.path.exists(self.outputDir):
+            raise ValueError("Output dir " + self.outputDir + " must not exist")
+
+        os.makedirs(self.getOutputDirMaps())
+        os.makedirs(self.getOutputDirYtyp())
+        os.makedirs(self.getOutputDirModels())
+
+    @staticmethod
+    def getArchetypes() -> list[str]:
+        lodMapCreator = LodMapCreator("", "", "benchmark", False, False)
+        lodMapCreator.prepareLodCandidates()
+
+        archetypes = set(lodMapCreator.lodCandidates.keys())
+        for groups in VegetationCreator.GROUPS:
+            for group in groups:
+                archetypes |= group
+
+        return natsorted(archetypes)
+
+    @staticmethod
+    def getPatchArchetypes(archetypes: list[str]) -> list[list[int]]:
+        # every patch mostly consists of the archetypes of one group of VegetationCreator
+        patchArchetypes = []
+        for groups in VegetationCreator.GROUPS:
+            for group in groups:
+                patchArchetypes.append([archetypes.index(archetype) for archetype in natsorted(group)])
+
+        return patchArchetypes
+
+    def createResources(self, archetypes: list[str], rng: np.random.Generator) -> np.ndarray:
+        numArchetypes = len(archetypes)
+        radii = rng.uniform(1, 8, numArchetypes)
+        heights = rng.uniform(2, 35, numArchetypes)
+        offsetsZ = rng.uniform(-1, 0, numArchetypes)
+
+        boundingBoxes = np.empty((numArchetypes, 2, 3))
+        boundingBoxes[:, 0] = np.column_stack((-radii, -radii, offsetsZ))
+        boundingBoxes[:, 1] = np.column_stack((radii, radii, offsetsZ + heights))
+
+        contentItems = ""
+        for i in range(numArchetypes):
+            bboxMin, bboxMax = boundingBoxes[i]
+            center = (bboxMin + bboxMax) / 2
+            radius = np.linalg.norm(bboxMax - bboxMin) / 2
+            contentItems += self.contentTemplateYtypItem \
+                .replace("${NAME}", archetypes[i]) \
+                .replace("${LOD_DISTANCE}", Util.floatToStr(Util.MIN_LOD_DISTANCE + 10 * heights[i])) \
+                .replace("${BBOX.MIN.X}", Util.floatToStr(bboxMin[0])) \
+                .replace("${BBOX.MIN.Y}", Util.floatToStr(bboxMin[1])) \
+                .replace("${BBOX.MIN.Z}", Util.floatToStr(bboxMin[2])) \
+                .replace("${BBOX.MAX.X}", Util.floatToStr(bboxMax[0])) \
+                .replace("${BBOX.MAX.Y}", Util.floatToStr(bboxMax[1])) \
+                .replace("${BBOX.MAX.Z}", Util.floatToStr(bboxMax[2])) \
+                .replace("${BSPHERE.CENTER.X}", Util.floatToStr(center[0])) \
+                .replace("${BSPHERE.CENTER.Y}", Util.floatToStr(center[1])) \
+                .replace("${BSPHERE.CENTER.Z}", Util.floatToStr(center[2])) \
+                .replace("${BSPHERE.RADIUS}", Util.floatToStr(radius))
+
+            # collision model of the trunk
+            trunkMax = [bboxMax[0] / 5, bboxMax[1] / 5, bboxMax[2]]
+            trunkMin = [bboxMin[0] / 5, bboxMin[1] / 5, bboxMin[2]]
+            trunkCenter = np.divide(np.add(trunkMin, trunkMax), 2)
+            modelDir = os.path.join(self.getOutputDirModels(), archetypes[i])
+            os.makedirs(modelDir)
+            f = open(os.path.join(modelDir, archetypes[i] + ".bound"), 'w')
+            f.write(self.contentTemplateBound
+                .replace("${RADIUS}", Util.floatToStr(math.dist(trunkMin, trunkMax) / 2))
+                .replace("${BBOX.MAX}", Util.vectorToStr(trunkMax))
+                .replace("${BBOX.MIN}", Util.vectorToStr(trunkMin))
+                .replace("${CENTROID}", Util.vectorToStr(trunkCenter)))
+            f.close()
+
+        f = open(os.path.join(self.getOutputDirYtyp(), "benchmark.ytyp.xml"), 'w')
+        f.write(self.contentTemplateYtyp
+            .replace("${NAME}", "benchmark")
+            .replace("${ARCHETYPES}\n", contentItems))
+        f.close()
+
+        return boundingBoxes
+
+    @staticmethod
+    def getTerrainHeight(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return 50 + 30 * np.sin(x / 500) * np.cos(y / 700)
+
+    def createMaps(self, archetypes: list[str], patchArchetypes: list[list[int]], boundingBoxes: np.ndarray, rng: np.random.Generator):
+        # the maps are tiles of a square grid so that every map covers its own area like in real projects
+        numTilesPerRow = math.ceil(math.sqrt(self.numMaps))
+        entitiesPerMap = math.ceil(self.numEntities / self.numMaps)
+        tileSize = math.sqrt(entitiesPerMap * WorldGenerator.AREA_PER_ENTITY)
+        origin = -numTilesPerRow * tileSize / 2
+
+        for i in range(self.numMaps):
+            numEntities = min(entitiesPerMap, self.numEntities - i * entitiesPerMap)
+            tileMin = [origin + (i % numTilesPerRow) * tileSize, origin + (i // numTilesPerRow) * tileSize]
+            mapName = "benchmark_" + str(i)
+
+            contentEntities = self.createEntities(archetypes, patchArchetypes, boundingBoxes, rng, max(numEntities, 0), tileMin, tileSize)
+
+            f = open(os.path.join(self.getOutputDirMaps(), Util.getFilenameFromMapname(mapName)), 'w')
+            f.write(self.contentTemplateMap
+                .replace("${NAME}", mapName)
+                .replace("${ENTITIES}\n", contentEntities))
+            f.close()
+
+    def createEntities(self, archetypes: list[str], patchArchetypes: list[list[int]], boundingBoxes: np.ndarray, rng: np.random.Generator,
+            numEntities: int, tileMin: list[float], tileSize: float) -> str:
+        numPatches = max(1, numEntities // WorldGenerator.ENTITIES_PER_PATCH)
+        patchCenters = rng.uniform(tileMin, np.add(tileMin, tileSize), (numPatches, 2))
+        patchGroups = rng.integers(0, len(patchArchetypes), numPatches)
+
+        patches = rng.integers(0, numPatches, numEntities)
+        positions2d = np.clip(patchCenters[patches] + rng.normal(0, tileSize / 8, (numEntities, 2)), tileMin, np.add(tileMin, tileSize))
+        positionsZ = WorldGenerator.getTerrainHeight(positions2d[:, 0], positions2d[:, 1])
+
+        randomArchetypes = rng.integers(0, len(archetypes), numEntities)
+        usePatchArchetype = rng.random(numEntities) < WorldGenerator.PROBABILITY_ARCHETYPE_OF_PATCH
+        patchArchetypeChoices = rng.random(numEntities)
+
+        rotationsZ = rng.uniform(-math.pi, math.pi, numEntities)
+        tilts = rng.uniform(0, WorldGenerator.MAX_TILT, numEntities)
+        tiltDirections = rng.uniform(-math.pi, math.pi, numEntities)
+        identityRotation = rng.random(numEntities) < WorldGenerator.PROBABILITY_IDENTITY_ROTATION
+
+        scalesXY = rng.uniform(0.8, 1.3, numEntities)
+        scalesZ = np.where(rng.random(numEntities) < 0.7, scalesXY, rng.uniform(0.8, 1.3, numEntities))
+        identityScale = rng.random(numEntities) < WorldGenerator.PROBABILITY_IDENTITY_SCALE
+
+        flags = rng.choice([32, 1572864, 1572865], numEntities)
+        lodDistanceFactors = rng.uniform(8, 12, numEntities)
+
+        contentEntities = []
+        for i in range(numEntities):
+            if usePatchArchetype[i]:
+                group = patchArchetypes[patchGroups[patches[i]]]
+                archetype = group[int(patchArchetypeChoices[i] * len(group))]
+            else:
+                archetype = randomArchetypes[i]
+
+            if identityRotation[i]:
+                rotation = [0, 0, 0, 1]
+            else:
+                # tilt around a horizontal axis followed by a rotation around the z axis (as x, y, z, w)
+                sinTilt, cosTilt = math.sin(tilts[i] / 2), math.cos(tilts[i] / 2)
+                sinZ, cosZ = math.sin(rotationsZ[i] / 2), math.cos(rotationsZ[i] / 2)
+                axisX, axisY = math.cos(tiltDirections[i]) * sinTilt, math.sin(tiltDirections[i]) * sinTilt
+                rotation = [cosZ * axisX - sinZ * axisY, cosZ * axisY + sinZ * axisX, sinZ * cosTilt, cosZ * cosTilt]
+
+            scaleXY, scaleZ = (1, 1) if identityScale[i] else (scalesXY[i], scalesZ[i])
+
+            bboxMin, bboxMax = boundingBoxes[archetype]
+            lodDistance = lodDistanceFactors[i] * (bboxMax[2] - bboxMin[2]) * scaleZ
+
+            contentEntities.append(self.contentTemplateEntity
+                .replace("${NAME}", archetypes[archetype])
+                .replace("${FLAGS}", str(flags[i]))
+                .replace("${POSITION.X}", Util.floatToStr(positions2d[i, 0]))
+                .replace("${POSITION.Y}", Util.floatToStr(positions2d[i, 1]))
+                .replace("${POSITION.Z}", Util.floatToStr(positionsZ[i]))
+                .replace("${ROTATION.X}", Util.floatToStr(rotation[0]))
+                .replace("${ROTATION.Y}", Util.floatToStr(rotation[1]))
+                .replace("${ROTATION.Z}", Util.floatToStr(rotation[2]))
+                .replace("${ROTATION.W}", Util.floatToStr(rotation[3]))
+                .replace("${SCALE.XY}", Util.floatToStr(scaleXY))
+                .replace("${SCALE.Z}", Util.floatToStr(scaleZ))
+                .replace("${LOD_DISTANCE}", Util.floatToStr(lodDistance)))
+
+        return "".join(contentEntities)
@@ -1,4 +1,5 @@
 import math
+import time
 from typing import Optional
 
 import miniball
@@ -9,6 +10,7 @@ from scipy.spatial import ConvexHull
 from scipy.spatial.qhull import QhullError
 
 from common.Box import Box
+from common.Metrics import Metrics
 from common.Sphere import Sphere
 
 
@@ -36,6 +38,7 @@ class BoundingGeometry:
         if len(self._points) == 0:
             raise Exception("missing points")
 
+        startTime = time.perf_counter()
         try:
             hull = ConvexHull(self._points)
             vertices = hull.vertices
@@ -50,6 +53,7 @@ class BoundingGeometry:
             self._sphere = Sphere(center.tolist(), math.sqrt(r2))
         except LinAlgError:
             self._computeBoundingSphereFallback(points)
+        Metrics.addTime("boundingGeometry", startTime)
 
     def _computeBoundingSphereFallback(self, convexHullPoints: ndarray) -> None:
         center = np.mean([np.min(convexHullPoints, axis=0), np.max(convexHullPoints, axis=0)], axis=0)
@@ -60,8 +64,10 @@ class BoundingGeometry:
         if len(self._points) == 0:
             raise Exception("missing points")
 
+        startTime = time.perf_counter()
         points = np.array(self._points)
         self._box = Box(np.min(points, axis=0).tolist(), np.max(points, axis=0).tolist())
+        Metrics.addTime("boundingGeometry", startTime)
 
     def _resetSphereAndBox(self) -> None:
         self._sphere = None
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Any, Iterable, Iterator, Optional
+
+from common.ProcessPool import ProcessPool
+from common.Util import Util
+from common.ytyp.YtypParser import YtypParser
+
+
+class BuildCache:
+    # Content-addressed cache of the results of the stages run by main.py, so that re-running on mostly unchanged input
+    # only processes what actually changed. Every entry is keyed by a hash of the stage, its parameters and the content of
+    # its input as well as the sources of these scripts and the provided resources (ytyp files and models).
+    # Stages processing every ymap file on its own (sanitizer, entropy creator, static collision model creator) cache
+    # their result per file (see map). All other stages are globally coupled (e.g. clustering or the lod/slod hierarchy)
+    # and are cached as a whole (see restoreDirectory and storeDirectory), i.e. any change of their input results in a full run.
+
+    VERSION = 1
+
+    ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+    SOURCE_DIRS = ["common", "worker"]
+    RESOURCES_DIRS = [os.path.join("resources", "ytyp"), os.path.join("resources", "models")]
+
+    directory: str
+    _fingerprint: Optional[bytes]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._fingerprint = None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _getFingerprint(self) -> bytes:
+        # size and modification time of all sources and resources (instead of their content since these are many and large files)
+        if self._fingerprint is None:
+            fingerprint = hashlib.sha256(str(BuildCache.VERSION).encode("utf-8"))
+            for path in ["main.py"] + BuildCache.SOURCE_DIRS + BuildCache.RESOURCES_DIRS:
+                for relPath in BuildCache._listFilesRecursively(os.path.join(BuildCache.ROOT_DIR, path)):
+                    filename = os.path.basename(relPath)
+                    if "__pycache__" in relPath or filename == YtypParser.CACHE_FILENAME:
+                        continue
+
+                    stat = os.stat(os.path.join(BuildCache.ROOT_DIR, path, relPath) if relPath else os.path.join(BuildCache.ROOT_DIR, path))
+                    fingerprint.update((path + "/" + relPath + ":" + str(stat.st_size) + ":" + str(stat.st_mtime_ns) + "\n").encode("utf-8"))
+
+            self._fingerprint = fingerprint.digest()
+
+        return self._fingerprint
+
+    @staticmethod
+    def _listFilesRecursively(path: str) -> list[str]:
+        if os.path.isfile(path):
+            return [""]
+
+        result = []
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                result.append(os.path.relpath(os.path.join(directory, filename), path).replace(os.sep, "/"))
+
+        return result
+
+    def getKey(self, stage: str, params: list, *contents: Any) -> str:
+        key = hashlib.sha256(self._getFingerprint())
+        key.update(stage.encode("utf-8"))
+        key.update(json.dumps(params).encode("utf-8"))
+        for content in contents:
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            elif not isinstance(content, bytes):
+                content = json.dumps(content).encode("utf-8")
+            key.update(str(len(content)).encode("utf-8") + b":")
+            key.update(content)
+
+        return key.hexdigest()
+
+    def getDirectoryKey(self, stage: str, params: list, inputDir: str) -> str:
+        # stages only read the files directly within their input directory
+        contents = []
+        for filename in Util.getListOfFiles(inputDir):
+            contents.append(filename)
+            contents.append(hashlib.sha256(Util.readFileBytes(os.path.join(inputDir, filename))).digest())
+
+        return self.getKey(stage, params, *contents)
+
+    def _getPath(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".zip")
+
+    def load(self, key: str) -> Optional[dict[str, Optional[bytes]]]:
+        # returns relative paths mapped to their content (None for directories) or None if there is no such entry
+        path = self._getPath(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            files = {}
+            with zipfile.ZipFile(path, 'r') as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        files[info.filename.rstrip("/")] = None
+                    else:
+                        files[info.filename] = archive.read(info)
+            return files
+        except (OSError, zipfile.BadZipFile) as e:
+            print("WARNING: could not read build cache entry " + path + ": " + str(e))
+            return None
+
+    def store(self, key: str, files: dict[str, Optional[bytes]]):
+        path = self._getPath(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # processes of a ProcessPool may store the same entry at the same time
+            tempPath = path + "." + str(os.getpid()) + ".tmp"
+            with zipfile.ZipFile(tempPath, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for relPath, content in files.items():
+                    if content is None:
+                        archive.writestr(relPath + "/", b"")
+                    else:
+                        archive.writestr(relPath, content)
+            os.replace(tempPath, path)
+        except OSError as e:
+            print("WARNING: could not write build cache entry " + path + ": " + str(e))
+
+    def restoreDirectory(self, key: str, directory: str) -> bool:
+        files = self.load(key)
+        if files is None:
+            return False
+
+        Util.makeDirs(directory)
+        for relPath, content in files.items():
+            path = os.path.join(directory, *relPath.split("/"))
+            if content is None:
+                Util.makeDirs(path)
+            else:
+                Util.writeFile(path, content)
+
+        return True
+
+    def storeDirectory(self, key: str, directory: str):
+        files = {}
+        stack = [""]
+        while stack:
+            relDir = stack.pop()
+            path = os.path.join(directory, *relDir.split("/")) if relDir else directory
+            for filename in sorted(Util.listDir(path)):
+                relPath = relDir + "/" + filename if relDir else filename
+                if Util.isFile(os.path.join(path, filename)):
+                    files[relPath] = Util.readFileBytes(os.path.join(path, filename))
+                else:
+                    files[relPath] = None
+                    stack.append(relPath)
+
+        self.store(key, files)
+
+    @staticmethod
+    def map(buildCache: Optional["BuildCache"], stage: str, params: list, worker: Any, method: str, tasks: Iterable[tuple], jobs: int) -> Iterator[Any]:
+        # same as ProcessPool.map but the result of every task (starting with the filename) is taken from the cache if possible.
+        # results have to be serializable as JSON. the key of a task is computed when the task is processed, so (as for
+        # ProcessPool.map) the tasks are consumed one after another instead of all at once
+        if buildCache is None:
+            yield from ProcessPool.map(worker, method, tasks, jobs)
+        else:
+            # computed once instead of by every process of the pool
+            buildCache._getFingerprint()
+            yield from ProcessPool.map(_CachingWorker(buildCache, stage, params, worker, method), "processTask", tasks, jobs)
+
+
+class _CachingWorker:
+    # worker of BuildCache.map, i.e. looks up and stores the result of a task within the process of the pool processing it
+
+    buildCache: BuildCache
+    stage: str
+    params: list
+    worker: Any
+    method: str
+
+    def __init__(self, buildCache: BuildCache, stage: str, params: list, worker: Any, method: str):
+        self.buildCache = buildCache
+        self.stage = stage
+        self.params = params
+        self.worker = worker
+        self.method = method
+
+    def processTask(self, *task) -> Any:
+        key = self.buildCache.getKey(self.stage, self.params, *task)
+        entry = self.buildCache.load(key)
+        if entry is not None:
+            print("\treusing cached result for " + task[0])
+            return json.loads(entry["result.json"])
+
+        result = getattr(self.worker, self.method)(*task)
+        self.buildCache.store(key, {"result.json": json.dumps(result).encode("utf-8")})
+        return result
@@ -0,0 +1,182 @@
+import heapq
+from typing import Optional, Union
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import cdist
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+
+class ClusterCountSearch:
+    # State of the search for the smallest valid number of clusters in Util.performClustering, i.e. of clustering the
+    # same points into various numbers of clusters. The result of every number of clusters is memoized.
+    # For k-means only the first number of clusters runs k-means++ ten times, every further one is warm-started from the
+    # centroids of the closest number of clusters evaluated so far (by splitting or merging these) and runs just once.
+    # Once the first valid number of clusters is found these centroids are frozen (see freezeCenters), so that the result
+    # of every further number of clusters does not depend on the order of evaluation and can be computed in advance in
+    # parallel (see fitPredictCandidate).
+    # For complete linkage the tree is built only once and then cut at every number of clusters (the same as sklearn does).
+    # Also the furthest distances are memoized by the points of a cluster since most clusters remain unchanged.
+
+    # if disabled every number of clusters is a k-means++ run from scratch (ten times)
+    WARM_START = True
+
+    # if set then k-means of at least that many points uses mini-batches (see createKMeans)
+    MINI_BATCH_MIN_POINTS: Optional[int] = None
+    MINI_BATCH_SIZE = 4096
+
+    # minimum number of points to evaluate several numbers of clusters in parallel (if jobs > 1) since that requires
+    # to transfer the points to other processes
+    PARALLEL_MIN_POINTS = 20000
+
+    X: np.ndarray
+    unevenClusters: bool
+    results: dict[int, tuple]
+    furthestDistances: dict[bytes, float]
+
+    _centers: dict[int, np.ndarray]
+    _warmStarted: set[int]
+    _coldStarted: set[int]
+    _centersFrozen: bool
+    _precomputed: dict[tuple[int, bool], tuple[np.ndarray, bool]]
+    _linkage: Optional[np.ndarray]
+
+    def __init__(self, X: np.ndarray, unevenClusters: bool):
+        self.X = X
+        self.unevenClusters = unevenClusters
+        self.results = {}
+        self.furthestDistances = {}
+        self._centers = {}
+        self._warmStarted = set()
+        self._coldStarted = set()
+        self._centersFrozen = False
+        self._precomputed = {}
+        self._linkage = None
+
+    def fitPredict(self, numClusters: int) -> np.ndarray:
+        if self.unevenClusters:
+            if self._linkage is None:
+                self._linkage = linkage(self.X, method="complete")
+            return self._cutTree(numClusters)
+
+        candidate = (numClusters, numClusters in self._coldStarted)
+        if candidate in self._precomputed:
+            clusters, warmStarted = self._precomputed.pop(candidate)
+        else:
+            clusters, warmStarted = self.fitPredictCandidate(*candidate)
+
+        if warmStarted:
+            self._warmStarted.add(numClusters)
+        return clusters
+
+    def fitPredictCandidate(self, numClusters: int, coldStart: bool) -> (np.ndarray, bool):
+        # returns the clusters and whether k-means was warm-started. does not change the state of this search, so once
+        # the centers are frozen it can be called for several numbers of clusters in parallel (see addPrecomputed)
+        initialCenters = None if coldStart else self._getInitialCenters(numClusters)
+        clusters = ClusterCountSearch.createKMeans(numClusters, len(self.X), initialCenters).fit_predict(self.X)
+        return clusters, initialCenters is not None
+
+    def addPrecomputed(self, numClusters: int, coldStart: bool, result: (np.ndarray, bool)):
+        self._precomputed[(numClusters, coldStart)] = result
+
+    def isPrecomputed(self, numClusters: int, coldStart: bool) -> bool:
+        return (numClusters, coldStart) in self._precomputed
+
+    def canRunInParallel(self, jobs: int) -> bool:
+        return jobs > 1 and not self.unevenClusters and self._centersFrozen and len(self.X) >= ClusterCountSearch.PARALLEL_MIN_POINTS
+
+    def freezeCenters(self):
+        self._centersFrozen = True
+
+    @staticmethod
+    def createKMeans(numClusters: int, numPoints: int, initialCenters: Optional[np.ndarray] = None) -> Union[KMeans, MiniBatchKMeans]:
+        # k-means++ ten times or just once if initial centers are given. for large sets of points (if enabled) mini-batch
+        # k-means instead, which only needs memory for a batch and is much faster but results in slightly worse clusters
+        if ClusterCountSearch.MINI_BATCH_MIN_POINTS is not None and numPoints >= ClusterCountSearch.MINI_BATCH_MIN_POINTS:
+            if initialCenters is None:
+                return MiniBatchKMeans(n_clusters=numClusters, batch_size=ClusterCountSearch.MINI_BATCH_SIZE, random_state=0, n_init=3)
+            else:
+                return MiniBatchKMeans(n_clusters=numClusters, init=initialCenters, batch_size=ClusterCountSearch.MINI_BATCH_SIZE, random_state=0, n_init=1)
+
+        if initialCenters is None:
+            return KMeans(n_clusters=numClusters, random_state=0, n_init=10)
+        else:
+            return KMeans(n_clusters=numClusters, init=initialCenters, random_state=0, n_init=1)
+
+    def isWarmStarted(self, numClusters: int) -> bool:
+        return numClusters in self._warmStarted
+
+    def willBeWarmStarted(self, numClusters: int) -> bool:
+        # same as isWarmStarted but also for a number of clusters not evaluated yet (0 clusters are never evaluated)
+        if numClusters == 0 or numClusters in self.results or numClusters in self._coldStarted:
+            return numClusters in self._warmStarted
+        return not self.unevenClusters and len(self._centers) > 0
+
+    def discard(self, numClusters: int):
+        # forget the result of numClusters so that it is evaluated again, this time without warm start
+        self.results.pop(numClusters, None)
+        self._warmStarted.discard(numClusters)
+        self._coldStarted.add(numClusters)
+
+    def addResult(self, numClusters: int, clusters: np.ndarray, result: tuple):
+        self.results[numClusters] = result
+
+        if not self.unevenClusters and ClusterCountSearch.WARM_START and not self._centersFrozen:
+            counts = np.bincount(clusters)
+            self._centers[numClusters] = np.array([np.bincount(clusters, weights=self.X[:, i]) for i in range(self.X.shape[1])]).T / counts[:, None]
+
+    def _cutTree(self, numClusters: int) -> np.ndarray:
+        # same as sklearn's AgglomerativeClustering (including the numbering of the clusters), i.e. undo the last
+        # numClusters - 1 merges. scipy's cut_tree differs if there are equal distances
+        numPoints = len(self.X)
+        children = self._linkage[:, :2].astype(int)
+
+        nodes = [-(2 * numPoints - 2)]
+        for _ in range(numClusters - 1):
+            nodeChildren = children[-nodes[0] - numPoints]
+            heapq.heappush(nodes, -nodeChildren[0])
+            heapq.heappushpop(nodes, -nodeChildren[1])
+
+        roots = np.arange(2 * numPoints - 1)
+        for i in reversed(range(numPoints - numClusters)):
+            roots[children[i]] = roots[numPoints + i]
+
+        labels = np.zeros(2 * numPoints - 1, dtype=int)
+        labels[[-node for node in nodes]] = np.arange(len(nodes))
+        return labels[roots[:numPoints]]
+
+    def _getInitialCenters(self, numClusters: int) -> Optional[np.ndarray]:
+        if len(self._centers) == 0:
+            return None
+
+        # prefer splitting over merging if both are equally close
+        closestNumClusters = min(self._centers, key=lambda k: (abs(k - numClusters), k))
+        centers = self._centers[closestNumClusters]
+
+        if len(centers) < numClusters:
+            return self._splitCenters(centers, numClusters)
+        else:
+            return self._mergeCenters(centers, np.bincount(self.results[closestNumClusters][0]).astype(float), numClusters)
+
+    def _splitCenters(self, centers: np.ndarray, numClusters: int) -> np.ndarray:
+        # add the points furthest away from their closest center one after another (as k-means++ but deterministic)
+        centers = list(centers)
+        squaredDistances = cdist(self.X, np.array(centers), "sqeuclidean").min(axis=1)
+        while len(centers) < numClusters:
+            index = np.argmax(squaredDistances)
+            centers.append(self.X[index])
+            squaredDistances = np.minimum(squaredDistances, ((self.X - self.X[index]) ** 2).sum(axis=1))
+        return np.array(centers)
+
+    def _mergeCenters(self, centers: np.ndarray, sizes: np.ndarray, numClusters: int) -> np.ndarray:
+        # merge the closest two centers (weighted by the number of their points) until there are numClusters centers
+        centers = centers.copy()
+        while len(centers) > numClusters:
+            distances = cdist(centers, centers, "sqeuclidean")
+            np.fill_diagonal(distances, np.inf)
+            i, j = np.unravel_index(np.argmin(distances), distances.shape)
+            centers[i] = (centers[i] * sizes[i] + centers[j] * sizes[j]) / (sizes[i] + sizes[j])
+            sizes[i] += sizes[j]
+            centers = np.delete(centers, j, axis=0)
+            sizes = np.delete(sizes, j)
+        return centers
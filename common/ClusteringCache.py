@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Optional
+
+import numpy as np
+import sklearn
+
+from common.ClusterCountSearch import ClusterCountSearch
+
+
+class ClusteringCache:
+    # On-disk cache of the results of Util.performClustering (see --buildCache), so that the same sets of points are not
+    # clustered again on every run. Every entry is keyed by a hash of the points, the parameters of the clustering and
+    # VERSION. Unlike BuildCache the sources of these scripts are not part of the key, i.e. any other change of the sources
+    # (e.g. of how flags are set) keeps the cached clusterings.
+
+    # increase whenever the result of Util.performClustering changes
+    VERSION = 1
+
+    # cache is disabled if not set
+    directory: Optional[str] = None
+
+    @staticmethod
+    def getKey(X: np.ndarray, params: list) -> str:
+        miniBatchMinPoints = ClusterCountSearch.MINI_BATCH_MIN_POINTS
+        usesMiniBatches = miniBatchMinPoints is not None and len(X) >= miniBatchMinPoints
+
+        key = hashlib.sha256(json.dumps([ClusteringCache.VERSION, sklearn.__version__, ClusterCountSearch.WARM_START,
+            ClusterCountSearch.MINI_BATCH_SIZE if usesMiniBatches else None, params]).encode("utf-8"))
+        key.update((X.dtype.str + str(X.shape)).encode("utf-8"))
+        key.update(np.ascontiguousarray(X).tobytes())
+        return key.hexdigest()
+
+    @staticmethod
+    def _getPath(key: str) -> str:
+        return os.path.join(ClusteringCache.directory, key[:2], key + ".npz")
+
+    @staticmethod
+    def load(key: str) -> Optional[tuple[np.ndarray, list[float]]]:
+        # returns the clusters and the furthest distance of every cluster or None if there is no such entry
+        path = ClusteringCache._getPath(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                return entry["clusters"], entry["furthestDistances"].tolist()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print("WARNING: could not read clustering cache entry " + path + ": " + str(e))
+            return None
+
+    @staticmethod
+    def store(key: str, clusters: np.ndarray, furthestDistances: list[float]):
+        path = ClusteringCache._getPath(key)
+        # processes of a ProcessPool may store the same entry at the same time
+        tempPath = path + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tempPath, 'wb') as f:
+                np.savez(f, clusters=np.asarray(clusters), furthestDistances=np.array(furthestDistances, dtype=float))
+            os.replace(tempPath, path)
+        except OSError as e:
+            print("WARNING: could not write clustering cache entry " + path + ": " + str(e))
@@ -0,0 +1,108 @@
+import os
+from typing import Union
+
+
+class InMemoryFiles:
+    # Keeps the files of mounted directories in memory instead of on disk.
+    # main.py mounts the output directories of intermediate stages so that each stage hands over its ymap files
+    # to the next one without writing them to _temp_ and reading them back. Mounted directories are flat, i.e.
+    # they contain files only. All file operations in Util (and the parsers) are routed through this class.
+
+    _mounts: set[str] = set()
+    _directories: dict[str, dict[str, Union[str, bytes]]] = {}
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def mount(directory: str):
+        InMemoryFiles._mounts.add(InMemoryFiles._normalize(directory))
+
+    @staticmethod
+    def release(directory: str):
+        directory = InMemoryFiles._normalize(directory)
+        InMemoryFiles._mounts.discard(directory)
+        InMemoryFiles._directories.pop(directory, None)
+
+    @staticmethod
+    def contains(path: str) -> bool:
+        if not InMemoryFiles._mounts:
+            return False
+
+        path = InMemoryFiles._normalize(path)
+        return path in InMemoryFiles._mounts or os.path.dirname(path) in InMemoryFiles._mounts
+
+    @staticmethod
+    def _split(path: str) -> (str, str):
+        path = InMemoryFiles._normalize(path)
+        return os.path.dirname(path), os.path.basename(path)
+
+    @staticmethod
+    def _getDirectory(directory: str) -> dict[str, Union[str, bytes]]:
+        directory = InMemoryFiles._normalize(directory)
+        if directory not in InMemoryFiles._directories:
+            raise FileNotFoundError("No such in-memory directory: " + directory)
+
+        return InMemoryFiles._directories[directory]
+
+    @staticmethod
+    def makeDirs(directory: str):
+        directory = InMemoryFiles._normalize(directory)
+        if directory not in InMemoryFiles._directories:
+            InMemoryFiles._directories[directory] = {}
+
+    @staticmethod
+    def isDir(path: str) -> bool:
+        return InMemoryFiles._normalize(path) in InMemoryFiles._directories
+
+    @staticmethod
+    def isFile(path: str) -> bool:
+        directory, filename = InMemoryFiles._split(path)
+        return filename in InMemoryFiles._directories.get(directory, {})
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return InMemoryFiles.isDir(path) or InMemoryFiles.isFile(path)
+
+    @staticmethod
+    def listDir(directory: str) -> list[str]:
+        return list(InMemoryFiles._getDirectory(directory).keys())
+
+    @staticmethod
+    def read(path: str) -> str:
+        content = InMemoryFiles.readBytesOrStr(path)
+        return content.decode("utf-8") if isinstance(content, bytes) else content
+
+    @staticmethod
+    def readBytesOrStr(path: str) -> Union[str, bytes]:
+        directory, filename = InMemoryFiles._split(path)
+        files = InMemoryFiles._getDirectory(directory)
+        if filename not in files:
+            raise FileNotFoundError("No such in-memory file: " + path)
+
+        return files[filename]
+
+    @staticmethod
+    def write(path: str, content: Union[str, bytes]):
+        directory, filename = InMemoryFiles._split(path)
+        InMemoryFiles._getDirectory(directory)[filename] = content
+
+    @staticmethod
+    def remove(path: str):
+        directory, filename = InMemoryFiles._split(path)
+        files = InMemoryFiles._getDirectory(directory)
+        if filename not in files:
+            raise FileNotFoundError("No such in-memory file: " + path)
+
+        del files[filename]
+
+    @staticmethod
+    def moveToDisk(directory: str, destination: str):
+        files = InMemoryFiles._getDirectory(directory)
+        for filename, content in files.items():
+            f = open(os.path.join(destination, filename), 'wb' if isinstance(content, bytes) else 'w')
+            f.write(content)
+            f.close()
+
+        files.clear()
@@ -0,0 +1,204 @@
+import json
+import re
+import sys
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Metrics:
+    # Collects performance metrics of the stages run by main.py (see --metrics) and writes them as JSON.
+    # Counters (files and bytes read/written, time spent in clustering and bounding geometry, ...) are only updated if
+    # enabled. Processes of a ProcessPool collect their counters per task and these are merged into the calling process.
+
+    VERSION = 1
+
+    enabled: bool = False
+    stages: list[dict] = []
+    _counters: dict[str, float] = {}
+    _clusteringCalls: list[dict] = []
+    _stage: Optional[dict] = None
+
+    @staticmethod
+    def enable():
+        Metrics.enabled = True
+
+    @staticmethod
+    def add(name: str, value: float):
+        if not Metrics.enabled:
+            return
+        Metrics._counters[name] = Metrics._counters.get(name, 0) + value
+
+    @staticmethod
+    def addTime(name: str, startTime: float):
+        # startTime as returned by time.perf_counter()
+        if not Metrics.enabled:
+            return
+        Metrics.add(name + "Time", time.perf_counter() - startTime)
+
+    @staticmethod
+    def addFileRead(numBytes: int, startTime: Optional[float] = None):
+        if not Metrics.enabled:
+            return
+        Metrics.add("filesRead", 1)
+        Metrics.add("bytesRead", numBytes)
+        if startTime is not None:
+            Metrics.addTime("io", startTime)
+
+    @staticmethod
+    def addFileWritten(numBytes: int, startTime: Optional[float] = None):
+        if not Metrics.enabled:
+            return
+        Metrics.add("filesWritten", 1)
+        Metrics.add("bytesWritten", numBytes)
+        if startTime is not None:
+            Metrics.addTime("io", startTime)
+
+    @staticmethod
+    def addClusteringCall(method: str, numPoints: int, numClusters: Optional[int], distanceThreshold: Optional[float], resultingNumClusters: int, startTime: float):
+        if not Metrics.enabled:
+            return
+        Metrics.addTime("clustering", startTime)
+        Metrics._clusteringCalls.append({
+            "method": method,
+            "points": numPoints,
+            "numClusters": numClusters,
+            "distanceThreshold": distanceThreshold,
+            "k": resultingNumClusters,
+            "time": time.perf_counter() - startTime
+        })
+
+    @staticmethod
+    def collect() -> dict:
+        # returns the counters collected so far and resets them (see merge)
+        collected = {"counters": Metrics._counters, "clusteringCalls": Metrics._clusteringCalls}
+        Metrics._counters = {}
+        Metrics._clusteringCalls = []
+        return collected
+
+    @staticmethod
+    def merge(collected: dict):
+        for name, value in collected["counters"].items():
+            Metrics.add(name, value)
+        Metrics._clusteringCalls.extend(collected["clusteringCalls"])
+
+    @staticmethod
+    def getPeakRss(children: bool = False) -> Optional[int]:
+        # in bytes. peak of this process since the last resetPeakRss (if supported) or the largest child process waited for
+        if not children:
+            try:
+                f = open("/proc/self/status", 'r')
+                match = re.search("VmHWM:\\s*(\\d+)\\s*kB", f.read())
+                f.close()
+                if match:
+                    return int(match.group(1)) * 1024
+            except OSError:
+                pass
+
+        if resource is None:
+            return None
+
+        # ru_maxrss is in kilobytes except on macOS
+        maxRss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return maxRss if sys.platform == "darwin" else maxRss * 1024
+
+    @staticmethod
+    def resetPeakRss():
+        # only supported on Linux, otherwise the peak RSS of a stage is the peak of the whole run so far
+        try:
+            f = open("/proc/self/clear_refs", 'w')
+            f.write("5")
+            f.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def getCpuTimeChildren() -> Optional[float]:
+        if resource is None:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    @staticmethod
+    def beginStage(stage: str):
+        if not Metrics.enabled:
+            return
+
+        # discard whatever was collected in between stages
+        Metrics.collect()
+        Metrics.resetPeakRss()
+
+        Metrics._stage = {
+            "stage": stage,
+            "startWallTime": time.perf_counter(),
+            "startCpuTime": time.process_time(),
+            "startCpuTimeChildren": Metrics.getCpuTimeChildren()
+        }
+
+    @staticmethod
+    def endStage():
+        if not Metrics.enabled or Metrics._stage is None:
+            return
+
+        wallTime = time.perf_counter() - Metrics._stage["startWallTime"]
+        cpuTime = time.process_time() - Metrics._stage["startCpuTime"]
+        cpuTimeChildren = Metrics.getCpuTimeChildren()
+        if cpuTimeChildren is not None:
+            cpuTimeChildren -= Metrics._stage["startCpuTimeChildren"]
+
+        collected = Metrics.collect()
+        counters = collected["counters"]
+        Metrics.stages.append({
+            "stage": Metrics._stage["stage"],
+            "entities": None,
+            "wallTime": wallTime,
+            "cpuTime": cpuTime,
+            "cpuTimeChildren": cpuTimeChildren,
+            "peakRss": Metrics.getPeakRss(),
+            "peakRssChildren": Metrics.getPeakRss(True),
+            "entitiesPerSecond": None,
+            "filesRead": int(counters.get("filesRead", 0)),
+            "bytesRead": int(counters.get("bytesRead", 0)),
+            "filesWritten": int(counters.get("filesWritten", 0)),
+            "bytesWritten": int(counters.get("bytesWritten", 0)),
+            "ioTime": counters.get("ioTime", 0),
+            "clusteringTime": counters.get("clusteringTime", 0),
+            "boundingGeometryTime": counters.get("boundingGeometryTime", 0),
+            "clusteringCalls": collected["clusteringCalls"]
+        })
+        Metrics._stage = None
+
+    @staticmethod
+    def setEntitiesOfLastStage(entities: int):
+        # number of entities in the input of the stage, counted once it is done (see main.py)
+        if not Metrics.enabled or len(Metrics.stages) == 0:
+            return
+
+        stage = Metrics.stages[-1]
+        stage["entities"] = entities
+        stage["entitiesPerSecond"] = entities / stage["wallTime"] if stage["wallTime"] > 0 else None
+
+    @staticmethod
+    def write(path: str, jobs: int, inMemory: bool):
+        total = {}
+        for name in ["wallTime", "cpuTime", "cpuTimeChildren", "filesRead", "bytesRead", "filesWritten", "bytesWritten",
+                     "ioTime", "clusteringTime", "boundingGeometryTime"]:
+            values = [stage[name] for stage in Metrics.stages if stage[name] is not None]
+            total[name] = sum(values) if values else None
+        total["peakRss"] = max([stage["peakRss"] for stage in Metrics.stages if stage["peakRss"] is not None], default=None)
+        total["clusteringCalls"] = sum(len(stage["clusteringCalls"]) for stage in Metrics.stages)
+
+        f = open(path, 'w')
+        json.dump({
+            "version": Metrics.VERSION,
+            "jobs": jobs,
+            "inMemory": inMemory,
+            "stages": Metrics.stages,
+            "total": total
+        }, f, indent=2)
+        f.write("\n")
+        f.close()
@@ -0,0 +1,52 @@
+import contextlib
+import functools
+import io
+import multiprocessing
+from typing import Any, Iterable, Iterator, Optional
+
+from common.ClusterCountSearch import ClusterCountSearch
+from common.ClusteringCache import ClusteringCache
+from common.Metrics import Metrics
+
+
+class ProcessPool:
+    # Calls a method of a worker for independent tasks (e.g. one per ymap file) in a pool of jobs processes.
+    # The worker is transferred once to every process of the pool. Results are yielded in the order of the tasks and
+    # whatever a task prints is collected and printed when its result is yielded, so the log is the same as running serially.
+    # Tasks must not write to in-memory files (see InMemoryFiles) since they are not shared between processes,
+    # i.e. the calling process has to read the input of the tasks and write their results.
+
+    _worker: Any = None
+
+    @staticmethod
+    def _initialize(worker: Any, metricsEnabled: bool, miniBatchMinPoints: Optional[int], warmStart: bool, clusteringCacheDir: Optional[str]):
+        ProcessPool._worker = worker
+        # settings made at runtime are not inherited if processes are spawned instead of forked (e.g. on Windows)
+        ClusterCountSearch.MINI_BATCH_MIN_POINTS = miniBatchMinPoints
+        ClusterCountSearch.WARM_START = warmStart
+        ClusteringCache.directory = clusteringCacheDir
+        if metricsEnabled:
+            # discard the counters inherited from the calling process (if forked)
+            Metrics.enable()
+            Metrics.collect()
+
+    @staticmethod
+    def _call(method: str, args: tuple) -> (str, Optional[dict], Any):
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            result = getattr(ProcessPool._worker, method)(*args)
+        return log.getvalue(), Metrics.collect() if Metrics.enabled else None, result
+
+    @staticmethod
+    def map(worker: Any, method: str, tasks: Iterable[tuple], jobs: int) -> Iterator[Any]:
+        if jobs <= 1:
+            for args in tasks:
+                yield getattr(worker, method)(*args)
+            return
+
+        with multiprocessing.Pool(jobs, ProcessPool._initialize, (worker, Metrics.enabled, ClusterCountSearch.MINI_BATCH_MIN_POINTS, ClusterCountSearch.WARM_START, ClusteringCache.directory)) as pool:
+            for log, metrics, result in pool.imap(functools.partial(ProcessPool._call, method), tasks):
+                print(log, end="")
+                if metrics is not None:
+                    Metrics.merge(metrics)
+                yield result
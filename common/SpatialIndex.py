@@ -0,0 +1,142 @@
+import math
+from typing import Optional
+
+import numpy as np
+import shapely
+from scipy.spatial import KDTree
+from shapely.geometry.polygon import Polygon
+
+
+class SpatialIndex:
+    # Index of a fixed set of points (e.g. the positions of all entities of an EntityTable) for neighbor and range queries.
+    # Radius and nearest neighbor queries use a KD-tree, box and polygon queries use a uniform grid over x and y
+    # (the world is large but flat, so a grid over z would be mostly empty). Both are built lazily on their first use.
+    # All queries return indices into the points the index was built from (in ascending order unless stated otherwise).
+
+    # average number of points per grid cell (for uniformly distributed points) if no cell size is given
+    POINTS_PER_CELL = 16
+
+    points: np.ndarray
+    cellSize: Optional[float]
+
+    _kdTree: Optional[KDTree]
+    _gridOrigin: Optional[np.ndarray]
+    _gridShape: Optional[np.ndarray]
+    _gridOrder: Optional[np.ndarray]
+    _gridStarts: Optional[np.ndarray]
+
+    @staticmethod
+    def fromEntityTable(table: "EntityTable", dimensions: int = 3, cellSize: Optional[float] = None) -> "SpatialIndex":
+        return SpatialIndex(table.getPositions()[:, :dimensions], cellSize)
+
+    def __init__(self, points, cellSize: Optional[float] = None):
+        self.points = np.asarray(points, dtype=float).reshape(len(points), -1)
+        self.cellSize = cellSize
+        self._kdTree = None
+        self._gridOrigin = None
+        self._gridShape = None
+        self._gridOrder = None
+        self._gridStarts = None
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def getKDTree(self) -> KDTree:
+        if self._kdTree is None:
+            self._kdTree = KDTree(self.points)
+        return self._kdTree
+
+    def queryRadius(self, center: list[float], radius: float) -> np.ndarray:
+        if len(self.points) == 0:
+            return np.empty(0, dtype=int)
+        return np.array(sorted(self.getKDTree().query_ball_point(center, radius)), dtype=int)
+
+    def queryNearest(self, point: list[float], k: int) -> (np.ndarray, np.ndarray):
+        # distances and indices of the k nearest points ordered by distance (same as scipy.spatial.KDTree.query)
+        distances, indices = self.getKDTree().query(point, k)
+        return np.atleast_1d(distances), np.atleast_1d(indices)
+
+    def queryBox(self, minVertex: list[float], maxVertex: list[float]) -> np.ndarray:
+        # points within the (closed) axis-aligned box. minVertex and maxVertex need at least x and y but may have less dimensions than the points
+        minVertex = np.asarray(minVertex, dtype=float)
+        maxVertex = np.asarray(maxVertex, dtype=float)
+        candidates = self._getGridCandidates(minVertex[:2], maxVertex[:2])
+
+        dimensions = len(minVertex)
+        candidatePoints = self.points[candidates, :dimensions]
+        inside = np.all((candidatePoints >= minVertex) & (candidatePoints <= maxVertex), axis=1)
+        return candidates[inside]
+
+    def queryPolygon(self, polygon: list[list[float]]) -> np.ndarray:
+        # points whose x and y are inside of the polygon (same as shapely's Polygon.contains, i.e. points on the boundary are not inside)
+        polygon = Polygon(polygon)
+        if polygon.is_empty:
+            return np.empty(0, dtype=int)
+
+        minX, minY, maxX, maxY = polygon.bounds
+        candidates = self.queryBox([minX, minY], [maxX, maxY])
+        inside = shapely.contains_xy(polygon, self.points[candidates, 0], self.points[candidates, 1])
+        return candidates[inside]
+
+    def partition(self, maxPoints: int) -> list[np.ndarray]:
+        # splits the points recursively at the median of their widest dimension (as a KD-tree does) until every part
+        # consists of at most maxPoints points. returns the (ascending) indices of every part
+        parts = []
+        stack = [np.arange(len(self.points))]
+        while stack:
+            indices = stack.pop()
+            if len(indices) <= maxPoints:
+                parts.append(indices)
+                continue
+
+            points = self.points[indices]
+            axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+            order = np.argsort(points[:, axis], kind="stable")
+            half = len(indices) // 2
+            stack.append(np.sort(indices[order[half:]]))
+            stack.append(np.sort(indices[order[:half]]))
+
+        return parts
+
+    def _buildGrid(self):
+        points2d = self.points[:, :2]
+        self._gridOrigin = points2d.min(axis=0)
+        extents = points2d.max(axis=0) - self._gridOrigin
+
+        if self.cellSize is None:
+            area = max(extents[0], 1) * max(extents[1], 1)
+            self.cellSize = math.sqrt(area * SpatialIndex.POINTS_PER_CELL / len(points2d))
+
+        self._gridShape = np.floor(extents / self.cellSize).astype(np.int64) + 1
+        cells = self._getCells(points2d)
+
+        # points sorted by cell, i.e. the points of cell c are _gridOrder[_gridStarts[c]:_gridStarts[c + 1]]
+        self._gridOrder = np.argsort(cells, kind="stable")
+        self._gridStarts = np.searchsorted(cells[self._gridOrder], np.arange(self._gridShape[0] * self._gridShape[1] + 1))
+
+    def _getCellCoords(self, points2d: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor((points2d - self._gridOrigin) / self.cellSize).astype(np.int64), 0, self._gridShape - 1)
+
+    def _getCells(self, points2d: np.ndarray) -> np.ndarray:
+        cellCoords = self._getCellCoords(points2d)
+        return cellCoords[:, 0] * self._gridShape[1] + cellCoords[:, 1]
+
+    def _getGridCandidates(self, minVertex: np.ndarray, maxVertex: np.ndarray) -> np.ndarray:
+        # indices (ascending) of all points in the grid cells overlapping the box given by x and y of minVertex and maxVertex
+        if len(self.points) == 0 or np.any(minVertex > maxVertex):
+            return np.empty(0, dtype=int)
+
+        if self._gridOrder is None:
+            self._buildGrid()
+
+        if np.any(maxVertex < self._gridOrigin) or np.any(minVertex > self._gridOrigin + self._gridShape * self.cellSize):
+            return np.empty(0, dtype=int)
+
+        minCell, maxCell = self._getCellCoords(np.array([minVertex, maxVertex]))
+
+        # cells of one x are consecutive, so the points of each x are one slice of _gridOrder
+        rows = np.arange(minCell[0], maxCell[0] + 1) * self._gridShape[1]
+        starts = self._gridStarts[rows + minCell[1]]
+        ends = self._gridStarts[rows + maxCell[1] + 1]
+        candidates = np.concatenate([self._gridOrder[start:end] for start, end in zip(starts, ends)])
+        return np.sort(candidates)
@@ -1,9 +1,12 @@
+import collections
 import math
+import mmap
 import os
 import shutil
 import re
+import time
 from string import digits
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterable, Optional, Union
 
 import numpy as np
 import transforms3d
@@ -13,16 +16,22 @@ from scipy.spatial import ConvexHull
 from scipy.spatial.distance import pdist
 from scipy.spatial.qhull import QhullError
 from sklearn.cluster import AgglomerativeClustering
-from sklearn.cluster import KMeans
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
 
 from common import Box, Sphere
+from common.ClusterCountSearch import ClusterCountSearch
+from common.ClusteringCache import ClusteringCache
+from common.InMemoryFiles import InMemoryFiles
+from common.Metrics import Metrics
+from common.ProcessPool import ProcessPool
+from common.SpatialIndex import SpatialIndex
 
 
 class Util:
     MIN_LOD_DISTANCE = 10
 
+    # maximum number of points per tile of a tiled clustering (see performClusteringMaxFurthestDistance)
+    MAX_POINTS_PER_TILE = 2000
+
     @staticmethod
     def floatToStr(val: float) -> str:
         return "{:.8f}".format(val)
@@ -52,63 +61,155 @@ class Util:
         # for a large set of points do not compute the pairwise distances but first calculate the convex hull and
         # just compute the maximum of the pairwise distances from that hull vertices.
         # also don't use pdist here since we are only interested in the maximum distances and hence there is no need to
-        # actually create a list of size n*(n-1)/2 (where n is the number of vertices of the convex hull)
+        # actually create a list of size n*(n-1)/2 (where n is the number of vertices of the convex hull).
+        # in 2D rotating calipers only consider antipodal pairs of vertices, otherwise distances are calculated blockwise
         points = np.array(coords)
         try:
             hull = ConvexHull(points)
-            vertices = hull.vertices
         except QhullError:
-            vertices = range(len(coords))
+            return Util._calculateFurthestDistanceBlocked(points)
 
-        maxDistance = 0
-        for index1 in vertices:
-            point1 = coords[index1]
-            for index2 in vertices:
-                if index1 >= index2:
-                    continue
+        if points.shape[1] == 2:
+            return Util._calculateFurthestDistanceRotatingCalipers(points[hull.vertices])
+        else:
+            return Util._calculateFurthestDistanceBlocked(points[hull.vertices])
 
-                point2 = coords[index2]
-                maxDistance = max(maxDistance, math.dist(point1, point2))
+    # number of points whose distances to all other points are calculated at once
+    _FURTHEST_DISTANCE_BLOCK_SIZE = 256
 
-        return maxDistance
+    # the squared distances calculated by numpy may differ in the last bits from the ones math.dist is based on, so the pair
+    # with the largest squared distance is not necessarily the one with the largest math.dist. therefore every pair within
+    # that many ulps of the largest squared distance is a candidate and math.dist decides among them
+    _FURTHEST_DISTANCE_ULPS = 16
 
     @staticmethod
-    def _performClustering(X: np.ndarray, numClusters: Optional[int], distanceThreshold: Optional[float], unevenClusters: bool) -> (Any, int, list[float]):
+    def _getFurthestDistanceThreshold(maxSquaredDistance: float) -> float:
+        return maxSquaredDistance - Util._FURTHEST_DISTANCE_ULPS * np.spacing(maxSquaredDistance)
+
+    @staticmethod
+    def _getLargestDistance(firstPoints: np.ndarray, secondPoints: np.ndarray) -> float:
+        return max(math.dist(point1, point2) for point1, point2 in zip(firstPoints.tolist(), secondPoints.tolist()))
+
+    @staticmethod
+    def _calculateFurthestDistanceBlocked(points: np.ndarray) -> float:
+        maxSquaredDistance = -1
+        candidates = []
+        for start in range(0, len(points), Util._FURTHEST_DISTANCE_BLOCK_SIZE):
+            block = points[start:start + Util._FURTHEST_DISTANCE_BLOCK_SIZE]
+            squaredDistances = ((block[:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2)
+            blockMaxSquaredDistance = squaredDistances.max()
+            if blockMaxSquaredDistance < Util._getFurthestDistanceThreshold(maxSquaredDistance):
+                continue
+
+            maxSquaredDistance = max(maxSquaredDistance, blockMaxSquaredDistance)
+            i, j = np.nonzero(squaredDistances >= Util._getFurthestDistanceThreshold(blockMaxSquaredDistance))
+            candidates.append((start + i, j, squaredDistances[i, j]))
+
+        first, second, squaredDistances = [np.concatenate(values) for values in zip(*candidates)]
+        isCandidate = squaredDistances >= Util._getFurthestDistanceThreshold(maxSquaredDistance)
+
+        return Util._getLargestDistance(points[first[isCandidate]], points[second[isCandidate]])
+
+    @staticmethod
+    def _calculateFurthestDistanceRotatingCalipers(vertices: np.ndarray) -> float:
+        # vertices of a convex polygon in counterclockwise order (as given by ConvexHull in 2D).
+        # the furthest distance is between an antipodal pair of vertices, so for every edge consider its vertices and the
+        # vertices furthest away from the line of that edge (and their neighbors in case of parallel edges)
+        numVertices = len(vertices)
+        edges = np.roll(vertices, -1, axis=0) - vertices
+        angles = np.unwrap(np.arctan2(edges[:, 1], edges[:, 0]))
+        # the vertex furthest away from the line of an edge is the one where the edge angle exceeds that edge angle + pi
+        antipodal = np.searchsorted(np.concatenate((angles, angles + 2 * np.pi)), angles + np.pi) % numVertices
+
+        edgeVertices = np.arange(numVertices)
+        first = np.tile(np.concatenate((edgeVertices, (edgeVertices + 1) % numVertices)), 3)
+        second = np.concatenate([np.tile((antipodal + offset) % numVertices, 2) for offset in (-1, 0, 1)])
+        squaredDistances = ((vertices[first] - vertices[second]) ** 2).sum(axis=1)
+        isCandidate = squaredDistances >= Util._getFurthestDistanceThreshold(squaredDistances.max())
+
+        return Util._getLargestDistance(vertices[first[isCandidate]], vertices[second[isCandidate]])
+
+    @staticmethod
+    def _performClustering(X: np.ndarray, numClusters: Optional[int], distanceThreshold: Optional[float], unevenClusters: bool,
+            search: Optional[ClusterCountSearch] = None, tiled: bool = False) -> (Any, int, list[float]):
+        startTime = time.perf_counter()
         numPoints = X.shape[0]
         if numClusters is None:
             print("\t\tcalculating clustering using distance threshold " + str(distanceThreshold) + " for " + str(numPoints) + " points")
         else:
             print("\t\tcalculating clustering of " + str(numClusters) + " clusters for " + str(numPoints) + " points")
 
+        method = "none"
         if numClusters == 1:
             clusters = np.zeros(numPoints, dtype=int)
         elif numClusters == numPoints:
             clusters = np.arange(numPoints, dtype=int)
         else:
-            if unevenClusters:
-                model = AgglomerativeClustering(n_clusters=numClusters, distance_threshold=distanceThreshold, linkage="complete")
+            method = "agglomerative" if unevenClusters else "kmeans"
+            if tiled:
+                method = "agglomerativeTiled"
+                clusters = Util._performTiledClustering(X, distanceThreshold)
+            elif search is not None:
+                clusters = search.fitPredict(numClusters)
             else:
-                model = KMeans(n_clusters=numClusters, random_state=0, n_init=10)
-            clusters = model.fit_predict(X)
+                if unevenClusters:
+                    model = AgglomerativeClustering(n_clusters=numClusters, distance_threshold=distanceThreshold, linkage="complete")
+                else:
+                    model = ClusterCountSearch.createKMeans(numClusters, numPoints)
+                clusters = model.fit_predict(X)
 
             clusters = Util._fixClusterLabels(clusters, X)
 
+        requestedNumClusters = numClusters
         numClusters = max(clusters) + 1
 
+        # points of cluster c are order[starts[c]:starts[c + 1]] (in ascending order as np.where(clusters == c) but without comparing all points per cluster)
+        order = np.argsort(clusters, kind="stable")
+        starts = np.searchsorted(np.asarray(clusters)[order], np.arange(numClusters + 1))
+
         maxClusterSize = -1
         furthestDistances = [0] * numClusters
         for cluster in np.unique(clusters):
-            clusterEntries = np.where(clusters == cluster)
+            clusterEntries = order[starts[cluster]:starts[cluster + 1]]
 
-            maxClusterSize = max(maxClusterSize, len(clusterEntries[0]))
+            maxClusterSize = max(maxClusterSize, len(clusterEntries))
 
-            furthestDistances[cluster] = Util.calculateFurthestDistance(X[clusterEntries[0]])
+            if search is None:
+                furthestDistances[cluster] = Util.calculateFurthestDistance(X[clusterEntries])
+            else:
+                key = clusterEntries.tobytes()
+                if key not in search.furthestDistances:
+                    search.furthestDistances[key] = Util.calculateFurthestDistance(X[clusterEntries])
+                furthestDistances[cluster] = search.furthestDistances[key]
+
+        Metrics.addClusteringCall(method, numPoints, requestedNumClusters, distanceThreshold, int(numClusters), startTime)
+
+        if search is not None:
+            search.addResult(requestedNumClusters, clusters, (clusters, maxClusterSize, furthestDistances))
 
         return clusters, maxClusterSize, furthestDistances
 
     @staticmethod
-    def _fixClusterLabels(clusters, X: np.ndarray):
-        uniqueClusters = np.unique(clusters)
+    def _performTiledClustering(X: np.ndarray, distanceThreshold: float) -> np.ndarray:
+        # complete linkage needs quadratic memory, so split the points into tiles (see SpatialIndex.partition) and cluster
+        # each tile on its own. every cluster is still a complete linkage cluster, i.e. its furthest distance is below
+        # distanceThreshold, but clusters do not extend across tiles
+        clusters = np.zeros(len(X), dtype=int)
+        clusterOffset = 0
+        for tile in SpatialIndex(X).partition(Util.MAX_POINTS_PER_TILE):
+            if len(tile) > 1:
+                model = AgglomerativeClustering(n_clusters=None, distance_threshold=distanceThreshold, linkage="complete")
+                clusters[tile] = model.fit_predict(X[tile]) + clusterOffset
+            else:
+                clusters[tile] = clusterOffset
+            clusterOffset = max(clusters[tile]) + 1
+
+        return clusters
+
+    @staticmethod
+    def _fixClusterLabels(clusters, X: np.ndarray) -> np.ndarray:
+        uniqueClusters, inverse = np.unique(clusters, return_inverse=True)
+        numClusters = len(uniqueClusters)
 
         dim = X.shape[1]
 
@@ -116,29 +217,26 @@ class Util:
         maxVertex = X.max(axis=0)
         extents = maxVertex - minVertex
 
-        sideLengths = np.zeros(dim)
-        centers = []
-        for cluster in uniqueClusters:
-            clusterEntries = np.where(clusters == cluster)
-            points = X[clusterEntries[0]]
-            centers.append(sum(points) / len(clusterEntries[0]))
-            clusterExtents = points.max(axis=0) - points.min(axis=0)
-            sideLengths += clusterExtents
-        centers = np.array(centers)
+        # bincount sums up the points of each cluster in the same order as summing them up one after another
+        clusterSizes = np.bincount(inverse, minlength=numClusters)
+        centers = np.array([np.bincount(inverse, weights=X[:, i], minlength=numClusters) for i in range(dim)]).T / clusterSizes[:, np.newaxis]
+
+        clusterMins = np.full((numClusters, dim), np.inf)
+        clusterMaxs = np.full((numClusters, dim), -np.inf)
+        np.minimum.at(clusterMins, inverse, X)
+        np.maximum.at(clusterMaxs, inverse, X)
+        # cumsum (unlike sum) adds up the extents of the clusters one after another
+        sideLengths = np.cumsum(clusterMaxs - clusterMins, axis=0)[-1]
 
         lexsortCriteria = []
         if dim == 1:
             lexsortCriteria.append(centers[:, 0])
         else:
             sideLengths = np.maximum(np.ones(dim), sideLengths)  # prevent dividing by zero if there is a degenerated dimension
-            numSteps = np.ceil(extents / sideLengths * len(uniqueClusters))
+            numSteps = np.ceil(extents / sideLengths * numClusters)
             extents = np.maximum(np.ones(dim), extents)  # prevent dividing by zero if there is a degenerated dimension
 
-            discreteCenters = []
-            for center in centers:
-                discreteCenter = np.floor(numSteps * (center - minVertex) / extents)
-                discreteCenters.append(discreteCenter)
-            discreteCenters = np.array(discreteCenters)
+            discreteCenters = np.floor(numSteps * (centers - minVertex) / extents)
 
             for i in range(dim):
                 j = dim - i - 1
@@ -156,40 +254,21 @@ class Util:
                 lexsortCriteria.append(discreteCenters[:, j] * (-1 if j == 1 else 1))
 
         order = np.lexsort(lexsortCriteria)
-        orderMapping = {}
-        for i in range(len(order)):
-            orderMapping[order[i]] = i
-        mapping = {}
-        for i in range(len(uniqueClusters)):
-            mapping[uniqueClusters[i]] = orderMapping[i]
-
-        newClusters = []
-        for i in range(len(clusters)):
-            origCluster = clusters[i]
-            newClusters.append(mapping[origCluster])
-
-        return newClusters
-
-    @staticmethod
-    def performClusteringFixedPolygon(points: list[list[float]], polygon: list[list[float]]) -> Any:
-        polygon = Polygon(polygon)
-        clusters = []
-        hasPointInside = False
-        hasPointOutside = False
-        for p in points:
-            point = Point(p[0], p[1])
-            if polygon.contains(point):
-                hasPointInside = True
-                c = 0
-            else:
-                hasPointOutside = True
-                c = 1
-            clusters.append(c)
+        newLabels = np.empty(numClusters, dtype=int)
+        newLabels[order] = np.arange(numClusters)
+
+        return newLabels[inverse]
 
-        if hasPointInside and hasPointOutside:
-            return clusters
+    @staticmethod
+    def performClusteringFixedPolygon(index: SpatialIndex, polygon: list[list[float]]) -> Any:
+        # index of the points to cluster, e.g. SpatialIndex.fromEntityTable
+        inside = np.zeros(len(index), dtype=bool)
+        inside[index.queryPolygon(polygon)] = True
+
+        if np.any(inside) and not np.all(inside):
+            return np.where(inside, 0, 1).tolist()
         else:
-            return np.zeros(len(points))
+            return np.zeros(len(index))
 
     @staticmethod
     def performClusteringFixedNumClusters(points: list[list[float]], numClusters: int, unevenClusters: bool = False) -> (Any, int, list[float]):
@@ -197,18 +276,87 @@ class Util:
         return Util._performClustering(X, numClusters, None, unevenClusters)
 
     @staticmethod
-    def performClusteringMaxFurthestDistance(points: list[list[float]], maxFurthestDistance: float) -> (Any, int, list[float]):
+    def performClusteringMaxFurthestDistance(points: list[list[float]], maxFurthestDistance: float, tiled: bool = False) -> (Any, int, list[float]):
+        # if tiled then the points are clustered in tiles of at most MAX_POINTS_PER_TILE points (for large sets of points)
         X = np.array(points)
-        return Util._performClustering(X, None, maxFurthestDistance, True)
+        return Util._performClustering(X, None, maxFurthestDistance, True, tiled=tiled and len(X) > Util.MAX_POINTS_PER_TILE)
+
+    @staticmethod
+    def groupByLabel(labels: Any) -> (np.ndarray, list[np.ndarray]):
+        # distinct labels (ascending) and the indices (ascending) of each of them, i.e. the same as np.where(labels == label)
+        # for every label but without comparing all labels per label
+        labels = np.asarray(labels)
+        order = np.argsort(labels, kind="stable")
+        uniqueLabels, starts = np.unique(labels[order], return_index=True)
+        return uniqueLabels, np.split(order, starts[1:])
+
+    @staticmethod
+    def _exceedsClusteringLimits(clusters: Any, maxClusterSize: int, furthestDistances: list[float], maxPoints: int, maxFurthestDistance: float) -> bool:
+        numPoints = len(clusters)
+        clusterSizes = np.bincount(clusters)
+        furthestDistanceWeightedMean = 0
+        for cluster in np.unique(clusters):
+            furthestDistanceWeightedMean += clusterSizes[cluster] * furthestDistances[cluster]
+        furthestDistanceWeightedMean /= max(1, numPoints)
+
+        return 0 < maxPoints < maxClusterSize or furthestDistanceWeightedMean > maxFurthestDistance
+
+    @staticmethod
+    def _getBisectionCandidates(search: ClusterCountSearch, nonValidNumClusters: set[int], smallestValidNumClusters: int, numClusters: int,
+            maxPoints: int, maxFurthestDistance: float, maxCandidates: int) -> list[tuple[int, bool]]:
+        # the evaluations (number of clusters and whether without warm start) the bisection of performClustering may do
+        # next, breadth-first for both outcomes of every evaluation not done yet. empty if the next one is already done
+        candidates = []
+        states = collections.deque([(frozenset(nonValidNumClusters), smallestValidNumClusters, numClusters)])
+        while states and len(candidates) < maxCandidates:
+            nonValid, smallestValid, numClusters = states.popleft()
+            coldStart = False
+            if max(nonValid) + 1 == smallestValid:
+                if not search.willBeWarmStarted(max(nonValid)):
+                    continue
+                numClusters = max(nonValid)
+                coldStart = True
+
+            if not coldStart and numClusters in search.results:
+                outcomes = [Util._exceedsClusteringLimits(*search.results[numClusters], maxPoints, maxFurthestDistance)]
+            else:
+                if (numClusters, coldStart) not in candidates and not search.isPrecomputed(numClusters, coldStart):
+                    candidates.append((numClusters, coldStart))
+                outcomes = [False, True]
+
+            if not candidates:
+                return []
+
+            for exceededLimits in outcomes:
+                if not exceededLimits:
+                    nonValidNext = nonValid - {numClusters}
+                    states.append((nonValidNext, numClusters, math.floor((max(nonValidNext) + numClusters) / 2)))
+                elif not coldStart:
+                    states.append((nonValid | {numClusters}, smallestValid, math.ceil((numClusters + smallestValid) / 2)))
+
+        return candidates
 
     @staticmethod
-    def performClustering(points: list[list[float]], maxPoints: int, maxFurthestDistance: float, unevenClusters: bool = False) -> (Any, list[float]):
+    def performClustering(points: list[list[float]], maxPoints: int, maxFurthestDistance: float, unevenClusters: bool = False, jobs: int = 1) -> (Any, list[float]):
+        # jobs > 1 evaluates the numbers of clusters the bisection may need next in parallel (for large sets of points),
+        # the result is the same as with jobs = 1
         numPoints = len(points)
         if numPoints == 1:
             return np.array([0]), [0]
 
         X = np.array(points)
 
+        cacheKey = None
+        if ClusteringCache.directory is not None:
+            cacheKey = ClusteringCache.getKey(X, ["performClustering", maxPoints, maxFurthestDistance, unevenClusters])
+            cached = ClusteringCache.load(cacheKey)
+            if cached is not None:
+                print("\t\treusing cached clustering consisting of " + str(len(cached[1])) + " clusters")
+                return cached
+
+        search = ClusterCountSearch(X, unevenClusters)
+
+        nonValidNumClusters = {0}
         largestNonValidNumClusters = 0
         smallestValidNumClusters = None
         clustersForSmallestValidNumClusters = None
@@ -219,18 +367,28 @@ class Util:
         else:
             numClusters = 1
 
-        while largestNonValidNumClusters + 1 != smallestValidNumClusters:
-            clusters, maxClusterSize, furthestDistances = Util._performClustering(X, numClusters, None, unevenClusters)
-
-            furthestDistanceWeightedMean = 0
-            for cluster in np.unique(clusters):
-                clusterEntries = np.where(clusters == cluster)
-                clusterSize = len(clusterEntries[0])
-                furthestDistanceWeightedMean += clusterSize * furthestDistances[cluster]
-            furthestDistanceWeightedMean /= max(1, numPoints)
+        while True:
+            if search.canRunInParallel(jobs):
+                candidates = Util._getBisectionCandidates(search, nonValidNumClusters, smallestValidNumClusters, numClusters,
+                    maxPoints, maxFurthestDistance, jobs)
+                for candidate, result in zip(candidates, ProcessPool.map(search, "fitPredictCandidate", candidates, jobs)):
+                    search.addPrecomputed(*candidate, result)
+
+            if largestNonValidNumClusters + 1 == smallestValidNumClusters:
+                if not search.isWarmStarted(largestNonValidNumClusters):
+                    break
+                # a warm-started k-means may be worse than running k-means++ ten times, so verify the lower bound with the latter
+                search.discard(largestNonValidNumClusters)
+                numClusters = largestNonValidNumClusters
+
+            if numClusters in search.results:
+                clusters, maxClusterSize, furthestDistances = search.results[numClusters]
+            else:
+                clusters, maxClusterSize, furthestDistances = Util._performClustering(X, numClusters, None, unevenClusters, search)
 
-            exceededLimits = 0 < maxPoints < maxClusterSize or furthestDistanceWeightedMean > maxFurthestDistance
+            exceededLimits = Util._exceedsClusteringLimits(clusters, maxClusterSize, furthestDistances, maxPoints, maxFurthestDistance)
             if exceededLimits:
+                nonValidNumClusters.add(numClusters)
                 largestNonValidNumClusters = numClusters
                 if smallestValidNumClusters is None:
                     nextNumClusters = numClusters + 1
@@ -247,10 +405,17 @@ class Util:
                 clustersForSmallestValidNumClusters = clusters
                 furthestDistancesForSmallestValidNumClusters = furthestDistances
                 smallestValidNumClusters = numClusters
+                # from now on evaluations do not depend on each other (see ClusterCountSearch)
+                search.freezeCenters()
+                nonValidNumClusters.discard(numClusters)
+                largestNonValidNumClusters = max(nonValidNumClusters)
                 numClusters = math.floor((largestNonValidNumClusters + smallestValidNumClusters) / 2)
 
         print("\t\tfound valid clustering consisting of " + str(len(np.unique(clustersForSmallestValidNumClusters))) + " clusters")
 
+        if cacheKey is not None:
+            ClusteringCache.store(cacheKey, clustersForSmallestValidNumClusters, furthestDistancesForSmallestValidNumClusters)
+
         return clustersForSmallestValidNumClusters, furthestDistancesForSmallestValidNumClusters
 
     @staticmethod
@@ -301,11 +466,43 @@ class Util:
 
         return math.radians(result)
 
+    @staticmethod
+    def listDir(path: str) -> list[str]:
+        if InMemoryFiles.contains(path):
+            return InMemoryFiles.listDir(path)
+        return os.listdir(path)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        if InMemoryFiles.contains(path):
+            return InMemoryFiles.exists(path)
+        return os.path.exists(path)
+
+    @staticmethod
+    def isFile(path: str) -> bool:
+        if InMemoryFiles.contains(path):
+            return InMemoryFiles.isFile(path)
+        return os.path.isfile(path)
+
+    @staticmethod
+    def makeDirs(path: str):
+        if InMemoryFiles.contains(path):
+            InMemoryFiles.makeDirs(path)
+        else:
+            os.makedirs(path)
+
+    @staticmethod
+    def removeFile(path: str):
+        if InMemoryFiles.contains(path):
+            InMemoryFiles.remove(path)
+        else:
+            os.remove(path)
+
     @staticmethod
     def getListOfFiles(inputDir: str, filter: Optional[Callable[[str], bool]] = None):
         result = []
-        for filename in natsorted(os.listdir(inputDir)):
-            if os.path.isfile(os.path.join(inputDir, filename)) and (filter is None or filter(filename)):
+        for filename in natsorted(Util.listDir(inputDir)):
+            if Util.isFile(os.path.join(inputDir, filename)) and (filter is None or filter(filename)):
                 result.append(filename)
 
         return result
@@ -317,22 +514,117 @@ class Util:
 
     @staticmethod
     def copyFile(inputDir: str, outputDir: str, filename: str, filenameDestination: Optional[str] = None):
+        source = os.path.join(inputDir, filename)
         destination = os.path.join(outputDir, filename if filenameDestination is None else filenameDestination)
-        if not os.path.isfile(destination):
-            shutil.copyfile(os.path.join(inputDir, filename), destination)
+        if Util.isFile(destination):
+            return
+
+        if InMemoryFiles.contains(source) or InMemoryFiles.contains(destination):
+            if InMemoryFiles.contains(source):
+                content = InMemoryFiles.readBytesOrStr(source)
+                Metrics.addFileRead(len(content))
+            else:
+                content = Util.readFileBytes(source)
+            Util.writeFile(destination, content)
+        else:
+            startTime = time.perf_counter()
+            shutil.copyfile(source, destination)
+            if Metrics.enabled:
+                numBytes = os.path.getsize(destination)
+                Metrics.addFileRead(numBytes)
+                Metrics.addFileWritten(numBytes, startTime)
 
     @staticmethod
     def readFile(path: str) -> str:
+        startTime = time.perf_counter()
+        if InMemoryFiles.contains(path):
+            content = InMemoryFiles.read(path)
+            Metrics.addFileRead(len(content))
+            return content
+
         file = open(path, 'r')
         content = file.read()
         file.close()
+        Metrics.addFileRead(len(content), startTime)
         return content
 
     @staticmethod
-    def writeFile(path: str, content: str):
+    def readFileBytes(path: str) -> bytes:
+        startTime = time.perf_counter()
+        if InMemoryFiles.contains(path):
+            content = InMemoryFiles.readBytesOrStr(path)
+            Metrics.addFileRead(len(content))
+            return content.encode("utf-8") if isinstance(content, str) else content
+
+        file = open(path, 'rb')
+        content = file.read()
+        file.close()
+        Metrics.addFileRead(len(content), startTime)
+        return content
+
+    @staticmethod
+    def openFileView(path: str) -> Union[str, mmap.mmap]:
+        # read-only view of a file without copying its content: files on disk are memory-mapped (offsets are byte offsets as
+        # yielded by YmapParser.iterateItemsOfFile) and in-memory files are returned as they are (character offsets).
+        # files on disk containing \r are read as text instead since reading them as text translates their line breaks.
+        # the view has to be closed again (see closeFileView)
+        if InMemoryFiles.contains(path):
+            content = InMemoryFiles.read(path)
+            Metrics.addFileRead(len(content))
+            return content
+
+        startTime = time.perf_counter()
+        file = open(path, 'rb')
+        try:
+            if os.fstat(file.fileno()).st_size == 0:
+                return ""
+            view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            file.close()
+
+        if view.find(b"\r") >= 0:
+            view.close()
+            return Util.readFile(path)
+
+        Metrics.addFileRead(len(view), startTime)
+        return view
+
+    @staticmethod
+    def closeFileView(view: Union[str, mmap.mmap]):
+        if isinstance(view, mmap.mmap):
+            view.close()
+
+    @staticmethod
+    def writeFileParts(path: str, parts: Iterable[Union[str, bytes]]):
+        # same as writeFile("".join(parts)) with bytes decoded as utf-8 (e.g. slices of a view, see openFileView)
+        # but for files on disk every part is written as it is instead of joining them first
+        if InMemoryFiles.contains(path):
+            Util.writeFile(path, "".join(part if isinstance(part, str) else part.decode("utf-8") for part in parts))
+            return
+
+        startTime = time.perf_counter()
+        numBytes = 0
         file = open(path, 'w')
+        for part in parts:
+            if not isinstance(part, str):
+                part = part.decode("utf-8")
+            file.write(part)
+            numBytes += len(part)
+        file.close()
+        Metrics.addFileWritten(numBytes, startTime)
+
+    @staticmethod
+    def writeFile(path: str, content: Union[str, bytes]):
+        startTime = time.perf_counter()
+        if InMemoryFiles.contains(path):
+            InMemoryFiles.write(path, content)
+            Metrics.addFileWritten(len(content))
+            return
+
+        file = open(path, 'wb' if isinstance(content, bytes) else 'w')
         file.write(content)
         file.close()
+        Metrics.addFileWritten(len(content), startTime)
 
     @staticmethod
     def calculateAngle(vertexMiddle: list[float], vertex1: list[float], vertex2: list[float]) -> float:
@@ -367,10 +659,10 @@ class Util:
         else:
             newMapName = mapName
 
-        if os.path.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName))):
+        if Util.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName))):
             newMapName = re.sub(suffix + "\\d*$", "", newMapName) + suffix
             i = -1
-            while os.path.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName + ("" if i < 0 else str(i))))):
+            while Util.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName + ("" if i < 0 else str(i))))):
                 i += 1
             if i >= 0:
                 newMapName += str(i)
@@ -396,6 +688,31 @@ class Util:
     def applyTransformation(vertex: list[float], rotation: list[float], scaling: list[float], translation: list[float]) -> list[float]:
         return np.add(np.multiply(Util.applyRotation(vertex, rotation), scaling), translation).tolist()
 
+    @staticmethod
+    def applyRotations(vertices: np.ndarray, rotations: np.ndarray) -> np.ndarray:
+        # same as applyRotation for every row of vertices and rotations (with the same floating point operations, so the results are identical)
+        quaternions = np.zeros((len(vertices), 4))
+        quaternions[:, 1:] = vertices
+        conjugates = rotations * np.array([1.0, -1, -1, -1])
+        return Util._multiplyQuaternions(rotations, Util._multiplyQuaternions(quaternions, conjugates))[:, 1:]
+
+    @staticmethod
+    def applyTransformations(vertices: np.ndarray, rotations: np.ndarray, scalings: np.ndarray, translations: np.ndarray) -> np.ndarray:
+        # same as applyTransformation for every row of vertices, rotations, scalings and translations
+        return Util.applyRotations(vertices, rotations) * scalings + translations
+
+    @staticmethod
+    def _multiplyQuaternions(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
+        # Hamilton product of every row (w, x, y, z) as in transforms3d.quaternions.qmult
+        w1, x1, y1, z1 = q1.T
+        w2, x2, y2, z2 = q2.T
+        return np.column_stack((
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
+            w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2
+        ))
+
     @staticmethod
     def hashFloat(val: float) -> int:
         return hash(round(val, ndigits=5))
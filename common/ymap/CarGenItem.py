@@ -0,0 +1,21 @@
+from typing import Optional
+
+from common.ymap.EntityItem import EntityItem
+
+
+class CarGenItem(EntityItem):
+    # offsets of the whole car generator <Item> block within the parsed source (see EntityDefItem)
+    start: int
+    end: int
+    orientX: float
+    orientY: float
+    perpendicularLength: float
+
+    def __init__(self, carModel: str, position: list[float], orientX: float, orientY: float, perpendicularLength: float, flags: Optional[int] = None,
+            start: int = -1, end: int = -1):
+        super().__init__(carModel, position, [1, 1, 1], [1, 0, 0, 0], -1, flags=flags)
+        self.orientX = orientX
+        self.orientY = orientY
+        self.perpendicularLength = perpendicularLength
+        self.start = start
+        self.end = end
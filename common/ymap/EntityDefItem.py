@@ -0,0 +1,21 @@
+from typing import Optional
+
+from common.ymap.EntityItem import EntityItem
+
+
+class EntityDefItem(EntityItem):
+    # offsets of the whole <Item type="CEntityDef"> block (including indentation and trailing line break)
+    # within the parsed source, i.e. source[start:end] yields the complete entity
+    start: int
+    end: int
+    guid: Optional[int]
+    priorityLevel: Optional[str]
+
+    def __init__(self, archetypeName: str, position: list[float], scale: list[float], rotation: list[float], lodDistance: float, childLodDist: Optional[float] = None,
+            parentIndex: Optional[int] = None, numChildren: Optional[int] = None, lodLevel: Optional[str] = None, flags: Optional[int] = None,
+            guid: Optional[int] = None, priorityLevel: Optional[str] = None, start: int = -1, end: int = -1):
+        super().__init__(archetypeName, position, scale, rotation, lodDistance, childLodDist, parentIndex, numChildren, lodLevel, flags)
+        self.guid = guid
+        self.priorityLevel = priorityLevel
+        self.start = start
+        self.end = end
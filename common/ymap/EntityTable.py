@@ -0,0 +1,166 @@
+import mmap
+import os
+from typing import Callable, Iterable, Optional, Union
+
+import numpy as np
+from natsort import natsorted
+
+from common.Util import Util
+from common.ymap.EntityDefItem import EntityDefItem
+from common.ymap.EntityItem import EntityItem
+from common.ymap.LodLevel import LodLevel
+from common.ymap.YmapParser import YmapParser
+
+
+class EntityTable:
+    # Columnar representation of all CEntityDef of one or more ymap files.
+    # Every row is one entity in the order in which it appears in the (natsorted) ymap files.
+    # Strings are not stored per entity but as indices into archetypeNames, mapNames and LOD_LEVELS.
+
+    LOD_LEVELS = [LodLevel.ORPHAN_HD, LodLevel.HD, LodLevel.LOD, LodLevel.SLOD1, LodLevel.SLOD2, LodLevel.SLOD3, LodLevel.SLOD4]
+
+    DTYPE = np.dtype([
+        ("archetype", np.int32),
+        ("position", np.float64, (3,)),
+        ("rotation", np.float64, (4,)),  # order is w, -x, -y, -z (see EntityItem)
+        ("scaleXY", np.float64),
+        ("scaleZ", np.float64),
+        ("flags", np.int64),
+        ("lodDist", np.float64),
+        ("parentIndex", np.int32),
+        ("lodLevel", np.int8),  # index into LOD_LEVELS or -1 if not specified
+        ("map", np.int32),
+        ("start", np.int64),  # offsets of the <Item> block within the source (bytes for files, characters for str content)
+        ("end", np.int64),
+    ])
+
+    archetypeNames: list[str]
+    mapNames: list[str]
+
+    @staticmethod
+    def readDirectory(path: str, filenameFilter: Optional[Callable[[str], bool]] = None) -> "EntityTable":
+        table = EntityTable()
+        for filename in natsorted(Util.listDir(path)):
+            if not filename.endswith(".ymap.xml") or (filenameFilter is not None and not filenameFilter(filename)):
+                continue
+
+            table.addFile(os.path.join(path, filename))
+
+        return table
+
+    @staticmethod
+    def readFile(path: str) -> "EntityTable":
+        table = EntityTable()
+        table.addFile(path)
+        return table
+
+    @staticmethod
+    def readContent(content: str, mapName: str = "") -> "EntityTable":
+        table = EntityTable()
+        table.addContent(content, mapName)
+        return table
+
+    def __init__(self):
+        self._entities = np.empty(0, dtype=EntityTable.DTYPE)
+        self._pendingRows = []
+        self.archetypeNames = []
+        self.mapNames = []
+        self._archetypeIds = {}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    @property
+    def entities(self) -> np.ndarray:
+        if self._pendingRows:
+            self._entities = np.concatenate([self._entities] + self._pendingRows)
+            self._pendingRows = []
+        return self._entities
+
+    def addFile(self, path: str):
+        self._pendingRows.append(self._createRows(YmapParser.iterateEntitiesOfFile(path), Util.getMapnameFromFilename(os.path.basename(path))))
+
+    def addView(self, view: Union[str, mmap.mmap], mapName: str = ""):
+        # view as returned by Util.openFileView
+        self._pendingRows.append(self._createRows(YmapParser.iterateEntitiesOfView(view), mapName))
+
+    def addContent(self, content: str, mapName: str = ""):
+        self._pendingRows.append(self._createRows(YmapParser.iterateEntitiesOfContent(content), mapName))
+
+    def _getArchetypeId(self, archetypeName: str) -> int:
+        archetypeId = self._archetypeIds.get(archetypeName)
+        if archetypeId is None:
+            archetypeId = len(self.archetypeNames)
+            self._archetypeIds[archetypeName] = archetypeId
+            self.archetypeNames.append(archetypeName)
+        return archetypeId
+
+    def _createRows(self, entities: Iterable[EntityDefItem], mapName: str) -> np.ndarray:
+        mapIndex = len(self.mapNames)
+        self.mapNames.append(mapName)
+
+        rows = []
+        for entity in entities:
+            rows.append((
+                self._getArchetypeId(entity.archetypeName),
+                entity.position,
+                entity.rotation,
+                entity.scale[0],
+                entity.scale[2],
+                -1 if entity.flags is None else entity.flags,
+                entity.lodDistance,
+                -1 if entity.parentIndex is None else entity.parentIndex,
+                EntityTable.LOD_LEVELS.index(entity.lodLevel) if entity.lodLevel in EntityTable.LOD_LEVELS else -1,
+                mapIndex,
+                entity.start,
+                entity.end
+            ))
+
+        return np.array(rows, dtype=EntityTable.DTYPE)
+
+    def select(self, mask: np.ndarray) -> "EntityTable":
+        table = EntityTable()
+        table._entities = self.entities[mask]
+        table.archetypeNames = self.archetypeNames
+        table.mapNames = self.mapNames
+        table._archetypeIds = self._archetypeIds
+        return table
+
+    def getPositions(self) -> np.ndarray:
+        return self.entities["position"]
+
+    def getRotations(self) -> np.ndarray:
+        return self.entities["rotation"]
+
+    def getScales(self) -> np.ndarray:
+        scaleXY = self.entities["scaleXY"]
+        return np.column_stack((scaleXY, scaleXY, self.entities["scaleZ"]))
+
+    def getArchetypeName(self, index: int) -> str:
+        return self.archetypeNames[self.entities["archetype"][index]]
+
+    def getLodLevel(self, index: int) -> Optional[str]:
+        lodLevel = self.entities["lodLevel"][index]
+        return None if lodLevel < 0 else EntityTable.LOD_LEVELS[lodLevel]
+
+    def getMapName(self, index: int) -> str:
+        return self.mapNames[self.entities["map"][index]]
+
+    def maskArchetypes(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        # evaluates the predicate once per distinct archetype instead of once per entity
+        archetypeMask = np.array([predicate(archetypeName) for archetypeName in self.archetypeNames], dtype=bool)
+        return archetypeMask[self.entities["archetype"]]
+
+    def maskLodLevels(self, lodLevels: Iterable[str]) -> np.ndarray:
+        return np.isin(self.entities["lodLevel"], [EntityTable.LOD_LEVELS.index(lodLevel) for lodLevel in lodLevels])
+
+    def maskMap(self, mapName: str) -> np.ndarray:
+        if mapName not in self.mapNames:
+            return np.zeros(len(self.entities), dtype=bool)
+        return self.entities["map"] == self.mapNames.index(mapName)
+
+    def createEntityItem(self, index: int) -> EntityItem:
+        row = self.entities[index]
+        scaleXY = float(row["scaleXY"])
+        return EntityItem(self.archetypeNames[row["archetype"]], row["position"].tolist(), [scaleXY, scaleXY, float(row["scaleZ"])], row["rotation"].tolist(),
+            float(row["lodDist"]), parentIndex=int(row["parentIndex"]), lodLevel=self.getLodLevel(index), flags=int(row["flags"]))
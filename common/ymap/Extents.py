@@ -1,77 +1,128 @@
 import numpy as np
-import transforms3d
 
 import re
+from typing import Iterable
 
 from common.Box import Box
 from common.Util import Util
-from common.ytyp.YtypItem import YtypItem
+from common.ymap.CarGenItem import CarGenItem
+from common.ymap.EntityItem import EntityItem
+from common.ymap.YmapParser import YmapParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class Extents:
     CARGEN_LOD_DISTANCE = 250
 
+    # index (0 for min and 1 for max) of every coordinate of the 8 corners of a box
+    _CORNERS_X = [0, 1, 0, 1, 0, 1, 0, 1]
+    _CORNERS_Y = [0, 0, 1, 1, 0, 0, 1, 1]
+    _CORNERS_Z = [0, 0, 0, 0, 1, 1, 1, 1]
+
     @staticmethod
     def createReversedInfinityExtents() -> "Extents":
         return Extents(Box.createReversedInfinityBox(), Box.createReversedInfinityBox())
 
     @staticmethod
-    def getExpressionForCalculateExtents() -> str:
-        return '<Item type="CEntityDef">' + \
-               '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"/>' + \
-               '\\s*<scaleXY value="([^"]+)"/>' + \
-               '\\s*<scaleZ value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<lodDist value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
+    def calculateExtents(ymapContent: str, ytypItems: ArchetypeRegistry) -> "Extents":
+        return Extents.calculateExtentsOfItems(YmapParser.iterateItemsOfContent(ymapContent), ytypItems)
 
     @staticmethod
-    def getExpressionForCalculateExtentsCarGen() -> str:
-        return '<Item>' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<perpendicularLength value="([^"]+)"/>' + \
-               '\\s*<carModel>([^<]+)</carModel>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
+    def calculateExtentsOfFile(ymapFile: str, ytypItems: ArchetypeRegistry) -> "Extents":
+        return Extents.calculateExtentsOfItems(YmapParser.iterateItemsOfFile(ymapFile), ytypItems)
 
     @staticmethod
-    def calculateExtents(ymapContent: str, ytypItems: dict[str, YtypItem]) -> "Extents":
+    def calculateExtentsOfItems(items: Iterable[EntityItem], ytypItems: ArchetypeRegistry) -> "Extents":
         extents = Extents.createReversedInfinityExtents()
 
-        for match in re.finditer(Extents.getExpressionForCalculateExtents(), ymapContent):
-            archetypeName = match.group(1).lower()
-
-            if archetypeName not in ytypItems:
-                print("WARNING: could not find archetype " + archetypeName + ". Proceeding without it but this might yield wrong extents")
+        positions = []
+        rotations = []
+        scales = []
+        lodDistances = []
+        # archetype id of every entity (see ArchetypeRegistry) or -1 for car generators whose boxes are given by bboxMins and bboxMaxs
+        archetypeIds = []
+        bboxMins = []
+        bboxMaxs = []
+        for item in items:
+            if isinstance(item, CarGenItem):
+                carModel = item.archetypeName.lower()
+
+                print("INFO: found carGenerator for car model " + carModel + ". Using " + str(Extents.CARGEN_LOD_DISTANCE) + " as lodDistance.")
+
+                bbox = Box.createUnitBox().getScaled([item.perpendicularLength] * 3)
+
+                positions.append(item.position)
+                rotations.append([0, 0, 0, 1])
+                scales.append([1, 1, 1])
+                lodDistances.append(Extents.CARGEN_LOD_DISTANCE)
+                archetypeIds.append(-1)
+                bboxMins.append(bbox.min)
+                bboxMaxs.append(bbox.max)
                 continue
 
-            position = [float(match.group(2)), float(match.group(3)), float(match.group(4))]
-            rotationQuat = [float(match.group(8)), -float(match.group(5)), -float(match.group(6)), -float(match.group(7))]
-            scale = [float(match.group(9)), float(match.group(9)), float(match.group(10))]
-            lodDistance = float(match.group(11))
-            if lodDistance < 0:
-                lodDistance = ytypItems[archetypeName].lodDist
-            bbox = ytypItems[archetypeName].boundingBox
+            archetypeName = item.archetypeName.lower()
+            archetypeId = ytypItems.getId(archetypeName)
 
-            extents.adaptExtents(position, rotationQuat, scale, lodDistance, bbox)
-
-        for match in re.finditer(Extents.getExpressionForCalculateExtentsCarGen(), ymapContent):
-            perpendicularLength = float(match.group(4))
-            carModel = match.group(5).lower()
+            if archetypeId < 0:
+                print("WARNING: could not find archetype " + archetypeName + ". Proceeding without it but this might yield wrong extents")
+                continue
 
-            print("INFO: found carGenerator for car model " + carModel + ". Using " + str(Extents.CARGEN_LOD_DISTANCE) + " as lodDistance.")
+            positions.append(item.position)
+            rotations.append(item.rotation)
+            scales.append(item.scale)
+            lodDistances.append(item.lodDistance)
+            archetypeIds.append(archetypeId)
+            bboxMins.append([0, 0, 0])
+            bboxMaxs.append([0, 0, 0])
+
+        archetypeIds = np.array(archetypeIds, dtype=np.int32)
+        lodDistances = np.array(lodDistances, dtype=float)
+        bboxMins = np.array(bboxMins, dtype=float).reshape(-1, 3)
+        bboxMaxs = np.array(bboxMaxs, dtype=float).reshape(-1, 3)
+
+        isArchetype = archetypeIds >= 0
+        ids = archetypeIds[isArchetype]
+        bboxMins[isArchetype] = ytypItems.getBoundingBoxMins()[ids]
+        bboxMaxs[isArchetype] = ytypItems.getBoundingBoxMaxs()[ids]
+        useArchetypeLodDistance = isArchetype & (lodDistances < 0)
+        lodDistances[useArchetypeLodDistance] = ytypItems.getLodDists()[archetypeIds[useArchetypeLodDistance]]
+
+        extents.adaptExtentsOfArrays(np.array(positions, dtype=float), np.array(rotations, dtype=float), np.array(scales, dtype=float),
+            lodDistances, bboxMins, bboxMaxs)
 
-            position = [float(match.group(1)), float(match.group(2)), float(match.group(3))]
-            bbox = Box.createUnitBox().getScaled([perpendicularLength] * 3)
+        return extents
 
-            extents.adaptExtents(position, [0, 0, 0, 1], [1, 1, 1], Extents.CARGEN_LOD_DISTANCE, bbox)
+    @staticmethod
+    def _rotateVectors(vectors: np.ndarray, rotationQuaternions: np.ndarray) -> np.ndarray:
+        # same as transforms3d.quaternions.rotate_vector (i.e. q * v * conjugate(q)) for vectors of shape (..., 3) and quaternions
+        # of shape (..., 4) but for all of them at once. the floating point operations are exactly the same as in rotate_vector
+        # (including their order) so that the results are identical
+        w1, x1, y1, z1 = [rotationQuaternions[..., i] for i in range(4)]
+        w2, x2, y2, z2 = w1 * 1.0, x1 * -1.0, y1 * -1.0, z1 * -1.0
+        vw = 0.0
+        vx, vy, vz = [vectors[..., i] for i in range(3)]
+
+        w = vw * w2 - vx * x2 - vy * y2 - vz * z2
+        x = vw * x2 + vx * w2 + vy * z2 - vz * y2
+        y = vw * y2 + vy * w2 + vz * x2 - vx * z2
+        z = vw * z2 + vz * w2 + vx * y2 - vy * x2
+
+        return np.stack([
+            w1 * x + x1 * w + y1 * z - z1 * y,
+            w1 * y + y1 * w + z1 * x - x1 * z,
+            w1 * z + z1 * w + x1 * y - y1 * x
+        ], axis=-1)
 
-        return extents
+    @staticmethod
+    def _getTransformedCorners(positions: np.ndarray, rotations: np.ndarray, bboxMins: np.ndarray, bboxMaxs: np.ndarray) -> np.ndarray:
+        # all 8 corners of every box, shape (n, 8, 3)
+        bounds = np.stack([bboxMins, bboxMaxs], axis=1)
+        corners = np.stack([
+            bounds[:, Extents._CORNERS_X, 0],
+            bounds[:, Extents._CORNERS_Y, 1],
+            bounds[:, Extents._CORNERS_Z, 2]
+        ], axis=-1)
+        return Extents._rotateVectors(corners, rotations[:, np.newaxis, :]) + positions[:, np.newaxis, :]
 
     entities: Box
     streaming: Box
@@ -97,19 +148,27 @@ class Extents:
         )
 
     def adaptExtents(self, position: list[float], rotationQuaternion: list[float], scale: list[float], lodDistance: float, bbox: Box):
-        scaledBbox = bbox.getScaled(scale)
-        scaledLodBbox = scaledBbox.getExtended([lodDistance] * 3)
-
-        scaledBboxList = [scaledBbox.min, scaledBbox.max]
-        scaledLodBboxList = [scaledLodBbox.min, scaledLodBbox.max]
-        for i in range(8):
-            point = [scaledBboxList[i % 2][0], scaledBboxList[(i >> 1) % 2][1], scaledBboxList[(i >> 2) % 2][2]]
-            transformedPoint = np.add(transforms3d.quaternions.rotate_vector(point, rotationQuaternion), position).tolist()
-            self.entities.extendByPoint(transformedPoint)
-
-            lodPoint = [scaledLodBboxList[i % 2][0], scaledLodBboxList[(i >> 1) % 2][1], scaledLodBboxList[(i >> 2) % 2][2]]
-            transformedLodPoint = np.add(transforms3d.quaternions.rotate_vector(lodPoint, rotationQuaternion), position).tolist()
-            self.streaming.extendByPoint(transformedLodPoint)
+        self.adaptExtentsOfArrays(np.array([position], dtype=float), np.array([rotationQuaternion], dtype=float), np.array([scale], dtype=float),
+            np.array([lodDistance], dtype=float), np.array([bbox.min], dtype=float), np.array([bbox.max], dtype=float))
+
+    def adaptExtentsOfArrays(self, positions: np.ndarray, rotations: np.ndarray, scales: np.ndarray, lodDistances: np.ndarray,
+            bboxMins: np.ndarray, bboxMaxs: np.ndarray):
+        # same as calling adaptExtents for every row but with one rotation of all corners of all boxes at once
+        if len(positions) == 0:
+            return
+
+        scaledBboxMins = bboxMins * scales
+        scaledBboxMaxs = bboxMaxs * scales
+        scaledLodBboxMins = scaledBboxMins - lodDistances[:, np.newaxis]
+        scaledLodBboxMaxs = scaledBboxMaxs + lodDistances[:, np.newaxis]
+
+        corners = Extents._getTransformedCorners(positions, rotations, scaledBboxMins, scaledBboxMaxs).reshape(-1, 3)
+        self.entities.extendByPoint(corners.min(axis=0))
+        self.entities.extendByPoint(corners.max(axis=0))
+
+        lodCorners = Extents._getTransformedCorners(positions, rotations, scaledLodBboxMins, scaledLodBboxMaxs).reshape(-1, 3)
+        self.streaming.extendByPoint(lodCorners.min(axis=0))
+        self.streaming.extendByPoint(lodCorners.max(axis=0))
 
     def isValid(self):
         return self.entities.isValid() and self.streaming.isValid()
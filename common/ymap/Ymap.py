@@ -1,21 +1,38 @@
 import math
 import re
 from re import Match
-from typing import Optional
+from typing import Callable, Optional
 
 from common.Util import Util
+from common.ymap.EntityDefItem import EntityDefItem
 from common.ymap.Extents import Extents
 from common.ymap.PriorityLevel import PriorityLevel
+from common.ymap.YmapParser import YmapParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 from common.ytyp.YtypItem import YtypItem
 
 
 class Ymap:
+    _PATTERN_LOD_DISTANCE = re.compile('(\\s*<Item type="CEntityDef">' +
+                                       '\\s*<archetypeName>([^<]+)</archetypeName>' +
+                                       '(?:\\s*<[^/].*>)*?' +
+                                       '\\s*<scaleXY value="([^"]+)"\\s*/>' +
+                                       '\\s*<scaleZ value="([^"]+)"\\s*/>' +
+                                       '\\s*<parentIndex value="([^"]+)"/>' +
+                                       '(?:\\s*<[^/].*>)*?' +
+                                       '\\s*<lodDist value=")([^"]+)("\\s*/>' +
+                                       '(?:\\s*<[^/].*>)*?' +
+                                       '\\s*<priorityLevel>)[^<]*(</priorityLevel>'
+                                       '(?:\\s*<[^/].*>)*?' +
+                                       '\\s*</Item>)', flags=re.M)
+
     @staticmethod
-    def _replCalculateAndReplaceLodDistance(match: Match, ytypItems: dict[str, YtypItem], archetypes: Optional[list[str]], forceHasParent: bool):
+    def _calculateLodDistance(match: Match, ytypItems: dict[str, YtypItem], archetypes: Optional[list[str]], forceHasParent: bool) -> Optional[tuple[float, str]]:
+        # returns the new lod distance and priority level or None if the entity should be left unchanged
         archetypeName = match.group(2).lower()
 
         if archetypes is not None and archetypeName not in archetypes:
-            return match.group(0)
+            return None
 
         hasParent = True if forceHasParent else int(match.group(5)) >= 0
 
@@ -33,24 +50,20 @@ class Ymap:
             # (as seen in original Rockstar ymap files)
             lodDistance = -1
 
+        return lodDistance, priorityLevel
+
+    @staticmethod
+    def _replCalculateAndReplaceLodDistance(match: Match, ytypItems: dict[str, YtypItem], archetypes: Optional[list[str]], forceHasParent: bool):
+        result = Ymap._calculateLodDistance(match, ytypItems, archetypes, forceHasParent)
+        if result is None:
+            return match.group(0)
+
+        lodDistance, priorityLevel = result
         return match.group(1) + Util.floatToStr(lodDistance) + match.group(7) + priorityLevel + match.group(8)
 
     @staticmethod
     def calculateAndReplaceLodDistance(contentNoLod: str, ytypItems: dict[str, YtypItem], archetypes=None, forceHasParent=False) -> str:
-        pattern = re.compile('(\\s*<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<scaleXY value="([^"]+)"\\s*/>' +
-                             '\\s*<scaleZ value="([^"]+)"\\s*/>' +
-                             '\\s*<parentIndex value="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<lodDist value=")([^"]+)("\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<priorityLevel>)[^<]*(</priorityLevel>'
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>)', flags=re.M)
-
-        return pattern.sub(lambda match: Ymap._replCalculateAndReplaceLodDistance(match, ytypItems, archetypes, forceHasParent), contentNoLod)
+        return Ymap._PATTERN_LOD_DISTANCE.sub(lambda match: Ymap._replCalculateAndReplaceLodDistance(match, ytypItems, archetypes, forceHasParent), contentNoLod)
 
     @staticmethod
     def replaceDatetime(content: str, nowIso: str) -> str:
@@ -85,7 +98,7 @@ class Ymap:
 
     # adapt extents and set current datetime
     @staticmethod
-    def fixMapExtents(content: str, ytypItems: dict[str, YtypItem]) -> str:
+    def fixMapExtents(content: str, ytypItems: ArchetypeRegistry) -> str:
             extents = Extents.calculateExtents(content, ytypItems)
 
             if extents.isValid():
@@ -94,3 +107,48 @@ class Ymap:
                 result = content
 
             return Ymap.replaceDatetime(result, Util.getNowInIsoFormat())
+
+    # same as applying replEntity to every entity (return "" to remove it), replaceName (if name is given), calculateAndReplaceLodDistance
+    # and fixMapExtents one after another, but in one traversal of the items of the ymap. all the regular expressions of these
+    # are applied to the single entities and the few lines before the first and after the last item only
+    @staticmethod
+    def rewrite(content: str, ytypItems: ArchetypeRegistry, replEntity: Optional[Callable[[EntityDefItem, str], str]] = None,
+            name: Optional[str] = None) -> str:
+        parts = []
+        items = []
+        last = 0
+        for item in YmapParser.iterateItemsOfContent(content):
+            parts.append(content[last:item.start])
+            itemContent = content[item.start:item.end]
+            last = item.end
+
+            if isinstance(item, EntityDefItem):
+                if replEntity is not None:
+                    newItemContent = replEntity(item, itemContent)
+                    if newItemContent != itemContent:
+                        itemContent = newItemContent
+                        item = YmapParser.parseEntity(itemContent)
+
+                match = None if item is None else Ymap._PATTERN_LOD_DISTANCE.search(itemContent)
+                if match is not None:
+                    lodDistance, priorityLevel = Ymap._calculateLodDistance(match, ytypItems, None, False)
+                    itemContent = itemContent[:match.start()] + match.group(1) + Util.floatToStr(lodDistance) + match.group(7) + \
+                        priorityLevel + match.group(8) + itemContent[match.end():]
+                    item.lodDistance = lodDistance
+
+            parts.append(itemContent)
+            if item is not None:
+                items.append(item)
+        parts.append(content[last:])
+
+        if name is not None:
+            parts[0] = Ymap.replaceName(parts[0], name)
+            if len(parts) > 1:
+                parts[-1] = Ymap.replaceName(parts[-1], name)
+
+        extents = Extents.calculateExtentsOfItems(items, ytypItems)
+        if extents.isValid():
+            parts[0] = extents.replaceExtents(parts[0])
+        parts[-1] = Ymap.replaceDatetime(parts[-1], Util.getNowInIsoFormat())
+
+        return "".join(parts)
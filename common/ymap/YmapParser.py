@@ -0,0 +1,185 @@
+import io
+import itertools
+import mmap
+import re
+from typing import Iterable, Iterator, Optional, Union
+
+from common.InMemoryFiles import InMemoryFiles
+from common.Metrics import Metrics
+from common.ymap.CarGenItem import CarGenItem
+from common.ymap.EntityDefItem import EntityDefItem
+from common.ymap.EntityItem import EntityItem
+
+
+class YmapParser:
+    # Streaming parser for ymap.xml files as written by OpenIV/CodeWalker (one element per line).
+    # Instead of matching whole entities with (lazy) regular expressions over the complete file content
+    # the file is processed line by line and every <Item> in <entities> or <carGenerators> is yielded as soon as it is closed.
+    # Nested items (e.g. extensions of an entity) are skipped but are part of the offsets of the enclosing item.
+
+    SECTION_ENTITIES = "entities"
+    SECTION_CAR_GENERATORS = "carGenerators"
+
+    _PATTERN_ELEMENT = re.compile('\\s*<(/?)(\\w+)((?:\\s+\\w+="[^"]*")*)\\s*(/?)>(?:([^<]*)</\\w+>)?')
+    _PATTERN_ATTRIBUTE = re.compile('(\\w+)="([^"]*)"')
+
+    @staticmethod
+    def iterateItemsOfFile(path: str) -> Iterator[EntityItem]:
+        # offsets are byte offsets within the file (character offsets for files kept in memory)
+        if InMemoryFiles.contains(path):
+            content = InMemoryFiles.read(path)
+            Metrics.addFileRead(len(content))
+            yield from YmapParser.iterateItemsOfContent(content)
+            return
+
+        f = open(path, 'rb')
+        try:
+            yield from YmapParser.iterateItems(f)
+            Metrics.addFileRead(f.tell())
+        finally:
+            f.close()
+
+    @staticmethod
+    def iterateItemsOfView(view: Union[str, mmap.mmap]) -> Iterator[EntityItem]:
+        # view as returned by Util.openFileView, offsets are offsets within that view
+        if isinstance(view, str):
+            return YmapParser.iterateItemsOfContent(view)
+
+        view.seek(0)
+        return YmapParser.iterateItems(iter(view.readline, b""))
+
+    @staticmethod
+    def iterateItemsOfContent(content: str) -> Iterator[EntityItem]:
+        # offsets are character offsets within content
+        return YmapParser.iterateItems(io.StringIO(content, newline=''))
+
+    @staticmethod
+    def iterateEntitiesOfFile(path: str) -> Iterator[EntityDefItem]:
+        for item in YmapParser.iterateItemsOfFile(path):
+            if isinstance(item, EntityDefItem):
+                yield item
+
+    @staticmethod
+    def iterateEntitiesOfView(view: Union[str, mmap.mmap]) -> Iterator[EntityDefItem]:
+        for item in YmapParser.iterateItemsOfView(view):
+            if isinstance(item, EntityDefItem):
+                yield item
+
+    @staticmethod
+    def iterateEntitiesOfContent(content: str) -> Iterator[EntityDefItem]:
+        for item in YmapParser.iterateItemsOfContent(content):
+            if isinstance(item, EntityDefItem):
+                yield item
+
+    @staticmethod
+    def parseEntity(entityContent: str) -> Optional[EntityDefItem]:
+        # parses a single <Item type="CEntityDef"> block (e.g. after rewriting it), offsets are character offsets within entityContent
+        prefix = "<" + YmapParser.SECTION_ENTITIES + ">\n"
+        for item in YmapParser.iterateItems(itertools.chain([prefix], io.StringIO(entityContent, newline=''))):
+            if isinstance(item, EntityDefItem):
+                item.start -= len(prefix)
+                item.end -= len(prefix)
+                return item
+        return None
+
+    @staticmethod
+    def iterateItems(lines: Iterable[Union[str, bytes]]) -> Iterator[EntityItem]:
+        offset = 0
+        section = None
+        depth = 0
+        itemStart = 0
+        itemType = None
+        fields = None
+
+        for line in lines:
+            lineStart = offset
+            offset += len(line)
+
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+
+            match = YmapParser._PATTERN_ELEMENT.match(line)
+            if match is None:
+                continue
+
+            closing, tag, attributes, selfClosing, text = match.groups()
+
+            if tag == "Item":
+                if closing:
+                    depth -= 1
+                    if depth == 0 and fields is not None:
+                        item = YmapParser._createItem(section, itemType, fields, itemStart, offset)
+                        fields = None
+                        if item is not None:
+                            yield item
+                elif not selfClosing and text is None:
+                    if depth == 0 and section is not None:
+                        itemStart = lineStart
+                        itemType = YmapParser._getAttributes(attributes).get("type")
+                        fields = {}
+                    depth += 1
+            elif depth == 0:
+                if tag == YmapParser.SECTION_ENTITIES or tag == YmapParser.SECTION_CAR_GENERATORS:
+                    section = None if closing or selfClosing else tag
+            elif depth == 1 and fields is not None and not closing:
+                fields[tag] = attributes if text is None else text
+
+    @staticmethod
+    def _getAttributes(attributes: str) -> dict[str, str]:
+        return dict(YmapParser._PATTERN_ATTRIBUTE.findall(attributes))
+
+    @staticmethod
+    def _getValue(fields: dict[str, str], tag: str) -> Optional[str]:
+        if tag not in fields:
+            return None
+        return YmapParser._getAttributes(fields[tag]).get("value")
+
+    @staticmethod
+    def _getFloat(fields: dict[str, str], tag: str, default: Optional[float] = None) -> Optional[float]:
+        value = YmapParser._getValue(fields, tag)
+        return default if value is None else float(value)
+
+    @staticmethod
+    def _getInt(fields: dict[str, str], tag: str) -> Optional[int]:
+        value = YmapParser._getValue(fields, tag)
+        return None if value is None else int(value)
+
+    @staticmethod
+    def _getVector(fields: dict[str, str], tag: str, components: str) -> Optional[list[float]]:
+        if tag not in fields:
+            return None
+        attributes = YmapParser._getAttributes(fields[tag])
+        return [float(attributes[c]) for c in components]
+
+    @staticmethod
+    def _createItem(section: str, itemType: Optional[str], fields: dict[str, str], start: int, end: int) -> Optional[EntityItem]:
+        if section == YmapParser.SECTION_ENTITIES:
+            if itemType != "CEntityDef" or "archetypeName" not in fields or "position" not in fields:
+                return None
+            return YmapParser._createEntityDefItem(fields, start, end)
+        elif section == YmapParser.SECTION_CAR_GENERATORS:
+            if "position" not in fields:
+                return None
+            return YmapParser._createCarGenItem(fields, start, end)
+        return None
+
+    @staticmethod
+    def _createEntityDefItem(fields: dict[str, str], start: int, end: int) -> EntityDefItem:
+        position = YmapParser._getVector(fields, "position", "xyz")
+
+        rotationXYZW = YmapParser._getVector(fields, "rotation", "xyzw")
+        rotation = [1, 0, 0, 0] if rotationXYZW is None else [rotationXYZW[3], -rotationXYZW[0], -rotationXYZW[1], -rotationXYZW[2]]
+
+        scaleXY = YmapParser._getFloat(fields, "scaleXY", 1)
+        scaleZ = YmapParser._getFloat(fields, "scaleZ", 1)
+
+        return EntityDefItem(fields["archetypeName"], position, [scaleXY, scaleXY, scaleZ], rotation,
+            YmapParser._getFloat(fields, "lodDist", -1), YmapParser._getFloat(fields, "childLodDist"),
+            YmapParser._getInt(fields, "parentIndex"), YmapParser._getInt(fields, "numChildren"), fields.get("lodLevel"),
+            YmapParser._getInt(fields, "flags"), YmapParser._getInt(fields, "guid"), fields.get("priorityLevel"), start, end)
+
+    @staticmethod
+    def _createCarGenItem(fields: dict[str, str], start: int, end: int) -> CarGenItem:
+        return CarGenItem(fields.get("carModel", ""), YmapParser._getVector(fields, "position", "xyz"),
+            YmapParser._getFloat(fields, "orientX", 0), YmapParser._getFloat(fields, "orientY", 0), YmapParser._getFloat(fields, "perpendicularLength", 0),
+            YmapParser._getInt(fields, "flags"), start, end)
@@ -0,0 +1,123 @@
+import os
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from common.ytyp.YtypItem import YtypItem
+from common.ytyp.YtypParser import YtypParser
+
+
+class ArchetypeRegistry:
+    # All archetypes known in one run. It is created once (see main.py) and shared by all workers.
+    # It can be used like the dict[str, YtypItem] returned by YtypParser (keys are lowercase archetype names)
+    # and additionally interns every archetype name to an integer id. The bounding geometry and lod distance of all
+    # archetypes is available as arrays indexed by that id so that it can be gathered for many entities at once (see Extents).
+
+    _ids: dict[str, int]
+    _names: list[str]
+    _items: list[YtypItem]
+    _arrays: Optional[dict[str, np.ndarray]]
+
+    @staticmethod
+    def getResourcesYtypDir() -> str:
+        return os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp")
+
+    @staticmethod
+    def readResources() -> "ArchetypeRegistry":
+        return ArchetypeRegistry.readDirectory(ArchetypeRegistry.getResourcesYtypDir(), True)
+
+    @staticmethod
+    def readDirectory(path: str, useCache: bool = False) -> "ArchetypeRegistry":
+        return ArchetypeRegistry(YtypParser.readYtypDirectory(path, useCache))
+
+    def __init__(self, items: Optional[dict[str, YtypItem]] = None):
+        self._ids = {}
+        self._names = []
+        self._items = []
+        self._arrays = None
+        if items is not None:
+            self.add(items)
+
+    def add(self, items: dict[str, YtypItem]):
+        # same semantics as dict |= items, i.e. an already known archetype is replaced but keeps its id
+        for name, item in items.items():
+            archetypeId = self._ids.get(name)
+            if archetypeId is None:
+                self._ids[name] = len(self._names)
+                self._names.append(name)
+                self._items.append(item)
+            else:
+                self._items[archetypeId] = item
+
+        self._arrays = None
+
+    def __ior__(self, items: dict[str, YtypItem]) -> "ArchetypeRegistry":
+        self.add(items)
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def __getitem__(self, name: str) -> YtypItem:
+        return self._items[self._ids[name]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, name: str, default: Optional[YtypItem] = None) -> Optional[YtypItem]:
+        archetypeId = self._ids.get(name)
+        return default if archetypeId is None else self._items[archetypeId]
+
+    def keys(self) -> list[str]:
+        return list(self._names)
+
+    def values(self) -> list[YtypItem]:
+        return list(self._items)
+
+    def items(self) -> list[tuple[str, YtypItem]]:
+        return list(zip(self._names, self._items))
+
+    def getId(self, name: str) -> int:
+        # -1 if there is no such archetype
+        return self._ids.get(name, -1)
+
+    def getIds(self, names: Iterable[str]) -> np.ndarray:
+        # -1 for every name without such an archetype
+        return np.array([self._ids.get(name, -1) for name in names], dtype=np.int32)
+
+    def getName(self, archetypeId: int) -> str:
+        return self._names[archetypeId]
+
+    def getItem(self, archetypeId: int) -> YtypItem:
+        return self._items[archetypeId]
+
+    def _getArrays(self) -> dict[str, np.ndarray]:
+        if self._arrays is None:
+            numItems = len(self._items)
+            self._arrays = {
+                "lodDists": np.array([item.lodDist for item in self._items], dtype=np.float64),
+                "bboxMins": np.array([item.boundingBox.min for item in self._items], dtype=np.float64).reshape(numItems, 3),
+                "bboxMaxs": np.array([item.boundingBox.max for item in self._items], dtype=np.float64).reshape(numItems, 3),
+                "bsphereCenters": np.array([item.boundingSphere.center for item in self._items], dtype=np.float64).reshape(numItems, 3),
+                "bsphereRadii": np.array([item.boundingSphere.radius for item in self._items], dtype=np.float64),
+            }
+
+        return self._arrays
+
+    def getLodDists(self) -> np.ndarray:
+        return self._getArrays()["lodDists"]
+
+    def getBoundingBoxMins(self) -> np.ndarray:
+        return self._getArrays()["bboxMins"]
+
+    def getBoundingBoxMaxs(self) -> np.ndarray:
+        return self._getArrays()["bboxMaxs"]
+
+    def getBoundingSphereCenters(self) -> np.ndarray:
+        return self._getArrays()["bsphereCenters"]
+
+    def getBoundingSphereRadii(self) -> np.ndarray:
+        return self._getArrays()["bsphereRadii"]
@@ -1,5 +1,8 @@
 import os
 import re
+import zipfile
+
+import numpy as np
 
 from common.Box import Box
 from common.Sphere import Sphere
@@ -7,6 +10,11 @@ from common.ytyp.YtypItem import YtypItem
 
 
 class YtypParser:
+    CACHE_FILENAME = "_ytyp_items.cache.npz"
+    CACHE_VERSION = 1
+
+    _cachedDirectories: dict[str, dict[str, ((int, int), dict[str, YtypItem])]] = {}
+
     @staticmethod
     def getExpressionYtypItem() -> str:
         return '\\s*<Item type="CBaseArchetypeDef">' + \
@@ -20,12 +28,15 @@ class YtypParser:
                '\\s*<name>([^<]+)</name>'
 
     @staticmethod
-    def readYtypDirectory(path: str) -> dict[str, YtypItem]:
+    def readYtypDirectory(path: str, useCache: bool = False) -> dict[str, YtypItem]:
         items = {}
 
         if not os.path.exists(path):
             return items
 
+        if useCache:
+            return YtypParser._readYtypDirectoryCached(path)
+
         for filename in os.listdir(path):
             if not filename.endswith(".ytyp.xml"):
                 continue
@@ -34,6 +45,123 @@ class YtypParser:
 
         return items
 
+    @staticmethod
+    def _readYtypDirectoryCached(path: str) -> dict[str, YtypItem]:
+        # only ytyp files that are new or whose size or modification time changed are parsed again
+        cachedFiles = YtypParser._getCachedFiles(path)
+        changed = False
+
+        items = {}
+        filenames = set()
+        for filename in os.listdir(path):
+            if not filename.endswith(".ytyp.xml"):
+                continue
+
+            filenames.add(filename)
+            stat = os.stat(os.path.join(path, filename))
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+            if filename not in cachedFiles or cachedFiles[filename][0] != signature:
+                cachedFiles[filename] = (signature, YtypParser.readYtypFile(os.path.join(path, filename)))
+                changed = True
+
+            items |= cachedFiles[filename][1]
+
+        for filename in list(cachedFiles.keys()):
+            if filename not in filenames:
+                del cachedFiles[filename]
+                changed = True
+
+        if changed:
+            YtypParser._writeCache(path, cachedFiles)
+
+        return items
+
+    @staticmethod
+    def _getCachedFiles(path: str) -> dict[str, ((int, int), dict[str, YtypItem])]:
+        # the cache file is loaded at most once per process, afterwards the cached files are kept in memory
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in YtypParser._cachedDirectories:
+            YtypParser._cachedDirectories[key] = YtypParser._readCache(path)
+
+        return YtypParser._cachedDirectories[key]
+
+    @staticmethod
+    def _readCache(path: str) -> dict[str, ((int, int), dict[str, YtypItem])]:
+        cachedFiles = {}
+
+        cachePath = os.path.join(path, YtypParser.CACHE_FILENAME)
+        if not os.path.exists(cachePath):
+            return cachedFiles
+
+        try:
+            with np.load(cachePath, allow_pickle=False) as data:
+                if int(data["version"]) != YtypParser.CACHE_VERSION:
+                    return cachedFiles
+
+                names = data["names"]
+                lodDists = data["lodDists"]
+                bbMins = data["bbMins"]
+                bbMaxs = data["bbMaxs"]
+                bsCenters = data["bsCenters"]
+                bsRadii = data["bsRadii"]
+
+                start = 0
+                for filename, size, mtime, parent, numItems in zip(data["files"], data["sizes"], data["mtimes"], data["parents"], data["numItems"]):
+                    parent = str(parent)
+                    items = {}
+                    for i in range(start, start + numItems):
+                        items[str(names[i])] = YtypItem(float(lodDists[i]), Box(bbMins[i].tolist(), bbMaxs[i].tolist()), Sphere(bsCenters[i].tolist(), float(bsRadii[i])), parent)
+                    start += numItems
+
+                    cachedFiles[str(filename)] = ((int(size), int(mtime)), items)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print("WARNING: could not read ytyp cache " + cachePath + " (" + str(e) + "). Parsing all ytyp files again.")
+            return {}
+
+        return cachedFiles
+
+    @staticmethod
+    def _writeCache(path: str, cachedFiles: dict[str, ((int, int), dict[str, YtypItem])]):
+        files = []
+        sizes = []
+        mtimes = []
+        parents = []
+        numItems = []
+        names = []
+        lodDists = []
+        bbMins = []
+        bbMaxs = []
+        bsCenters = []
+        bsRadii = []
+        for filename, (signature, items) in cachedFiles.items():
+            files.append(filename)
+            sizes.append(signature[0])
+            mtimes.append(signature[1])
+            parents.append(next(iter(items.values())).parent if items else "")
+            numItems.append(len(items))
+            for name, item in items.items():
+                names.append(name)
+                lodDists.append(item.lodDist)
+                bbMins.append(item.boundingBox.min)
+                bbMaxs.append(item.boundingBox.max)
+                bsCenters.append(item.boundingSphere.center)
+                bsRadii.append(item.boundingSphere.radius)
+
+        cachePath = os.path.join(path, YtypParser.CACHE_FILENAME)
+        try:
+            f = open(cachePath + ".tmp", 'wb')
+            np.savez(f, version=YtypParser.CACHE_VERSION,
+                files=np.array(files, dtype=str), sizes=np.array(sizes, dtype=np.int64), mtimes=np.array(mtimes, dtype=np.int64),
+                parents=np.array(parents, dtype=str), numItems=np.array(numItems, dtype=np.int64),
+                names=np.array(names, dtype=str), lodDists=np.array(lodDists, dtype=np.float64),
+                bbMins=np.array(bbMins, dtype=np.float64).reshape(-1, 3), bbMaxs=np.array(bbMaxs, dtype=np.float64).reshape(-1, 3),
+                bsCenters=np.array(bsCenters, dtype=np.float64).reshape(-1, 3), bsRadii=np.array(bsRadii, dtype=np.float64))
+            f.close()
+            os.replace(cachePath + ".tmp", cachePath)
+        except OSError as e:
+            print("WARNING: could not write ytyp cache " + cachePath + " (" + str(e) + ")")
+
     @staticmethod
     def readYtypFile(ytypFile: str) -> dict[str, YtypItem]:
         f = open(ytypFile, 'r')
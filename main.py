@@ -5,9 +5,17 @@ import re
 import shutil
 import sys
 import json
+from typing import Optional
 
 from matplotlib import pyplot
 
+from common.BuildCache import BuildCache
+from common.ClusterCountSearch import ClusterCountSearch
+from common.ClusteringCache import ClusteringCache
+from common.InMemoryFiles import InMemoryFiles
+from common.Metrics import Metrics
+from common.Util import Util
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 from worker.EntropyCreator import EntropyCreator
 from worker.reducer.Reducer import Reducer
 from worker.vegetation_creator.VegetationCreator import VegetationCreator
@@ -21,6 +29,10 @@ PATTERN_MAP_NAME = "[a-z][a-z0-9_]*[a-z0-9]"
 
 
 def moveDirectory(src: str, dest: str):
+    if InMemoryFiles.contains(src):
+        InMemoryFiles.moveToDisk(src, dest)
+        return
+
     for filename in os.listdir(src):
         shutil.move(os.path.join(src, filename), dest)
 
@@ -30,6 +42,46 @@ def copyDirectory(src: str, dest: str):
         shutil.copy(os.path.join(src, filename), dest)
 
 
+def getStageOutputDir(tempOutputDir: str, stage: str, inMemory: bool) -> str:
+    stageOutputDir = os.path.join(tempOutputDir, stage)
+    if inMemory:
+        InMemoryFiles.mount(stageOutputDir)
+    return stageOutputDir
+
+
+def countEntities(inputDir: str) -> int:
+    numEntities = 0
+    for filename in Util.getListOfFiles(inputDir, lambda filename: filename.endswith(".ymap.xml")):
+        numEntities += Util.readFile(os.path.join(inputDir, filename)).count('type="CEntityDef"')
+    return numEntities
+
+
+def runStage(worker, stage: str, params: Optional[list], buildCache: Optional[BuildCache]):
+    # stages with global coupling (e.g. clustering) are either reused completely from the build cache or run completely.
+    # params is None for stages using the build cache per file on their own (see BuildCache.map)
+    Metrics.beginStage(stage)
+
+    if buildCache is None or params is None:
+        worker.run()
+    else:
+        key = buildCache.getDirectoryKey(stage, params, worker.inputDir)
+        if buildCache.restoreDirectory(key, worker.outputDir):
+            print("reusing cached result of " + stage)
+        else:
+            worker.run()
+            buildCache.storeDirectory(key, worker.outputDir)
+
+    Metrics.endStage()
+    if Metrics.enabled:
+        # counted once the stage is done since reading its input in advance would distort its time and file reads
+        Metrics.setEntitiesOfLastStage(countEntities(worker.inputDir))
+
+
+def releaseStageInputDir(stageInputDir: str):
+    # in-memory output of the previous stage is not needed anymore once the next stage is done (no-op for directories on disk)
+    InMemoryFiles.release(stageInputDir)
+
+
 def main(argv):
     inputDir = None
     outputDir = None
@@ -40,6 +92,7 @@ def main(argv):
     reducer = False
     reducerResolution = None
     reducerAdaptScaling = False
+    reducerTiledClustering = False
     clusteringPrefix = None
     clusteringExcluded = None
     staticCol = False
@@ -49,21 +102,28 @@ def main(argv):
     sanitizer = False
     entropy = False
     statistics = False
+    inMemory = False
+    jobs = 1
+    buildCacheDir = None
+    metricsFile = None
+    miniBatchKMeans = None
+    warmStartClustering = True
     prefix = None
 
     usageMsg = "main.py --inputDir <input directory> --outputDir <output directory> --prefix=<PREFIX> " \
-               "--reducer=<on|off> --reducerResolution=<float (default 30)> --reducerAdaptScaling=<on|off>" \
+               "--reducer=<on|off> --reducerResolution=<float (default 30)> --reducerAdaptScaling=<on|off> --reducerTiledClustering=<on|off> " \
                "--clustering=<on|off> --numClusters=<integer> --polygon=<list of x,y coordinates in CCW order> " \
                "--clusteringPrefix=<CLUSTERING_PREFIX> --clusteringExcluded=<comma-separated list of ymaps to exclude> " \
                "--entropy=<on|off> --sanitizer=<on|off> --staticCol=<on|off> " \
                "--clearLod=<on|off> --lodMap=<on|off> --reflection=<on|off> " \
-               "--statistics=<on|off>"
+               "--statistics=<on|off> --inMemory=<on|off> --jobs=<integer (default 1)> --buildCache=<cache directory> --metrics=<JSON file> " \
+               "--miniBatchKMeans=<minimum number of points> --warmStartClustering=<on|off>"
 
     try:
         opts, args = getopt.getopt(argv, "h?i:o:",
-            ["help", "inputDir=", "outputDir=", "reducer=", "reducerResolution=", "reducerAdaptScaling=",
+            ["help", "inputDir=", "outputDir=", "reducer=", "reducerResolution=", "reducerAdaptScaling=", "reducerTiledClustering=",
                 "clustering=", "numClusters=", "polygon=", "clusteringPrefix=", "clusteringExcluded=",
-                "staticCol=", "prefix=", "lodMap=", "clearLod=", "reflection=", "sanitizer=", "entropy=", "statistics=", "vegetationCreator="])
+                "staticCol=", "prefix=", "lodMap=", "clearLod=", "reflection=", "sanitizer=", "entropy=", "statistics=", "vegetationCreator=", "inMemory=", "jobs=", "buildCache=", "metrics=", "miniBatchKMeans=", "warmStartClustering="])
     except getopt.GetoptError:
         print("ERROR: Unknown argument. Please see below for usage.")
         print(usageMsg)
@@ -90,6 +150,8 @@ def main(argv):
                 sys.exit(2)
         elif opt == "--reducerAdaptScaling":
             reducerAdaptScaling = bool(distutils.util.strtobool(arg))
+        elif opt == "--reducerTiledClustering":
+            reducerTiledClustering = bool(distutils.util.strtobool(arg))
         elif opt == "--clustering":
             clustering = bool(distutils.util.strtobool(arg))
         elif opt == "--clusteringPrefix":
@@ -117,6 +179,24 @@ def main(argv):
             entropy = bool(distutils.util.strtobool(arg))
         elif opt == "--statistics":
             statistics = bool(distutils.util.strtobool(arg))
+        elif opt == "--inMemory":
+            inMemory = bool(distutils.util.strtobool(arg))
+        elif opt == "--jobs":
+            jobs = int(arg)
+            if jobs <= 0:
+                print("ERROR: jobs must be positive")
+                sys.exit(2)
+        elif opt == "--buildCache":
+            buildCacheDir = os.path.abspath(arg)
+        elif opt == "--metrics":
+            metricsFile = os.path.abspath(arg)
+        elif opt == "--miniBatchKMeans":
+            miniBatchKMeans = int(arg)
+            if miniBatchKMeans <= 0:
+                print("ERROR: miniBatchKMeans must be positive")
+                sys.exit(2)
+        elif opt == "--warmStartClustering":
+            warmStartClustering = bool(distutils.util.strtobool(arg))
 
     if not clustering and numClusters:
         print("ERROR: --numClusters requires --clustering=on")
@@ -154,6 +234,10 @@ def main(argv):
         print("ERROR: --reducerAdaptScaling=on requires --reducer=on")
         sys.exit(2)
 
+    if not reducer and reducerTiledClustering:
+        print("ERROR: --reducerTiledClustering=on requires --reducer=on")
+        sys.exit(2)
+
     if not (vegetationCreator or reducer or clustering or staticCol or clearLod or lodMap or sanitizer or entropy or statistics):
         print("ERROR: No goal specified, nothing to do.")
         print(usageMsg)
@@ -199,46 +283,65 @@ def main(argv):
     tempOutputDir = os.path.join(outputDir, "_temp_")
     os.makedirs(tempOutputDir)
 
+    # all archetypes are read only once and shared by all workers (the lod map creator adds the generated lod/slod archetypes)
+    ytypItems = ArchetypeRegistry.readResources()
+
+    buildCache = None if buildCacheDir is None else BuildCache(buildCacheDir)
+    if buildCacheDir is not None:
+        ClusteringCache.directory = os.path.join(buildCacheDir, "clustering")
+
+    if metricsFile is not None:
+        Metrics.enable()
+
+    ClusterCountSearch.MINI_BATCH_MIN_POINTS = miniBatchKMeans
+    ClusterCountSearch.WARM_START = warmStartClustering
+
     if vegetationCreator:
-        vegetationCreatorWorker = VegetationCreator(nextInputDir, os.path.join(tempOutputDir, "vegetationCreator"), prefix)
-        vegetationCreatorWorker.run()
+        vegetationCreatorWorker = VegetationCreator(nextInputDir, getStageOutputDir(tempOutputDir, "vegetationCreator", inMemory), prefix)
+        runStage(vegetationCreatorWorker, "vegetationCreator", [prefix], buildCache)
 
         nextInputDir = vegetationCreatorWorker.outputDir
 
     if entropy:
-        entropyCreator = EntropyCreator(nextInputDir, os.path.join(tempOutputDir, "entropy"), False, True, False, True)
-        entropyCreator.run()
+        entropyCreator = EntropyCreator(nextInputDir, getStageOutputDir(tempOutputDir, "entropy", inMemory), False, True, False, True, ytypItems, jobs, buildCache)
+        runStage(entropyCreator, "entropy", None, buildCache)
+        releaseStageInputDir(nextInputDir)
 
         nextInputDir = entropyCreator.outputDir
 
     if reducer:
-        reducerWorker = Reducer(nextInputDir, os.path.join(tempOutputDir, "reducer"), prefix, reducerResolution, reducerAdaptScaling)
-        reducerWorker.run()
+        reducerWorker = Reducer(nextInputDir, getStageOutputDir(tempOutputDir, "reducer", inMemory), prefix, reducerResolution, reducerAdaptScaling, ytypItems, jobs, reducerTiledClustering)
+        runStage(reducerWorker, "reducer", [prefix, reducerResolution, reducerAdaptScaling, reducerTiledClustering], buildCache)
+        releaseStageInputDir(nextInputDir)
 
         nextInputDir = reducerWorker.outputDir
 
     if clustering:
-        clusteringWorker = Clustering(nextInputDir, os.path.join(tempOutputDir, "clustering"), prefix,
-            numClusters, polygon, clusteringPrefix, clusteringExcluded)
-        clusteringWorker.run()
+        clusteringWorker = Clustering(nextInputDir, getStageOutputDir(tempOutputDir, "clustering", inMemory), prefix,
+            numClusters, polygon, clusteringPrefix, clusteringExcluded, ytypItems, jobs)
+        runStage(clusteringWorker, "clustering", [prefix, numClusters, polygon, clusteringPrefix, clusteringExcluded, miniBatchKMeans, warmStartClustering], buildCache)
+        releaseStageInputDir(nextInputDir)
 
         nextInputDir = clusteringWorker.outputDir
 
     if sanitizer:
-        sanitizerWorker = Sanitizer(nextInputDir, os.path.join(tempOutputDir, "sanitizer"))
-        sanitizerWorker.run()
+        sanitizerWorker = Sanitizer(nextInputDir, getStageOutputDir(tempOutputDir, "sanitizer", inMemory), ytypItems, jobs, buildCache)
+        runStage(sanitizerWorker, "sanitizer", None, buildCache)
+        releaseStageInputDir(nextInputDir)
 
         nextInputDir = sanitizerWorker.outputDir
 
     if clearLod:
-        lodMapCleaner = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "clear_lod"), prefix, True, False)
-        lodMapCleaner.run()
+        lodMapCleaner = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "clear_lod"), prefix, True, False, ytypItems, jobs)
+        runStage(lodMapCleaner, "clearLod", [prefix], buildCache)
+        releaseStageInputDir(nextInputDir)
 
         nextInputDir = lodMapCleaner.getOutputDirMaps(False)
 
     if lodMap:
-        lodMapCreator = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "lod_map"), prefix, False, createReflection)
-        lodMapCreator.run()
+        lodMapCreator = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "lod_map"), prefix, False, createReflection, ytypItems, jobs)
+        runStage(lodMapCreator, "lodMap", [prefix, createReflection, miniBatchKMeans, warmStartClustering], buildCache)
+        releaseStageInputDir(nextInputDir)
 
         outputMetadataDir = os.path.join(outputDir, prefix + "_metadata")
         os.makedirs(outputMetadataDir)
@@ -269,8 +372,9 @@ def main(argv):
         nextInputDir = lodMapCreator.getOutputDirMaps(False)
 
     if staticCol:
-        staticCollisionCreator = StaticCollisionCreator(nextInputDir, os.path.join(tempOutputDir, "static_col"))
-        staticCollisionCreator.run()
+        staticCollisionCreator = StaticCollisionCreator(nextInputDir, os.path.join(tempOutputDir, "static_col"), jobs, buildCache)
+        runStage(staticCollisionCreator, "staticCol", None, buildCache)
+        releaseStageInputDir(nextInputDir)
 
         outputStaticColsDir = os.path.join(outputDir, prefix + "_col")
         os.makedirs(outputStaticColsDir)
@@ -279,18 +383,22 @@ def main(argv):
         nextInputDir = staticCollisionCreator.getOutputDirMaps()
 
     if statistics:
-        statisticsPrinter = StatisticsPrinter(nextInputDir)
-        statisticsPrinter.run()
+        statisticsPrinter = StatisticsPrinter(nextInputDir, ytypItems)
+        runStage(statisticsPrinter, "statistics", None, None)
 
     outputMetadataDir = os.path.join(outputDir, prefix + "_metadata")
     os.makedirs(outputMetadataDir, exist_ok=True)
-    if not os.path.samefile(nextInputDir, inputDir):
+    if InMemoryFiles.contains(nextInputDir) or not os.path.samefile(nextInputDir, inputDir):
         moveDirectory(nextInputDir, outputMetadataDir)
     # else:
     #    no need to duplicate the input dir
     #    copyDirectory(nextInputDir, outputDir + "/maps")
     shutil.rmtree(tempOutputDir)
 
+    if metricsFile is not None:
+        Metrics.write(metricsFile, jobs, inMemory)
+        print("written metrics to " + metricsFile)
+
     pyplot.show(block=True)
 
 
@@ -4,13 +4,14 @@ import math
 import random
 import re
 from re import Match
+from typing import Optional
 
 from natsort import natsorted
 
+from common.BuildCache import BuildCache
 from common.Util import Util
 from common.ymap.Ymap import Ymap
-from common.ytyp.YtypItem import YtypItem
-from common.ytyp.YtypParser import YtypParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class EntropyCreator:
@@ -78,22 +79,24 @@ class EntropyCreator:
 
     inputDir: str
     outputDir: str
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
     limitTilt: bool
     adaptRotationIfIdentity: bool
     limitScale: bool
     adaptScaleIfIdentity: bool
+    jobs: int
+    buildCache: Optional[BuildCache]
 
-    def __init__(self, inputDir: str, outputDir: str, limitTilt: bool, adaptRotationIfIdentity: bool, limitScale: bool, adaptScaleIfIdentity: bool):
+    def __init__(self, inputDir: str, outputDir: str, limitTilt: bool, adaptRotationIfIdentity: bool, limitScale: bool, adaptScaleIfIdentity: bool, ytypItems: Optional[ArchetypeRegistry] = None, jobs: int = 1, buildCache: Optional[BuildCache] = None):
         self.inputDir = inputDir
         self.outputDir = outputDir
         self.limitTilt = limitTilt
         self.adaptRotationIfIdentity = adaptRotationIfIdentity
         self.limitScale = limitScale
         self.adaptScaleIfIdentity = adaptScaleIfIdentity
-
-        # using a specific seed to be able to get reproducible results
-        random.seed(a=0)
+        self.ytypItems = ytypItems
+        self.jobs = jobs
+        self.buildCache = buildCache
 
     def run(self):
         print("running entropy creator...")
@@ -104,13 +107,14 @@ class EntropyCreator:
         print("entropy creator DONE")
 
     def createOutputDir(self):
-        if os.path.exists(self.outputDir):
+        if Util.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
-        os.makedirs(self.outputDir)
+        Util.makeDirs(self.outputDir)
 
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
 
     def isScaleCandidate(self, entity: str) -> bool:
         return entity in self.ytypItems and entity.startswith(EntropyCreator.CANDIDATES_SCALE)
@@ -194,16 +198,17 @@ class EntropyCreator:
         return Util.calculateMaxTilt(treeHeight)
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml"):
-                self.processFile(filename)
+        filenames = [filename for filename in natsorted(Util.listDir(self.inputDir)) if filename.endswith(".ymap.xml")]
+        tasks = ((filename, Util.readFile(os.path.join(self.inputDir, filename))) for filename in filenames)
+
+        for filename, content_new in zip(filenames, BuildCache.map(self.buildCache, "entropy", [self.limitTilt, self.adaptRotationIfIdentity, self.limitScale, self.adaptScaleIfIdentity], self, "processFile", tasks, self.jobs)):
+            Util.writeFile(os.path.join(self.outputDir, filename.lower()), content_new)
 
-    def processFile(self, filename: str):
+    def processFile(self, filename: str, content: str) -> str:
         print("\tprocessing " + filename)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
+        # using a specific seed per file to be able to get reproducible results regardless of the order in which files are processed
+        random.seed(a=filename)
 
         content_new = re.sub('(<Item type="CEntityDef">' +
                              '\\s*<archetypeName>([^<]+)</archetypeName>' +
@@ -216,9 +221,7 @@ class EntropyCreator:
 
         content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
 
-        f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-        f.write(content_new)
-        f.close()
+        return content_new
 
     def copyOthers(self):
         # copy other files
@@ -1,5 +1,6 @@
 import math
-from typing import Optional
+import mmap
+from typing import Iterator, Optional, Union
 import numpy as np
 from PIL import Image
 from natsort import natsorted
@@ -8,10 +9,11 @@ import matplotlib.patheffects as PathEffects
 import os
 import re
 
+from common.SpatialIndex import SpatialIndex
 from common.Util import Util
 from common.ymap.Ymap import Ymap
-from common.ytyp.YtypItem import YtypItem
-from common.ytyp.YtypParser import YtypParser
+from common.ymap.EntityTable import EntityTable
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class Clustering:
@@ -20,7 +22,7 @@ class Clustering:
 
     defaultYmapPart: str
     ymapTemplate: str
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
     prefix: str
     numCluster: Optional[int]
     polygon: Optional[list[list[float]]]
@@ -30,16 +32,7 @@ class Clustering:
     GROUP_MAX_EXTEND = 1800
     MAX_EXTEND = 600
 
-    _PATTERN = re.compile(
-        '[\t ]*<Item type="CEntityDef">' +
-        '\\s*<archetypeName>[^<]+</archetypeName>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*</Item>[\r\n]+'
-    )
-
-    def __init__(self, inputDir: str, outputDir: str, prefix: str, numCluster: Optional[int], polygon: Optional[list[list[float]]], clusteringPrefix: Optional[str], clusteringExcluded: Optional[list[str]]):
+    def __init__(self, inputDir: str, outputDir: str, prefix: str, numCluster: Optional[int], polygon: Optional[list[list[float]]], clusteringPrefix: Optional[str], clusteringExcluded: Optional[list[str]], ytypItems: Optional[ArchetypeRegistry] = None, jobs: int = 1):
         self.inputDir = inputDir
         self.outputDir = outputDir
         self.prefix = prefix
@@ -47,6 +40,8 @@ class Clustering:
         self.polygon = polygon
         self.clusteringPrefix = clusteringPrefix
         self.clusteringExcluded = [] if clusteringExcluded is None else clusteringExcluded
+        self.ytypItems = ytypItems
+        self.jobs = jobs
 
     def run(self):
         print("running clustering...")
@@ -59,13 +54,14 @@ class Clustering:
         print("clustering DONE")
 
     def readYtyps(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "../..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
 
     def createOutputDir(self):
-        if os.path.exists(self.outputDir):
+        if Util.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
-        os.makedirs(self.outputDir)
+        Util.makeDirs(self.outputDir)
 
     def readYmapTemplate(self):
         f = open(os.path.join(os.path.dirname(__file__), "templates", "template.ymap.xml"), 'r')
@@ -76,64 +72,51 @@ class Clustering:
         if self.defaultYmapPart is None or not self.defaultYmapPart:
             raise Exception("invalid ymap template")
 
-    def getYmapPartAfterEntitiesAndBeforeBlock(self, ymap: str):
-        startIndex = ymap.find("\n  </entities>")
+    def getYmapPartAfterEntitiesAndBeforeBlock(self, ymap: Union[str, mmap.mmap]) -> Optional[str]:
+        # ymap is either the content or a view of a file (see Util.openFileView)
+        isView = not isinstance(ymap, str)
+
+        startIndex = ymap.find(Clustering._encodeIf(isView, "\n  </entities>"))
         if startIndex < 0:
-            startIndex = ymap.find("\n  <entities/>")
+            startIndex = ymap.find(Clustering._encodeIf(isView, "\n  <entities/>"))
 
         if startIndex < 0:
             return None
 
-        endIndex = ymap.rfind("\n  <block>")
+        endIndex = ymap.rfind(Clustering._encodeIf(isView, "\n  <block>"))
         if endIndex < 0:
-            endIndex = ymap.rfind("\n  <block/>")
+            endIndex = ymap.rfind(Clustering._encodeIf(isView, "\n  <block/>"))
 
         if endIndex < 0:
             return None
 
-        return ymap[startIndex + 14:endIndex]
-
-    def _calculateMapHierarchy(self, points: list[list[float]], hierarchy: list[list[int]]) -> list[list[int]]:
-        level = len(hierarchy[0])
-        if level == 0:
-            maxExtends = Clustering.GROUP_MAX_EXTEND
-            unevenClusters = False
-        elif level == 1:
-            maxExtends = Clustering.MAX_EXTEND
-            unevenClusters = False
-        else:
-            return hierarchy
-
-        absIndices = []
-        pointsOfParent = []
-        for i in range(len(points)):
-            parentIndex = 0 if len(hierarchy[i]) == 0 else hierarchy[i][0]
-
-            while parentIndex >= len(pointsOfParent):
-                absIndices.append([])
-                pointsOfParent.append([])
+        part = ymap[startIndex + 14:endIndex]
+        return part.decode("utf-8") if isView else part
 
-            absIndices[parentIndex].append(i)
-            pointsOfParent[parentIndex].append(points[i])
+    @staticmethod
+    def _encodeIf(encode: bool, value: str) -> Union[str, bytes]:
+        return value.encode("utf-8") if encode else value
 
-        for parentIndex in range(len(pointsOfParent)):
-            clustering, unused = Util.performClustering(pointsOfParent[parentIndex], -1, maxExtends, unevenClusters)
-
-            for c in range(len(clustering)):
-                i = absIndices[parentIndex][c]
-                hierarchy[i].insert(0, clustering[c])
+    def calculateMapHierarchy(self, points: np.ndarray) -> np.ndarray:
+        # cluster (column 0) and group (column 1) of every entity. clusters are numbered within their group
+        hierarchy = np.zeros((len(points), 2), dtype=int)
+        if len(points) == 0:
+            return hierarchy
 
-        return self._calculateMapHierarchy(points, hierarchy)
+        points = np.asarray(points, dtype=float)
 
-    def calculateMapHierarchy(self, points: list[list[float]]) -> list[list[int]]:
-        if len(points) == 0:
-            return []
+        groups = np.zeros(len(points), dtype=int)
+        for level, maxExtends in enumerate([Clustering.GROUP_MAX_EXTEND, Clustering.MAX_EXTEND]):
+            unused, indicesOfGroups = Util.groupByLabel(groups)
+            clusters = np.empty(len(points), dtype=int)
+            for indices in indicesOfGroups:
+                clustering, unused = Util.performClustering(points[indices], -1, maxExtends, False, self.jobs)
+                clusters[indices] = clustering
 
-        hierarchy = []
-        for i in range(len(points)):
-            hierarchy.append([])
+            hierarchy[:, 1 - level] = clusters
+            groups = clusters
 
-        return self._calculateMapHierarchy(points, hierarchy)
+        return hierarchy
 
     def getClusterName(self, group: int, cluster: int, numGroups: int, numClusters: int) -> str:
         letters = ""
@@ -154,11 +137,11 @@ class Clustering:
         return letters + ("_" if letters and digits else "") + digits
 
     def processFiles(self):
-        coords = []
+        table = EntityTable()
         mapsHavingNotOnlyEntities = []
         mapsNeededToCopy = []
         mapNames = []
-        for filename in natsorted(os.listdir(self.inputDir)):
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if not filename.endswith(".ymap.xml"):
                 continue
 
@@ -172,62 +155,43 @@ class Clustering:
 
             print("\treading " + filename)
 
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
+            view = Util.openFileView(os.path.join(self.inputDir, filename))
 
-            ymapPartAfterEntitiesAndBeforeBlock = self.getYmapPartAfterEntitiesAndBeforeBlock(content)
+            ymapPartAfterEntitiesAndBeforeBlock = self.getYmapPartAfterEntitiesAndBeforeBlock(view)
             if ymapPartAfterEntitiesAndBeforeBlock != self.defaultYmapPart:
                 mapsHavingNotOnlyEntities.append(mapName)
 
-            for matchobj in re.finditer(Clustering._PATTERN, content):
-                coords.append([float(matchobj.group(1)), float(matchobj.group(2)), float(matchobj.group(3))])
+            table.addView(view, mapName)
+            Util.closeFileView(view)
 
-        if not coords:
+        coords = table.getPositions()
+        if len(coords) == 0:
             return
 
         print("\tperforming clustering of " + str(len(mapNames)) + " ymap files and in total " + str(len(coords)) + " entities")
 
         if self.polygon:
-            clusters = Util.performClusteringFixedPolygon(coords, self.polygon)
-            hierarchy = [[i, 0] for i in clusters]
+            clusters = Util.performClusteringFixedPolygon(SpatialIndex.fromEntityTable(table), self.polygon)
+            hierarchy = np.column_stack((np.asarray(clusters, dtype=int), np.zeros(len(coords), dtype=int)))
         elif self.numCluster:
             clusters, unused, furthestDistances = Util.performClusteringFixedNumClusters(coords, self.numCluster)
-            hierarchy = [[i, 0] for i in clusters]
+            hierarchy = np.column_stack((np.asarray(clusters, dtype=int), np.zeros(len(coords), dtype=int)))
         else:
             hierarchy = self.calculateMapHierarchy(coords)
 
+        # entities of every cluster as rows of the table, i.e. spans within the input files
         outputFiles = {}
         mapPrefix = self.getMapPrefix(mapNames)
-        for h in hierarchy:
-            cluster = h[0]
-            group = h[1]
+        for i, (cluster, group) in enumerate(hierarchy.tolist()):
             if group not in outputFiles:
                 outputFiles[group] = {}
 
             if cluster not in outputFiles[group]:
-                outputFiles[group][cluster] = ""
-
-        i = 0
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
+                outputFiles[group][cluster] = []
 
-            mapName = Util.getMapnameFromFilename(filename)
-            if mapName in mapsNeededToCopy:
-                continue
-
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
-
-            for matchobj in re.finditer(Clustering._PATTERN, content):
-                cluster = hierarchy[i][0]
-                group = hierarchy[i][1]
-                outputFiles[group][cluster] += matchobj.group(0)
-                i += 1
+            outputFiles[group][cluster].append(i)
 
-        self.writeClusteredYmap(mapPrefix, outputFiles)
+        self.writeClusteredYmap(mapPrefix, table, outputFiles)
 
         for mapName in mapsNeededToCopy:
             newMapName = Util.findAvailableMapName(self.outputDir, mapName, "_excluded", False)
@@ -246,7 +210,7 @@ class Clustering:
 
         self.plotClusterResult(coords, hierarchy)
 
-    def writeClusteredYmap(self, mapPrefix: str, clusteredEntities: dict[int, dict[int, str]]):
+    def writeClusteredYmap(self, mapPrefix: str, table: EntityTable, clusteredEntities: dict[int, dict[int, list[int]]]):
         numGroups = len(clusteredEntities)
         for group in clusteredEntities:
             clustersInGroup = clusteredEntities[group]
@@ -255,26 +219,41 @@ class Clustering:
                 clusterName = self.getClusterName(group, cluster, numGroups, numClusters)
                 mapName = mapPrefix.rstrip("_") + ("_" if clusterName else "") + clusterName
 
-                entities = clustersInGroup[cluster]
-                ymapContent = self.createYmapContent(mapName, entities)
+                rows = clustersInGroup[cluster]
+                Util.writeFileParts(os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)), self.createYmapContentParts(mapName, table, rows))
 
-                file = open(os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)), 'w')
-                file.write(ymapContent)
-                file.close()
-
-    def createYmapContent(self, mapName: str, entities: str) -> str:
-        return self.ymapTemplate \
+    def createYmapContentParts(self, mapName: str, table: EntityTable, rows: list[int]) -> Iterator[Union[str, bytes]]:
+        # the entities are written as slices of views of the input files instead of copying them into one string.
+        # rows are in the order of the table, i.e. all entities of one input file are next to each other
+        before, after = self.ymapTemplate \
             .replace("${NAME}", mapName) \
             .replace("${TIMESTAMP}", Util.getNowInIsoFormat()) \
-            .replace("${ENTITIES}\n", entities)
+            .split("${ENTITIES}\n", 1)
+
+        yield before
+
+        entities = table.entities[rows]
+        mapIndex = -1
+        view = None
+        for entity in entities:
+            if entity["map"] != mapIndex:
+                if view is not None:
+                    Util.closeFileView(view)
+                mapIndex = entity["map"]
+                view = Util.openFileView(os.path.join(self.inputDir, Util.getFilenameFromMapname(table.mapNames[mapIndex])))
+
+            yield view[entity["start"]:entity["end"]]
+
+        if view is not None:
+            Util.closeFileView(view)
+
+        yield after
 
-    def plotClusterResult(self, coords: list[list[float]], hierarchy: list[list[int]]):
+    def plotClusterResult(self, coords: list[list[float]], hierarchy: np.ndarray):
         numTotalClusters = 0
         groups = {}
         i = 0
-        for h in hierarchy:
-            cluster = h[0]
-            group = h[1]
+        for cluster, group in hierarchy.tolist():
             if group not in groups:
                 groups[group] = {}
 
@@ -340,21 +319,17 @@ class Clustering:
     def fixMapExtents(self):
         print("\tfixing map extents")
 
-        for filename in natsorted(os.listdir(self.outputDir)):
+        for filename in natsorted(Util.listDir(self.outputDir)):
             if not filename.endswith(".ymap.xml"):
                 continue
 
-            file = open(os.path.join(self.outputDir, filename), 'r')
-            content = file.read()
-            file.close()
+            content = Util.readFile(os.path.join(self.outputDir, filename))
 
             content = Ymap.replaceName(content, filename.lower()[:-9])
             content = Ymap.replaceParent(content, None)
             content = Ymap.fixMapExtents(content, self.ytypItems)
 
-            file = open(os.path.join(self.outputDir, filename), 'w')
-            file.write(content)
-            file.close()
+            Util.writeFile(os.path.join(self.outputDir, filename), content)
 
     def copyOthers(self):
         # copy other files
@@ -11,20 +11,24 @@ from natsort import natsorted
 
 from common.BoundingGeometry import BoundingGeometry
 from common.Box import Box
+from common.Metrics import Metrics
+from common.ProcessPool import ProcessPool
 from common.Sphere import Sphere
 from common.Util import Util
 from common.texture.UV import UV
 from common.texture.UVMap import UVMap
 from common.ymap.ContentFlag import ContentFlag
 from common.ymap.EntityItem import EntityItem
+from common.ymap.EntityTable import EntityTable
 from common.ymap.Flag import Flag
 from common.ymap.LodLevel import LodLevel
 from common.ymap.PriorityLevel import PriorityLevel
 from common.ymap.Ymap import Ymap
-from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 from worker.lod_map_creator.LodCandidate import LodCandidate
 from worker.lod_map_creator.Manifest import Manifest
+from worker.lod_map_creator.ModelWriter import ModelWriter
 
 
 class LodMapCreator:
@@ -46,11 +50,15 @@ class LodMapCreator:
     contentTemplateOdrShaderAlpha: str
     contentTemplateEntitySlod: str
     contentTemplateSlod2Map: str
+    modelWriter: ModelWriter
 
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
     reflYtypItems: dict[str, IO]
     slodYtypItems: dict[str, IO]
+    # content of the hd maps of the current prefix as written to the output directory (see processFilesWithPrefix)
+    contentsNoLod: dict[str, str]
     slodCandidates: dict[str, UVMap]
+    lodModelTemplates: dict[str, dict[str, tuple[np.ndarray, np.ndarray, list[list[float]], np.ndarray]]]
     foundLod: bool
     foundSlod: bool
 
@@ -253,6 +261,9 @@ class LodMapCreator:
     ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD3 = 1800
     ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD4 = 3600
 
+    # SLOD4, SLOD3, SLOD2, SLOD1, LOD by lod distance and LOD (see calculateLodHierarchy)
+    NUM_LOD_HIERARCHY_LEVELS = 6
+
     USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE = 2
     USE_NO_TOP_TEMPLATE_FOR_LEVEL_AND_ABOVE = 3
 
@@ -265,7 +276,7 @@ class LodMapCreator:
     MIN_HD_LOD_DISTANCE_FOR_SLOD3 = Util.calculateLodDistance(unitBox, unitSphere, [15] * 3, True)
     MIN_HD_LOD_DISTANCE_FOR_SLOD4 = Util.calculateLodDistance(unitBox, unitSphere, [20] * 3, True)
 
-    def __init__(self, inputDir: str, outputDir: str, prefix: str, clearLod: bool, createReflection: bool):
+    def __init__(self, inputDir: str, outputDir: str, prefix: str, clearLod: bool, createReflection: bool, ytypItems: Optional[ArchetypeRegistry] = None, jobs: int = 1):
         self.inputDir = inputDir
         self.outputDir = outputDir
         self.prefix = prefix
@@ -273,8 +284,21 @@ class LodMapCreator:
         self.createReflection = createReflection
         self.slodYtypItems = {}
         self.reflYtypItems = {}
+        self.contentsNoLod = {}
         self.foundLod = False
         self.foundSlod = False
+        self.ytypItems = ytypItems
+        self.jobs = jobs
+        self.lodModelTemplates = {}
+
+    def __getstate__(self) -> dict:
+        # as transferred to the processes of a ProcessPool (if spawned instead of forked). the open ytyp files and
+        # the hd maps are only used by the calling process
+        state = self.__dict__.copy()
+        state["reflYtypItems"] = {}
+        state["slodYtypItems"] = {}
+        state["contentsNoLod"] = {}
+        return state
 
     def run(self):
         if self.clearLod:
@@ -397,8 +421,11 @@ class LodMapCreator:
         self.contentTemplateOdrShaderAlpha = f.read()
         f.close()
 
+        self.modelWriter = ModelWriter(self.contentTemplateMesh, self.contentTemplateMeshAabb, self.contentTemplateMeshGeometry, self.contentTemplateOdr)
+
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
 
     def replaceFlagsAndContentFlags(self, content: str, flags: int, contentFlags: int) -> str:
         # TODO deal with existing flags, e.g. "Scripted (1)"
@@ -452,41 +479,12 @@ class LodMapCreator:
             indices.append(offset)
         return indices
 
-    def createAabb(self, bbox: Box) -> str:
-        return self.contentTemplateMeshAabb \
-            .replace("${BBOX.MIN.X}", Util.floatToStr(bbox.min[0])) \
-            .replace("${BBOX.MIN.Y}", Util.floatToStr(bbox.min[1])) \
-            .replace("${BBOX.MIN.Z}", Util.floatToStr(bbox.min[2])) \
-            .replace("${BBOX.MAX.X}", Util.floatToStr(bbox.max[0])) \
-            .replace("${BBOX.MAX.Y}", Util.floatToStr(bbox.max[1])) \
-            .replace("${BBOX.MAX.Z}", Util.floatToStr(bbox.max[2]))
-
     @staticmethod
     def findClosestRatio(ratioInput: float, ratioCandidate1: float, ratioCandidate2: float) -> (float, int):
         options = [ratioCandidate1, ratioCandidate2]
         argmin = np.abs(np.asarray(options) - ratioInput).argmin()
         return options[argmin], argmin
 
-    @staticmethod
-    def createLodModelVertexNormalTextureUVStr(vertex: list[float], normal: list[float], uv: list[float]):
-        colors = "255 0 255 255"
-        return "				" + Util.vectorToStr(vertex) + " / " + Util.vectorToStr(Util.normalize(normal)) + " / " + colors + " / " + Util.vectorToStr(uv) + "\n"
-
-    def createIndicesStr(self, indices: list[int]) -> str:
-        indicesStr = ""
-        i = 0
-        for index in indices:
-            if i % 15 == 0:
-                if i > 0:
-                    indicesStr += "\n"
-                indicesStr += "				"
-            else:
-                indicesStr += " "
-            indicesStr += str(index)
-            i += 1
-
-        return indicesStr
-
     @staticmethod
     def appendFrontPlaneIndicesForLod(indices: list[int], offset: int):
         indicesTemplate = [
@@ -521,11 +519,11 @@ class LodMapCreator:
         ]
         indices += [x + offset for x in indicesTemplateTop]
 
-    def appendFrontPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, planeIntersection: list[float]):
-        bbox = self.ytypItems[entity.archetypeName].boundingBox
+    def appendFrontPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], archetypeName: str, planeIntersection: list[float]):
+        bbox = self.ytypItems[archetypeName].boundingBox
         height = bbox.getSizes()[2]
 
-        lodCandidate = self.lodCandidates[entity.archetypeName]
+        lodCandidate = self.lodCandidates[archetypeName]
         uvFrontMin = lodCandidate.uvFrontMin
         uvFrontMax = lodCandidate.uvFrontMax
         uvSideMin = lodCandidate.getUvSideMin()
@@ -534,30 +532,30 @@ class LodMapCreator:
         minZ = bbox.min[2] + height * max(0.0, sideOffsetZ)
         maxZ = bbox.max[2] - height * min(0.0, sideOffsetZ)
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, -0.1, 0], [uvFrontMin.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, -0.1, 0], [uvFrontMax.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, -0.1, 0], [uvFrontMin.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, -0.1, 0], [uvFrontMax.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], minZ], [0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], minZ], [0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], minZ], [0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], minZ], [0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, 0.1, 0], [uvFrontMin.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, 0.1, 0], [uvFrontMax.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, 0.1, 0], [uvFrontMin.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, 0.1, 0], [uvFrontMax.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], minZ], [-0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], minZ], [-0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], minZ], [-0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], minZ], [-0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
 
-    def appendDiagonalPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, planeIntersection: list[float]):
-        bbox = self.ytypItems[entity.archetypeName].boundingBox
+    def appendDiagonalPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], archetypeName: str, planeIntersection: list[float]):
+        bbox = self.ytypItems[archetypeName].boundingBox
 
-        lodCandidate = self.lodCandidates[entity.archetypeName]
+        lodCandidate = self.lodCandidates[archetypeName]
 
         uvFrontMin = lodCandidate.uvFrontMin
         uvFrontMax = lodCandidate.uvFrontMax
@@ -599,31 +597,31 @@ class LodMapCreator:
             adapt = (1 - desiredRatio) / desiredRatio * lengthVectorRightBottom / lengthVectorLeftTop
             vectorLeftTop = [vectorLeftTop[0] * adapt, vectorLeftTop[1] * adapt]
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [0.9, 1, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-1, -0.9, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [0.9, 1, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-1, -0.9, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-0.9, 1, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, 1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-0.9, 1, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, 1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-0.9, -1, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-0.9, -1, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [0.9, -1, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-1, 0.9, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, -1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [0.9, -1, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-1, 0.9, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, -1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
 
-    def appendTopPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, planeIntersection: list[float]):
-        bbox = self.ytypItems[entity.archetypeName].boundingBox
+    def appendTopPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], archetypeName: str, planeIntersection: list[float]):
+        bbox = self.ytypItems[archetypeName].boundingBox
         sizes = bbox.getSizes()
 
-        lodCandidate = self.lodCandidates[entity.archetypeName]
+        lodCandidate = self.lodCandidates[archetypeName]
 
         uvTopMin = lodCandidate.uvTopMin
         uvTopMax = lodCandidate.uvTopMax
@@ -633,71 +631,60 @@ class LodMapCreator:
         # planeTopMaxZ = min(bbox.max[2] - min(sizes) * 0.1, planeTopMinZ + min(sizes[0], sizes[1]) / 4)
         planeTopMaxZ = max(bbox.min[2] + min(sizes) * 0.2, planeTopMinZ - 0.15 * min(sizes[0], sizes[1]))
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], planeIntersection[1], planeTopMaxZ], [0, 0, 1], [uvTopCenter.u, uvTopCenter.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.min[1], planeTopMinZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.min[1], planeTopMinZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.max[1], planeTopMinZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.max[1], planeTopMinZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], planeIntersection[1], planeTopMaxZ], [0, 0, 1], [uvTopCenter.u, uvTopCenter.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.min[1], planeTopMinZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.min[1], planeTopMinZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.max[1], planeTopMinZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.max[1], planeTopMinZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
 
-    def appendTopPlaneVerticesForReflLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem):
-        bbox = self.ytypItems[entity.archetypeName].boundingBox
+    def appendTopPlaneVerticesForReflLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], archetypeName: str):
+        bbox = self.ytypItems[archetypeName].boundingBox
         sizes = bbox.getSizes()
 
-        lodCandidate = self.lodCandidates[entity.archetypeName]
+        lodCandidate = self.lodCandidates[archetypeName]
 
         uvTopMin = lodCandidate.uvTopMin
         uvTopMax = lodCandidate.uvTopMax
 
         planeTopZ = bbox.min[2] + sizes[2] * (1 - lodCandidate.planeZ)
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.min[1], planeTopZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.min[1], planeTopZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.max[1], planeTopZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.max[1], planeTopZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
-
-    def appendVertexForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, vertex: list[float], normal: list[float], uv: list[float]):
-        vertices.append(entity.applyTransformationTo(vertex))
-        normals.append(Util.applyRotation(normal, entity.rotation))
-        textureUVs.append(uv)
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.min[1], planeTopZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.min[1], planeTopZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.max[1], planeTopZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.max[1], planeTopZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
 
     @staticmethod
-    def convertVerticesNormalsTextureUVsAsStr(vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], translation: list[float]) -> str:
-        result = ""
-        for i in range(len(vertices)):
-            translatedVertex = np.add(vertices[i], translation).tolist()
-            result += LodMapCreator.createLodModelVertexNormalTextureUVStr(translatedVertex, normals[i], textureUVs[i])
-        return result
+    def appendVertexForLod(vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], vertex: list[float], normal: list[float], uv: list[float]):
+        vertices.append(vertex)
+        normals.append(normal)
+        textureUVs.append(uv)
 
-    @staticmethod
-    def convertVerticesTextureUVsAsStrForSlod(vertices: list[list[float]], sizes: list[list[float]], textureUVs: list[list[UV]], translation: list[float]) -> str:
-        result = ""
-        for i in range(len(vertices)):
-            translatedVertex = np.add(vertices[i], translation).tolist()
-
-            uvMin = textureUVs[i][0]
-            uvMax = textureUVs[i][1]
-
-            # for a bit more variety randomly flip/mirror the texture
-            # yields same result for multiple runs and different SLOD levels (therefore do not use translatedVertex)
-            xyHash = Util.hashFloat(vertices[i][0]) ^ Util.hashFloat(vertices[i][1])
-            if xyHash % 2 == 0:
-                temp = uvMin.u
-                uvMin = UV(uvMax.u, uvMin.v)
-                uvMax = UV(temp, uvMax.v)
-
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [-1, -0.1, 0], sizes[i], [0, 1], [uvMin.u, uvMax.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [1, -0.1, 0], sizes[i], [1, 1], [uvMax.u, uvMax.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [1, 0, 1], sizes[i], [1, 0], [uvMax.u, uvMin.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [-1, 0, 1], sizes[i], [0, 0], [uvMin.u, uvMin.v])
+    def createLodOrSlodModels(self, tasksPerLevel: list[list[tuple]]) -> list[list[EntityItem]]:
+        # tasks as arguments of createLodOrSlodModel. every model only depends on its own entities, so all models are created
+        # in parallel (if jobs > 1) but the ytyp items are written in the order of the tasks, i.e. the same as running serially
+        tasks = [task for tasks in tasksPerLevel for task in tasks]
+        models = ProcessPool.map(self, "createLodOrSlodModel", tasks, self.jobs)
+
+        entitiesPerLevel = []
+        for tasks in tasksPerLevel:
+            entities = []
+            for task, (entity, ytypItem) in zip(tasks, models):
+                slodLevel, mapPrefix, reflection = task[1], task[6], task[7]
+                if self.usesLodTemplate(slodLevel, reflection):
+                    self.foundLod = True
+                else:
+                    self.foundSlod = True
+                self.writeYtypItem(ytypItem, mapPrefix, slodLevel, reflection)
+                entities.append(entity)
+            entitiesPerLevel.append(entities)
 
-        return result
+        return entitiesPerLevel
 
-    @staticmethod
-    def createSlodModelVertexNormalTextureUVStr(center: list[float], normal: list[float], size: list[float], uvPosition: list[float], uv: list[float]):
-        colorsFront = "255 0 255 255 / 0 0 255 0"
-        return "				" + Util.vectorToStr(center) + " / " + Util.vectorToStr(Util.normalize(normal)) + " / " + colorsFront + " / " + Util.vectorToStr(uvPosition) + " / " + Util.vectorToStr(uv) + " / " + Util.vectorToStr(size) + " / " + Util.vectorToStr([1, 1]) + "\n"
+    def usesLodTemplate(self, slodLevel: int, reflection: bool) -> bool:
+        return slodLevel < self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE or reflection
 
-    def createLodOrSlodModel(self, nameWithoutSlodLevel: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str, reflection: bool) -> EntityItem:
+    def createLodOrSlodModel(self, nameWithoutSlodLevel: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str, reflection: bool) -> (EntityItem, str):
+        # writes the mesh and odr of the model and returns its entity and ytyp item
         if reflection:
             lodName = nameWithoutSlodLevel
             slodLevel = 3
@@ -707,18 +694,14 @@ class LodMapCreator:
         else:
             lodName = nameWithoutSlodLevel + "_lod"
 
-        if slodLevel < self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE or reflection:
+        if self.usesLodTemplate(slodLevel, reflection):
             return self.createLodModel(lodName, slodLevel, drawableDictionary, entities, parentIndex, numChildren, mapPrefix, reflection)
         else:
             return self.createSlodModel(lodName, slodLevel, drawableDictionary, entities, parentIndex, numChildren, mapPrefix)
 
-    def createLodModel(self, lodName: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str, reflection: bool) -> EntityItem:
-        self.foundLod = True
-
-        diffuseSamplerToVertices = {}
-        diffuseSamplerToNormals = {}
-        diffuseSamplerToTextureUVs = {}
-        diffuseSamplerToIndices = {}
+    def createLodModel(self, lodName: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str, reflection: bool) -> (EntityItem, str):
+        diffuseSamplerToEntities = {}
+        diffuseSamplerToTemplates = {}
 
         maxHdEntityLodDistance = 0
 
@@ -726,33 +709,35 @@ class LodMapCreator:
             maxHdEntityLodDistance = max(maxHdEntityLodDistance, entity.lodDistance)
             lodCandidate = self.lodCandidates[entity.archetypeName]
             diffuseSampler = lodCandidate.diffuseSampler
-            if diffuseSampler not in diffuseSamplerToVertices:
-                diffuseSamplerToVertices[diffuseSampler] = []
-                diffuseSamplerToNormals[diffuseSampler] = []
-                diffuseSamplerToTextureUVs[diffuseSampler] = []
-                diffuseSamplerToIndices[diffuseSampler] = []
+            if diffuseSampler not in diffuseSamplerToEntities:
+                diffuseSamplerToEntities[diffuseSampler] = []
+                diffuseSamplerToTemplates[diffuseSampler] = []
 
             bbox = self.ytypItems[entity.archetypeName].boundingBox
-            sizes = bbox.getSizes()
-            distanceLeftToIntersection = sizes[0] * lodCandidate.texture_origin
-            distanceBottomToIntersection = sizes[1] * lodCandidate.textureOriginSide()
-            planeIntersection = [bbox.min[0] + distanceLeftToIntersection, bbox.min[1] + distanceBottomToIntersection]
+            templates = self.getLodModelTemplates(entity.archetypeName)
 
-            LodMapCreator.appendFrontPlaneIndicesForLod(diffuseSamplerToIndices[diffuseSampler], len(diffuseSamplerToVertices[diffuseSampler]))
-            self.appendFrontPlaneVerticesForLod(diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], entity, planeIntersection)
+            entityTemplates = [templates["front"]]
 
             if lodCandidate.hasDiagonal(bbox, entity.scale):
-                LodMapCreator.appendFrontPlaneIndicesForLod(diffuseSamplerToIndices[diffuseSampler], len(diffuseSamplerToVertices[diffuseSampler]))
-                self.appendDiagonalPlaneVerticesForLod(diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], entity, planeIntersection)
+                entityTemplates.append(templates["diagonal"])
 
             if not lodCandidate.hasTop(bbox, entity.scale):
                 pass
             elif reflection:
-                LodMapCreator.appendTopPlaneIndicesForReflLod(diffuseSamplerToIndices[diffuseSampler], len(diffuseSamplerToVertices[diffuseSampler]))
-                self.appendTopPlaneVerticesForReflLod(diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], entity)
+                entityTemplates.append(templates["topRefl"])
             elif slodLevel < self.USE_NO_TOP_TEMPLATE_FOR_LEVEL_AND_ABOVE:
-                LodMapCreator.appendTopPlaneIndicesForLod(diffuseSamplerToIndices[diffuseSampler], len(diffuseSamplerToVertices[diffuseSampler]))
-                self.appendTopPlaneVerticesForLod(diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], entity, planeIntersection)
+                entityTemplates.append(templates["top"])
+
+            diffuseSamplerToEntities[diffuseSampler].append(entity)
+            diffuseSamplerToTemplates[diffuseSampler].append(entityTemplates)
+
+        diffuseSamplerToVertices = {}
+        diffuseSamplerToNormals = {}
+        diffuseSamplerToTextureUVs = {}
+        diffuseSamplerToIndices = {}
+        for diffuseSampler in diffuseSamplerToEntities:
+            diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], diffuseSamplerToIndices[diffuseSampler] = \
+                LodMapCreator.instantiateLodModelTemplates(diffuseSamplerToEntities[diffuseSampler], diffuseSamplerToTemplates[diffuseSampler])
 
         totalBoundingGeometry = BoundingGeometry()
         for diffuseSampler in diffuseSamplerToVertices:
@@ -765,60 +750,32 @@ class LodMapCreator:
         totalBoundingBox = totalBoundingGeometry.getBox().getTranslated(translation)
         totalBoundingSphere = totalBoundingSphere.getTranslated(translation)
 
-        bounds = self.createAabb(totalBoundingBox)
+        bounds = [totalBoundingBox]
 
         shaders = ""
-        geometries = ""
+        geometries = []
         shaderIndex = 0
         for diffuseSampler in diffuseSamplerToVertices:
             indices = diffuseSamplerToIndices[diffuseSampler]
+            vertices = diffuseSamplerToVertices[diffuseSampler]
 
-            boundingGeometry = BoundingGeometry(diffuseSamplerToVertices[diffuseSampler])
+            boundingGeometry = BoundingGeometry(vertices)
             boundingBox = boundingGeometry.getBox().getTranslated(translation)
 
-            verticesNormalsTextureUVsStr = LodMapCreator.convertVerticesNormalsTextureUVsAsStr(diffuseSamplerToVertices[diffuseSampler], diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], translation)
-
             if reflection:
                 shaders += self.contentTemplateOdrShaderAlpha.replace("${DIFFUSE_SAMPLER}", diffuseSampler)
             else:
                 shaders += self.contentTemplateOdrShaderTreeLod.replace("${DIFFUSE_SAMPLER}", diffuseSampler)
 
-            bounds += self.createAabb(boundingBox)
+            bounds.append(boundingBox)
 
-            geometries += self.contentTemplateMeshGeometry \
-                .replace("${SHADER_INDEX}", str(shaderIndex)) \
-                .replace("${VERTEX_DECLARATION}", self.VERTEX_DECLARATION_TREE_LOD) \
-                .replace("${INDICES.NUM}", str(len(indices))) \
-                .replace("${INDICES}", self.createIndicesStr(indices)) \
-                .replace("${VERTICES.NUM}", str(len(diffuseSamplerToVertices[diffuseSampler]))) \
-                .replace("${VERTICES}\n", verticesNormalsTextureUVsStr)
+            geometries.append(self.modelWriter.createGeometry(shaderIndex, self.VERTEX_DECLARATION_TREE_LOD,
+                len(indices), ModelWriter.formatIndices(indices),
+                len(vertices), ModelWriter.formatLodVertices(vertices, diffuseSamplerToNormals[diffuseSampler], diffuseSamplerToTextureUVs[diffuseSampler], translation)))
             shaderIndex += 1
 
-        contentModelMesh = self.contentTemplateMesh \
-            .replace("${BOUNDS}\n", bounds) \
-            .replace("${GEOMETRIES}\n", geometries)
-
-        fileModelMesh = open(os.path.join(self.getOutputDirMeshes(reflection), lodName.lower() + ".mesh"), 'w')
-        fileModelMesh.write(contentModelMesh)
-        fileModelMesh.close()
-
-        contentModelOdr = self.contentTemplateOdr \
-            .replace("${BBOX.MIN.X}", Util.floatToStr(totalBoundingBox.min[0])) \
-            .replace("${BBOX.MIN.Y}", Util.floatToStr(totalBoundingBox.min[1])) \
-            .replace("${BBOX.MIN.Z}", Util.floatToStr(totalBoundingBox.min[2])) \
-            .replace("${BBOX.MAX.X}", Util.floatToStr(totalBoundingBox.max[0])) \
-            .replace("${BBOX.MAX.Y}", Util.floatToStr(totalBoundingBox.max[1])) \
-            .replace("${BBOX.MAX.Z}", Util.floatToStr(totalBoundingBox.max[2])) \
-            .replace("${BSPHERE.CENTER.X}", Util.floatToStr(totalBoundingSphere.center[0])) \
-            .replace("${BSPHERE.CENTER.Y}", Util.floatToStr(totalBoundingSphere.center[1])) \
-            .replace("${BSPHERE.CENTER.Z}", Util.floatToStr(totalBoundingSphere.center[2])) \
-            .replace("${BSPHERE.RADIUS}", Util.floatToStr(totalBoundingSphere.radius)) \
-            .replace("${MESH_FILENAME}", lodName.lower() + ".mesh") \
-            .replace("${SHADERS}\n", shaders)
-
-        fileModelOdr = open(os.path.join(self.getOutputDirMeshes(reflection), lodName.lower() + ".odr"), 'w')
-        fileModelOdr.write(contentModelOdr)
-        fileModelOdr.close()
+        self.modelWriter.writeMesh(os.path.join(self.getOutputDirMeshes(reflection), lodName.lower() + ".mesh"), bounds, geometries)
+        self.modelWriter.writeOdr(os.path.join(self.getOutputDirMeshes(reflection), lodName.lower() + ".odr"), totalBoundingBox, totalBoundingSphere, lodName.lower() + ".mesh", shaders)
 
         itemLodDistance = self.getLodDistance(slodLevel)
         if reflection:
@@ -829,9 +786,81 @@ class LodMapCreator:
         else:
             childLodDistance = maxHdEntityLodDistance
 
-        self.writeYtypItem(lodName, LodMapCreator.TEXTURE_DICTIONARY_LOD, drawableDictionary, totalBoundingBox, totalBoundingSphere, childLodDistance, itemLodDistance, mapPrefix, slodLevel, reflection)
+        ytypItem = self.replacePlaceholders(self.contentTemplateYtypItem, lodName, LodMapCreator.TEXTURE_DICTIONARY_LOD, drawableDictionary, totalBoundingBox, totalBoundingSphere,
+            childLodDistance, itemLodDistance)
+
+        return self.createEntityItem(lodName, center, childLodDistance, itemLodDistance, parentIndex, numChildren, slodLevel, reflection), ytypItem
+
+    def getLodModelTemplates(self, archetypeName: str) -> dict[str, tuple[np.ndarray, np.ndarray, list[list[float]], np.ndarray]]:
+        # vertices, normals, texture UVs and indices of the planes of a LOD model for an entity of that archetype
+        # in local space, i.e. before rotating, scaling and translating them (see instantiateLodModelTemplates)
+        if archetypeName in self.lodModelTemplates:
+            return self.lodModelTemplates[archetypeName]
+
+        lodCandidate = self.lodCandidates[archetypeName]
+        bbox = self.ytypItems[archetypeName].boundingBox
+        sizes = bbox.getSizes()
+        distanceLeftToIntersection = sizes[0] * lodCandidate.texture_origin
+        distanceBottomToIntersection = sizes[1] * lodCandidate.textureOriginSide()
+        planeIntersection = [bbox.min[0] + distanceLeftToIntersection, bbox.min[1] + distanceBottomToIntersection]
+
+        templates = {}
+        for name in ["front", "diagonal", "top", "topRefl"]:
+            vertices = []
+            normals = []
+            textureUVs = []
+            indices = []
+            if name == "front":
+                LodMapCreator.appendFrontPlaneIndicesForLod(indices, 0)
+                self.appendFrontPlaneVerticesForLod(vertices, normals, textureUVs, archetypeName, planeIntersection)
+            elif name == "diagonal":
+                if not lodCandidate.hasDedicatedSideTexture():
+                    continue
+                LodMapCreator.appendFrontPlaneIndicesForLod(indices, 0)
+                self.appendDiagonalPlaneVerticesForLod(vertices, normals, textureUVs, archetypeName, planeIntersection)
+            elif lodCandidate.uvTopMin is None or lodCandidate.uvTopMax is None:
+                continue
+            elif name == "top":
+                LodMapCreator.appendTopPlaneIndicesForLod(indices, 0)
+                self.appendTopPlaneVerticesForLod(vertices, normals, textureUVs, archetypeName, planeIntersection)
+            else:
+                LodMapCreator.appendTopPlaneIndicesForReflLod(indices, 0)
+                self.appendTopPlaneVerticesForReflLod(vertices, normals, textureUVs, archetypeName)
+
+            templates[name] = (np.array(vertices, dtype=float), np.array(normals, dtype=float), textureUVs, np.array(indices))
 
-        return self.createEntityItem(lodName, center, childLodDistance, itemLodDistance, parentIndex, numChildren, slodLevel, reflection)
+        self.lodModelTemplates[archetypeName] = templates
+        return templates
+
+    @staticmethod
+    def instantiateLodModelTemplates(entities: list[EntityItem], templatesOfEntities: list[list[tuple]]) -> (list[list[float]], np.ndarray, list[list[float]], list[int]):
+        # transforms the templates (see getLodModelTemplates) of all entities at once. the vertices of every entity follow
+        # each other in the order of the entities and their templates, the indices refer to them accordingly
+        localVertices = []
+        localNormals = []
+        textureUVs = []
+        indices = []
+        numVerticesOfEntities = []
+        numVertices = 0
+        for templates in templatesOfEntities:
+            numVerticesOfEntity = 0
+            for vertices, normals, uvs, templateIndices in templates:
+                localVertices.append(vertices)
+                localNormals.append(normals)
+                textureUVs += uvs
+                indices.append(templateIndices + numVertices + numVerticesOfEntity)
+                numVerticesOfEntity += len(vertices)
+            numVerticesOfEntities.append(numVerticesOfEntity)
+            numVertices += numVerticesOfEntity
+
+        rotations = np.repeat(np.array([entity.rotation for entity in entities], dtype=float), numVerticesOfEntities, axis=0)
+        scales = np.repeat(np.array([entity.scale for entity in entities], dtype=float), numVerticesOfEntities, axis=0)
+        positions = np.repeat(np.array([entity.position for entity in entities], dtype=float), numVerticesOfEntities, axis=0)
+
+        vertices = Util.applyTransformations(np.concatenate(localVertices), rotations, scales, positions)
+        normals = Util.applyRotations(np.concatenate(localNormals), rotations)
+
+        return vertices.tolist(), normals, textureUVs, np.concatenate(indices).tolist()
 
     def calculateVectorOnEllipseAtDiagonal(self, semiaxisX: float, semiaxisY: float, quadrant: int) -> list[float]:
         coordinate = semiaxisX * semiaxisY / math.sqrt(semiaxisX**2 + semiaxisY**2)
@@ -850,6 +879,7 @@ class LodMapCreator:
             file.write(os.path.join(relPath, entity.archetypeName.lower() + ".odr"))
             file.write("\n")
         file.write("}\n")
+        Metrics.addFileWritten(file.tell())
         file.close()
 
     def appendSlodTop(self, verticesTop: list[list[float]], normalsTop: list[list[float]], textureUVsTop: list[list[float]], size: list[float], center: list[float], rotation: list[float], uvMap: UVMap):
@@ -888,9 +918,7 @@ class LodMapCreator:
             [uvMap.topMin.u, uvMap.topMin.v]
         ]
 
-    def createSlodModel(self, name: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str) -> EntityItem:
-        self.foundSlod = True
-
+    def createSlodModel(self, name: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str) -> (EntityItem, str):
         verticesFront = {}
         sizesFront = {}
         textureUVsFront = {}
@@ -960,75 +988,42 @@ class LodMapCreator:
         totalBoundingBox = totalBoundingGeometry.getBox().getTranslated(translation)
         totalBoundingSphere = totalBoundingSphere.getTranslated(translation)
 
-        bounds = self.createAabb(totalBoundingBox)
+        bounds = [totalBoundingBox]
 
         shaders = ""
-        geometries = ""
+        geometries = []
         shaderIndex = 0
         for diffuseSampler in verticesFront:
             numFrontPlanes = len(verticesFront[diffuseSampler])
             indicesFront = self.createIndicesForRectangles(numFrontPlanes)
 
             bbox[diffuseSampler] = bbox[diffuseSampler].getTranslated(translation)
-            verticesFrontStr = LodMapCreator.convertVerticesTextureUVsAsStrForSlod(verticesFront[diffuseSampler], sizesFront[diffuseSampler], textureUVsFront[diffuseSampler], translation)
 
             shaders += self.contentTemplateOdrShaderTreeLod2.replace("${DIFFUSE_SAMPLER}", diffuseSampler)
 
-            bounds += self.createAabb(bbox[diffuseSampler])
+            bounds.append(bbox[diffuseSampler])
 
-            geometries += self.contentTemplateMeshGeometry \
-                .replace("${SHADER_INDEX}", str(shaderIndex)) \
-                .replace("${VERTEX_DECLARATION}", self.VERTEX_DECLARATION_TREE_LOD2) \
-                .replace("${INDICES.NUM}", str(numFrontPlanes * 6)) \
-                .replace("${INDICES}", self.createIndicesStr(indicesFront)) \
-                .replace("${VERTICES.NUM}", str(numFrontPlanes * 4)) \
-                .replace("${VERTICES}\n", verticesFrontStr)
+            geometries.append(self.modelWriter.createGeometry(shaderIndex, self.VERTEX_DECLARATION_TREE_LOD2,
+                numFrontPlanes * 6, ModelWriter.formatIndices(indicesFront),
+                numFrontPlanes * 4, ModelWriter.formatSlodVertices(verticesFront[diffuseSampler], sizesFront[diffuseSampler], textureUVsFront[diffuseSampler], translation)))
             shaderIndex += 1
 
             if len(verticesTop[diffuseSampler]) > 0:
                 assert len(verticesTop[diffuseSampler]) % 4 == 0
                 numTopPlanes = int(len(verticesTop[diffuseSampler]) / 4)
                 indicesTop = self.createIndicesForRectangles(numTopPlanes)
-                verticesTopStr = LodMapCreator.convertVerticesNormalsTextureUVsAsStr(verticesTop[diffuseSampler], normalsTop[diffuseSampler], textureUVsTop[diffuseSampler], translation)
 
                 shaders += self.contentTemplateOdrShaderTreeLod.replace("${DIFFUSE_SAMPLER}", diffuseSampler + "_top")
 
-                bounds += self.createAabb(bbox[diffuseSampler])
+                bounds.append(bbox[diffuseSampler])
 
-                geometries += self.contentTemplateMeshGeometry \
-                    .replace("${SHADER_INDEX}", str(shaderIndex)) \
-                    .replace("${VERTEX_DECLARATION}", self.VERTEX_DECLARATION_TREE_LOD) \
-                    .replace("${INDICES.NUM}", str(numTopPlanes * 6)) \
-                    .replace("${INDICES}", self.createIndicesStr(indicesTop)) \
-                    .replace("${VERTICES.NUM}", str(len(verticesTop[diffuseSampler]))) \
-                    .replace("${VERTICES}\n", verticesTopStr)
+                geometries.append(self.modelWriter.createGeometry(shaderIndex, self.VERTEX_DECLARATION_TREE_LOD,
+                    numTopPlanes * 6, ModelWriter.formatIndices(indicesTop),
+                    len(verticesTop[diffuseSampler]), ModelWriter.formatLodVertices(verticesTop[diffuseSampler], normalsTop[diffuseSampler], textureUVsTop[diffuseSampler], translation)))
                 shaderIndex += 1
 
-        contentModelMesh = self.contentTemplateMesh \
-            .replace("${BOUNDS}\n", bounds) \
-            .replace("${GEOMETRIES}\n", geometries)
-
-        fileModelMesh = open(os.path.join(self.getOutputDirMeshes(False), name.lower() + ".mesh"), 'w')
-        fileModelMesh.write(contentModelMesh)
-        fileModelMesh.close()
-
-        contentModelOdr = self.contentTemplateOdr \
-            .replace("${BBOX.MIN.X}", Util.floatToStr(totalBoundingBox.min[0])) \
-            .replace("${BBOX.MIN.Y}", Util.floatToStr(totalBoundingBox.min[1])) \
-            .replace("${BBOX.MIN.Z}", Util.floatToStr(totalBoundingBox.min[2])) \
-            .replace("${BBOX.MAX.X}", Util.floatToStr(totalBoundingBox.max[0])) \
-            .replace("${BBOX.MAX.Y}", Util.floatToStr(totalBoundingBox.max[1])) \
-            .replace("${BBOX.MAX.Z}", Util.floatToStr(totalBoundingBox.max[2])) \
-            .replace("${BSPHERE.CENTER.X}", Util.floatToStr(totalBoundingSphere.center[0])) \
-            .replace("${BSPHERE.CENTER.Y}", Util.floatToStr(totalBoundingSphere.center[1])) \
-            .replace("${BSPHERE.CENTER.Z}", Util.floatToStr(totalBoundingSphere.center[2])) \
-            .replace("${BSPHERE.RADIUS}", Util.floatToStr(totalBoundingSphere.radius)) \
-            .replace("${MESH_FILENAME}", name.lower() + ".mesh") \
-            .replace("${SHADERS}\n", shaders)
-
-        fileModelOdr = open(os.path.join(self.getOutputDirMeshes(False), name.lower() + ".odr"), 'w')
-        fileModelOdr.write(contentModelOdr)
-        fileModelOdr.close()
+        self.modelWriter.writeMesh(os.path.join(self.getOutputDirMeshes(False), name.lower() + ".mesh"), bounds, geometries)
+        self.modelWriter.writeOdr(os.path.join(self.getOutputDirMeshes(False), name.lower() + ".odr"), totalBoundingBox, totalBoundingSphere, name.lower() + ".mesh", shaders)
 
         itemLodDistance = self.getLodDistance(slodLevel)
         if slodLevel == 0:
@@ -1036,13 +1031,12 @@ class LodMapCreator:
         else:
             childLodDistance = self.getLodDistance(slodLevel - 1)
 
-        self.writeYtypItem(name, LodMapCreator.TEXTURE_DICTIONARY_SLOD, drawableDictionary, totalBoundingBox, totalBoundingSphere, childLodDistance, itemLodDistance, mapPrefix, slodLevel, False)
-
-        return self.createEntityItem(name, center, childLodDistance, itemLodDistance, parentIndex, numChildren, slodLevel, False)
+        ytypItem = self.replacePlaceholders(self.contentTemplateYtypItem, name, LodMapCreator.TEXTURE_DICTIONARY_SLOD, drawableDictionary, totalBoundingBox, totalBoundingSphere,
+            childLodDistance, itemLodDistance)
 
-    def writeYtypItem(self, name: str, textureDictionary: str, drawableDictionary: str, totalBoundingBox: Box, totalBoundingSphere: Sphere, childLodDistance: float,
-            itemLodDistance: float, mapPrefix: str, slodLevel: int, reflection: bool):
+        return self.createEntityItem(name, center, childLodDistance, itemLodDistance, parentIndex, numChildren, slodLevel, False), ytypItem
 
+    def writeYtypItem(self, item: str, mapPrefix: str, slodLevel: int, reflection: bool):
         if reflection:
             ytypItemsDict = self.reflYtypItems
         else:
@@ -1060,9 +1054,6 @@ class LodMapCreator:
 """)
             ytypItemsDict[ytypName] = ytypItems
 
-        item = self.replacePlaceholders(self.contentTemplateYtypItem, name, textureDictionary, drawableDictionary, totalBoundingBox, totalBoundingSphere,
-            childLodDistance, itemLodDistance)
-
         ytypItems.write(item)
 
     def getLodDistance(self, slodLevel: int) -> int:
@@ -1175,7 +1166,7 @@ class LodMapCreator:
 
     def determinePrefixBundles(self):
         mapNames = []
-        for filename in natsorted(os.listdir(self.inputDir)):
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if filename.endswith(".ymap.xml") and not filename.endswith("_lod.ymap.xml") and not filename.endswith("_slod2.ymap.xml"):
                 mapNames.append(Util.getMapnameFromFilename(filename))
 
@@ -1205,65 +1196,59 @@ class LodMapCreator:
   <compositeEntityTypes/>
 </CMapTypes>""")
 
+        Metrics.addFileWritten(ytypItems.tell())
         ytypItems.close()
 
+    def isLodCandidate(self, archetypeName: str) -> bool:
+        archetypeName = archetypeName.lower()
+        if archetypeName not in self.ytypItems:
+            return False
+        elif self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE > 0:
+            return archetypeName in self.lodCandidates
+        else:
+            return archetypeName in self.slodCandidates
+
     def processFilesWithPrefix(self, mapPrefix: str):
+        table = EntityTable()
         hdEntitiesWithLod = []
-        lodCoords = []
         lodDistances = []
-        for filename in natsorted(os.listdir(self.inputDir)):
+        self.contentsNoLod = {}
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if not filename.endswith(".ymap.xml") or not filename.startswith(mapPrefix.lower()):
                 continue
 
             mapName = Util.getMapnameFromFilename(filename)
 
-            if os.path.exists(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapName))):
+            if Util.exists(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapName))):
                 print("\twarning: skipping " + filename + " since such a map was created by this script")
                 continue
 
             print("\tprocessing " + filename)
 
-            fileNoLod = open(os.path.join(self.inputDir, filename), 'r')
-            contentNoLod = fileNoLod.read()
-            fileNoLod.close()
+            contentNoLod = Util.readFile(os.path.join(self.inputDir, filename))
 
             contentNoLod = self.resetParentIndexAndNumChildren(contentNoLod)
             contentNoLod = Ymap.replaceName(contentNoLod, mapName)
 
-            fileNoLod = open(os.path.join(self.getOutputDirMaps(False), filename), 'w')
-            fileNoLod.write(contentNoLod)
-            fileNoLod.close()
+            Util.writeFile(os.path.join(self.getOutputDirMaps(False), filename), contentNoLod)
+            self.contentsNoLod[filename] = contentNoLod
 
-            pattern = re.compile('[\t ]*<Item type="CEntityDef">' +
-                                 '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-                                 '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"\\s*/>' +
-                                 '\\s*<scaleXY value="([^"]+)"\\s*/>' +
-                                 '\\s*<scaleZ value="([^"]+)"\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<lodDist value="([^"]+)"\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*</Item>[\r\n]+')
+            table.addContent(contentNoLod, mapName)
 
-            for matchobj in re.finditer(pattern, contentNoLod):
-                archetypeName = matchobj.group(1).lower()
-                if archetypeName not in self.ytypItems or \
-                        (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE > 0 and archetypeName not in self.lodCandidates) or \
-                        (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE <= 0 and archetypeName not in self.slodCandidates):
-                    continue
+        candidates = table.select(table.maskArchetypes(self.isLodCandidate))
+        lodCoords = candidates.getPositions()
+        rotations = candidates.getRotations()  # order is w, -x, -y, -z
+        scales = candidates.getScales()
+        for i in range(len(candidates)):
+            archetypeName = candidates.getArchetypeName(i).lower()
+            archetype = self.ytypItems[archetypeName]
+            scale = scales[i].tolist()
+            lodDistance = Util.calculateLodDistance(archetype.boundingBox, archetype.boundingSphere, scale, True)
+            entity = EntityItem(archetypeName, lodCoords[i].tolist(), scale, rotations[i].tolist(), lodDistance)
 
-                archetype = self.ytypItems[archetypeName]
-                position = [float(matchobj.group(2)), float(matchobj.group(3)), float(matchobj.group(4))]
-                rotation = [float(matchobj.group(8)), -float(matchobj.group(5)), -float(matchobj.group(6)), -float(matchobj.group(7))]  # order is w, -x, -y, -z
-                scale = [float(matchobj.group(9)), float(matchobj.group(9)), float(matchobj.group(10))]
-                lodDistance = Util.calculateLodDistance(archetype.boundingBox, archetype.boundingSphere, scale, True)
-                entity = EntityItem(archetypeName, position, scale, rotation, lodDistance)
+            hdEntitiesWithLod.append(entity)
 
-                hdEntitiesWithLod.append(entity)
-
-                lodCoords.append(position)
-                lodDistances.append(lodDistance)
+            lodDistances.append(lodDistance)
 
         hierarchy = self.calculateLodHierarchy(lodCoords, lodDistances)
 
@@ -1275,53 +1260,42 @@ class LodMapCreator:
             LodMapCreator.MIN_HD_LOD_DISTANCE_FOR_SLOD4,
         ]
 
-        entitiesForReflModels = {}
-        entitiesForLodModels = [{}, {}, {}, {}, {}]
-        hierarchyMappingFromPreviousLevel = [{}, {}, {}, {}, {}]
-        lodNumChildren = [{}, {}, {}, {}, {}]
-
-        for i in range(len(hdEntitiesWithLod)):
-            hdEntity = hdEntitiesWithLod[i]
-            h = hierarchy[i]
-
-            hierarchyMappingFromPreviousLevel[0][i] = h[0]
-            lodNumChildren[0][h[0]] = lodNumChildren[0].get(h[0], 0) + 1
-            if h[0] not in entitiesForLodModels[0]:
-                entitiesForLodModels[0][h[0]] = []
-            entitiesForLodModels[0][h[0]].append(hdEntity)
-
-            for lodLevel in range(len(entitiesForLodModels)):
-                if lodLevel == 0:
-                    # for lod level 0 the HD entity must be used in currentHierarchy
-                    currentHierarchy = i
-                    nextLodLevel = 0
-                elif lodLevel == 1:
-                    # for lod level 1 the LOD entity must be used in currentHierarchy which is not in h[1] because
-                    # hierarchy level 1 is only used to separate by lod distance but does not result in the LOD level itself
-                    currentHierarchy = h[0]
-                    nextLodLevel = lodLevel + 1
-
-                    # add entity to reflection model
-                    if h[nextLodLevel] not in entitiesForReflModels:
-                        entitiesForReflModels[h[nextLodLevel]] = []
-                    entitiesForReflModels[h[nextLodLevel]].append(hdEntity)
-                else:
-                    currentHierarchy = h[lodLevel]
-                    nextLodLevel = lodLevel + 1
-
-                if self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE <= lodLevel and hdEntity.archetypeName not in self.slodCandidates:
-                    continue
+        isSlodCandidate = np.array([hdEntity.archetypeName in self.slodCandidates for hdEntity in hdEntitiesWithLod], dtype=bool)
+        hdLodDistances = np.array(lodDistances, dtype=float)
 
-                if hdEntity.lodDistance < minLodDistances[lodLevel]:
-                    continue
+        # every entity is part of the reflection model of its SLOD1
+        entitiesForReflModels = LodMapCreator.groupEntities(hdEntitiesWithLod, hierarchy[:, 2], np.arange(len(hdEntitiesWithLod)))
 
-                if currentHierarchy not in hierarchyMappingFromPreviousLevel[lodLevel]:
-                    hierarchyMappingFromPreviousLevel[lodLevel][currentHierarchy] = h[nextLodLevel]
-                    lodNumChildren[lodLevel][h[nextLodLevel]] = lodNumChildren[lodLevel].get(h[nextLodLevel], 0) + 1
-
-                if h[nextLodLevel] not in entitiesForLodModels[lodLevel]:
-                    entitiesForLodModels[lodLevel][h[nextLodLevel]] = []
-                entitiesForLodModels[lodLevel][h[nextLodLevel]].append(hdEntity)
+        entitiesForLodModels = []
+        hierarchyMappingFromPreviousLevel = []
+        lodNumChildren = []
+        for lodLevel in range(len(minLodDistances)):
+            if lodLevel == 0:
+                # for lod level 0 the HD entities are the children
+                children = np.arange(len(hdEntitiesWithLod))
+                keys = hierarchy[:, 0]
+            else:
+                # for lod level 1 the LOD entities are the children which are not in column 1 because
+                # hierarchy level 1 is only used to separate by lod distance but does not result in the LOD level itself
+                children = hierarchy[:, 0 if lodLevel == 1 else lodLevel]
+                keys = hierarchy[:, lodLevel + 1]
+
+            selected = hdLodDistances >= minLodDistances[lodLevel]
+            if self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE <= lodLevel:
+                selected &= isSlodCandidate
+            selected = np.flatnonzero(selected)
+
+            # every child belongs to exactly one model, so take the key of its first entity
+            uniqueChildren, firstEntities = np.unique(children[selected], return_index=True)
+            keysOfChildren = keys[selected[firstEntities]]
+            hierarchyMappingFromPreviousLevel.append(dict(zip(uniqueChildren.tolist(), keysOfChildren.tolist())))
+            uniqueKeys, numChildren = np.unique(keysOfChildren, return_counts=True)
+            lodNumChildren.append(dict(zip(uniqueKeys.tolist(), numChildren.tolist())))
+
+            if lodLevel == 0:
+                # the entities of the LOD models are every HD entity twice
+                selected = np.repeat(selected, 2)
+            entitiesForLodModels.append(LodMapCreator.groupEntities(hdEntitiesWithLod, keys, selected))
 
         if self.SLOD3_DISTANCE == self.SLOD4_DISTANCE:
             entitiesForLodModels[4] = {}
@@ -1335,38 +1309,41 @@ class LodMapCreator:
 
         self.adaptHdMapsForPrefix(mapPrefix, hdEntitiesWithLod, hierarchyMappingFromPreviousLevel[0], numSlod1Entities)
 
+    @staticmethod
+    def groupEntities(entities: list[EntityItem], keys: np.ndarray, indices: np.ndarray) -> dict[int, list[EntityItem]]:
+        # entities at the given indices grouped by their key (in the order of the indices)
+        uniqueKeys, indicesOfKeys = Util.groupByLabel(keys[indices])
+        return {key: [entities[i] for i in indices[indicesOfKey]] for key, indicesOfKey in zip(uniqueKeys.tolist(), indicesOfKeys)}
+
     def createReflLodMapsModels(self, entitiesForReflLodModels: dict[int, list[EntityItem]], prefix: str):
         reflDrawableDictionary = prefix + "_refl_children"
-        drawableDictionariesReflEntities = [[]]
 
-        index = 0
-        for key in sorted(entitiesForReflLodModels):
+        reflTasks = []
+        for index, key in enumerate(sorted(entitiesForReflLodModels)):
             reflName = prefix + "_refl_" + str(index)
-
-            if len(drawableDictionariesReflEntities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                drawableDictionariesReflEntities.append([])
-
-            drawableDictionariesReflEntities[-1].append(self.createLodOrSlodModel(
+            reflTasks.append((
                 reflName, 1,
-                reflDrawableDictionary + "_" + str(len(drawableDictionariesReflEntities) - 1),
+                reflDrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForReflLodModels[key],
                 -1, 0,
                 prefix, True
             ))
 
-            index += 1
-
-        for reflEntitiesIndex in range(len(drawableDictionariesReflEntities)):
-            self.createDrawableDictionary(reflDrawableDictionary + "_" + str(reflEntitiesIndex), drawableDictionariesReflEntities[reflEntitiesIndex], True)
+        [reflEntities] = self.createLodOrSlodModels([reflTasks])
 
-        reflEntities = []
-        for drawableDictionaryReflEntities in drawableDictionariesReflEntities:
-            reflEntities += drawableDictionaryReflEntities
+        for reflEntitiesIndex, drawableDictionaryReflEntities in enumerate(LodMapCreator.splitIntoDrawableDictionaries(reflEntities)):
+            self.createDrawableDictionary(reflDrawableDictionary + "_" + str(reflEntitiesIndex), drawableDictionaryReflEntities, True)
 
         if len(reflEntities) > 0:
             mapName = prefix + "_refl"
             self.writeLodOrSlodMap(mapName, None, ContentFlag.SLOD | ContentFlag.SLOD2, reflEntities, True)
 
+    @staticmethod
+    def splitIntoDrawableDictionaries(entities: list[EntityItem]) -> list[list[EntityItem]]:
+        # the i-th entity belongs to drawable dictionary i // MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY
+        maxNumChildren = LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY
+        return [entities[i:i + maxNumChildren] for i in range(0, len(entities), maxNumChildren)]
+
     def createLodSlodMapsModels(self, entitiesForLodModels: list[dict[int, list[EntityItem]]], hierarchyMappingFromPreviousLevel: list[dict[int, int]], lodNumChildren: list[dict[int, int]], prefix: str) -> int:
         lodDrawableDictionary = prefix + "_lod_children"
         slod1DrawableDictionary = prefix + "_slod1_children"
@@ -1374,17 +1351,13 @@ class LodMapCreator:
         slod3DrawableDictionary = prefix + "_slod3_children"
         slod4DrawableDictionary = prefix + "_slod4_children"
 
-        lodEntities = [[]]
-        slod1Entities = [[]]
-        slod2Entities = []
-        slod3Entities = []
-        slod4Entities = []
-
-        index = 0
+        # the index of a model within its level (and therefore the parent index of its children) is given by the order of
+        # the keys, so the tasks of all levels are known in advance and all models are created at once
+        slod4Tasks = []
         slod4KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[4]):
+        for index, key in enumerate(sorted(entitiesForLodModels[4])):
             slodName = prefix + "_" + str(index)
-            slod4Entities.append(self.createLodOrSlodModel(
+            slod4Tasks.append((
                 slodName, 4,
                 slod4DrawableDictionary,
                 entitiesForLodModels[4][key],
@@ -1392,14 +1365,13 @@ class LodMapCreator:
                 prefix, False
             ))
             slod4KeyToIndex[key] = index
-            index += 1
 
-        index = 0
+        slod3Tasks = []
         slod3KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[3]):
+        for index, key in enumerate(sorted(entitiesForLodModels[3])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[4], slod4KeyToIndex, 0)
-            slod3Entities.append(self.createLodOrSlodModel(
+            slod3Tasks.append((
                 slodName, 3,
                 slod3DrawableDictionary,
                 entitiesForLodModels[3][key],
@@ -1407,14 +1379,13 @@ class LodMapCreator:
                 prefix, False
             ))
             slod3KeyToIndex[key] = index
-            index += 1
 
-        index = 0
+        slod2Tasks = []
         slod2KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[2]):
+        for index, key in enumerate(sorted(entitiesForLodModels[2])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[3], slod3KeyToIndex, 0)
-            slod2Entities.append(self.createLodOrSlodModel(
+            slod2Tasks.append((
                 slodName, 2,
                 slod2DrawableDictionary,
                 entitiesForLodModels[2][key],
@@ -1422,49 +1393,41 @@ class LodMapCreator:
                 prefix, False
             ))
             slod2KeyToIndex[key] = index
-            index += 1
 
-        index = 0
+        slod1Tasks = []
         slod1KeyToIndex = {}
-        parentIndexOffset = len(slod3Entities)
-        for key in sorted(entitiesForLodModels[1]):
+        parentIndexOffset = len(slod3Tasks)
+        for index, key in enumerate(sorted(entitiesForLodModels[1])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[2], slod2KeyToIndex, parentIndexOffset)
-
-            if len(slod1Entities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                slod1Entities.append([])
-
-            slod1Entities[-1].append(self.createLodOrSlodModel(
+            slod1Tasks.append((
                 slodName, 1,
-                slod1DrawableDictionary + "_" + str(len(slod1Entities) - 1),
+                slod1DrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForLodModels[1][key],
                 parentIndex, lodNumChildren[1][key],
                 prefix, False
             ))
-
             slod1KeyToIndex[key] = index
-            index += 1
 
-        for key in sorted(entitiesForLodModels[0]):
+        lodTasks = []
+        for index, key in enumerate(sorted(entitiesForLodModels[0])):
             lodName = prefix + "_" + str(key)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[1], slod1KeyToIndex, 0)
-
-            if len(lodEntities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                lodEntities.append([])
-
-            lodEntities[-1].append(self.createLodOrSlodModel(
+            lodTasks.append((
                 lodName, 0,
-                lodDrawableDictionary + "_" + str(len(lodEntities) - 1),
+                lodDrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForLodModels[0][key],
                 parentIndex, lodNumChildren[0][key],
                 prefix, False
             ))
 
-        for lodEntitiesIndex in range(len(lodEntities)):
-            self.createDrawableDictionary(lodDrawableDictionary + "_" + str(lodEntitiesIndex), lodEntities[lodEntitiesIndex], False)
+        slod4Entities, slod3Entities, slod2Entities, slod1Entities, lodEntities = self.createLodOrSlodModels([slod4Tasks, slod3Tasks, slod2Tasks, slod1Tasks, lodTasks])
+
+        for lodEntitiesIndex, drawableDictionaryLodEntities in enumerate(LodMapCreator.splitIntoDrawableDictionaries(lodEntities)):
+            self.createDrawableDictionary(lodDrawableDictionary + "_" + str(lodEntitiesIndex), drawableDictionaryLodEntities, False)
 
-        for slod1EntitiesIndex in range(len(slod1Entities)):
-            self.createDrawableDictionary(slod1DrawableDictionary + "_" + str(slod1EntitiesIndex), slod1Entities[slod1EntitiesIndex], False)
+        for slod1EntitiesIndex, drawableDictionarySlod1Entities in enumerate(LodMapCreator.splitIntoDrawableDictionaries(slod1Entities)):
+            self.createDrawableDictionary(slod1DrawableDictionary + "_" + str(slod1EntitiesIndex), drawableDictionarySlod1Entities, False)
 
         self.createDrawableDictionary(slod2DrawableDictionary, slod2Entities, False)
         self.createDrawableDictionary(slod3DrawableDictionary, slod3Entities, False)
@@ -1482,20 +1445,13 @@ class LodMapCreator:
             slod2MapName = prefix + "_slod2"
             self.writeLodOrSlodMap(slod2MapName, slod4MapName, ContentFlag.SLOD | ContentFlag.SLOD2, slod3Entities + slod2Entities, False)
 
-        slod1AndLodEntities = []
-        numSlod1Entities = 0
-        for slod1s in slod1Entities:
-            slod1AndLodEntities += slod1s
-            numSlod1Entities += len(slod1s)
-
-        for lods in lodEntities:
-            slod1AndLodEntities += lods
+        slod1AndLodEntities = slod1Entities + lodEntities
 
         if len(slod1AndLodEntities) > 0:
             lodMapName = prefix + "_lod"
             self.writeLodOrSlodMap(lodMapName, slod2MapName, ContentFlag.LOD | ContentFlag.SLOD, slod1AndLodEntities, False)
 
-        return numSlod1Entities
+        return len(slod1Entities)
 
     def getParentIndexForKey(self, key: int, keyToParentKey: dict[int, int], parentKeyToIndex: dict[int, int], parentIndexOffset: int):
         if key not in keyToParentKey:
@@ -1505,15 +1461,16 @@ class LodMapCreator:
 
     def adaptHdMapsForPrefix(self, mapPrefix: str, hdEntities: list[EntityItem], hdToLod: dict[int, int], offsetParentIndex: int):
         mutableIndex = [0]
-        for filename in natsorted(os.listdir(self.inputDir)):
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if not filename.endswith(".ymap.xml") or not filename.startswith(mapPrefix.lower()):
                 continue
 
             pathNoLod = os.path.join(self.getOutputDirMaps(False), filename)
-            fileNoLod = open(pathNoLod, 'r')
-            contentNoLod = fileNoLod.read()
-            fileNoLod.close()
-            os.remove(pathNoLod)
+            # no need to read the maps written by processFilesWithPrefix again
+            contentNoLod = self.contentsNoLod.pop(filename, None)
+            if contentNoLod is None:
+                contentNoLod = Util.readFile(pathNoLod)
+            Util.removeFile(pathNoLod)
 
             # fix parentIndex in hd map to match lod map
             contentNoLod = re.sub('(\\s*<Item type="CEntityDef">' +
@@ -1529,18 +1486,14 @@ class LodMapCreator:
 
             if hdEntitiesContent is None and orphanHdEntities is None:
                 contentNoLod = Ymap.replaceParent(contentNoLod, None)
-                fileHd = open(pathNoLod, 'w')
-                fileHd.write(contentNoLod)
-                fileHd.close()
+                Util.writeFile(pathNoLod, contentNoLod)
                 return
 
             if hdEntitiesContent is not None:
                 mapNameLod = mapPrefix.lower().rstrip("_") + "_lod"
                 contentHd = contentBeforeEntities + hdEntitiesContent + contentAfterEntities
                 contentHd = Ymap.replaceParent(contentHd, mapNameLod)
-                fileHd = open(pathNoLod, 'w')
-                fileHd.write(contentHd)
-                fileHd.close()
+                Util.writeFile(pathNoLod, contentHd)
 
             if orphanHdEntities is not None:
                 mapName = Util.getMapnameFromFilename(filename)
@@ -1549,9 +1502,7 @@ class LodMapCreator:
                 if hdEntitiesContent is None:
                     contentHd = contentBeforeEntities + orphanHdEntities + contentAfterEntities
                     contentHd = Ymap.replaceParent(contentHd, None)
-                    fileHd = open(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapNameStrm)), 'w')
-                    fileHd.write(contentHd)
-                    fileHd.close()
+                    Util.writeFile(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapNameStrm)), contentHd)
                 else:
                     self.writeStrmMap(mapNameStrm, orphanHdEntities)
 
@@ -1574,9 +1525,9 @@ class LodMapCreator:
 
         mapsDir = self.getOutputDirMaps(reflection)
 
-        fileMap = open(os.path.join(mapsDir, Util.getFilenameFromMapname(mapName)), 'w')
-        fileMap.write(content)
-        fileMap.close()
+        if not reflection:
+            self.contentsNoLod.pop(Util.getFilenameFromMapname(mapName), None)
+        Util.writeFile(os.path.join(mapsDir, Util.getFilenameFromMapname(mapName)), content)
 
     def createEntitiesContent(self, entities: list[EntityItem]):
         contentEntities = ""
@@ -1594,64 +1545,59 @@ class LodMapCreator:
                 .replace("${FLAGS}", str(entity.flags))
         return contentEntities
 
-    def calculateLodHierarchy(self, points: list[list[float]], lodDistances: list[float]) -> list[list[int]]:
+    def calculateLodHierarchy(self, points: np.ndarray, lodDistances: list[float]) -> np.ndarray:
+        # cluster of every entity (rows) on every level of the hierarchy (columns) in reverse order, i.e. column 0 is the
+        # lowest level (LOD) and the last column the highest level (SLOD4). clusters are numbered across all parents of a level
+        numLevels = LodMapCreator.NUM_LOD_HIERARCHY_LEVELS
+        hierarchy = np.zeros((len(points), numLevels), dtype=int)
         if len(points) == 0:
-            return []
-
-        hierarchy = []
-        for i in range(len(points)):
-            hierarchy.append([])
-
-        return self._calculateLodHierarchy(points, lodDistances, hierarchy)
-
-    def _calculateLodHierarchy(self, points: list[list[float]], lodDistances: list[float], hierarchy: list[list[int]]) -> list[list[int]]:
-        numMaxChildren = -1
-        clusterWithRespectToPosition = True
-        level = len(hierarchy[0])
-        if level == 0:
-            maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD4
-        elif level == 1:
-            maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD3
-        elif level == 2:
-            maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD2
-        elif level == 3:
-            maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD1
-        elif level == 4:
-            maxExtends = LodMapCreator.LOD_DISTANCES_MAX_DIFFERENCE_LOD
-            clusterWithRespectToPosition = False
-        elif level == 5:
-            maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_LOD
-            numMaxChildren = LodMapCreator.NUM_CHILDREN_MAX_VALUE
-        else:
             return hierarchy
 
-        absIndices = []
-        pointsOfParent = []
-        for i in range(len(points)):
-            parentIndex = 0 if len(hierarchy[i]) == 0 else hierarchy[i][0]
+        points = np.asarray(points, dtype=float)
+        lodDistances = np.array(lodDistances, dtype=float).reshape(-1, 1)
+
+        parents = np.zeros(len(points), dtype=int)
+        for level in range(numLevels):
+            numMaxChildren = -1
+            samples = points
+            if level == 0:
+                maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD4
+            elif level == 1:
+                maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD3
+            elif level == 2:
+                maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD2
+            elif level == 3:
+                maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_SLOD1
+            elif level == 4:
+                maxExtends = LodMapCreator.LOD_DISTANCES_MAX_DIFFERENCE_LOD
+                samples = lodDistances
+            else:
+                maxExtends = LodMapCreator.ENTITIES_EXTENTS_MAX_DIAGONAL_LOD
+                numMaxChildren = LodMapCreator.NUM_CHILDREN_MAX_VALUE
 
-            while parentIndex >= len(pointsOfParent):
-                absIndices.append([])
-                pointsOfParent.append([])
+            parents = self.clusterPerParent(samples, parents, numMaxChildren, maxExtends)
+            hierarchy[:, numLevels - 1 - level] = parents
 
-            absIndices[parentIndex].append(i)
-            if clusterWithRespectToPosition:
-                sample = points[i]
-            else:
-                sample = [lodDistances[i]]
-            pointsOfParent[parentIndex].append(sample)
+        return hierarchy
 
-        clusterOffset = 0
-        for parentIndex in range(len(pointsOfParent)):
-            clustering, unused = Util.performClustering(pointsOfParent[parentIndex], numMaxChildren, maxExtends)
+    def clusterPerParent(self, samples: np.ndarray, parents: np.ndarray, numMaxChildren: int, maxExtends: float) -> np.ndarray:
+        unused, indicesOfParents = Util.groupByLabel(parents)
 
-            for c in range(len(clustering)):
-                i = absIndices[parentIndex][c]
-                hierarchy[i].insert(0, clustering[c] + clusterOffset)
+        if len(indicesOfParents) > 1:
+            # parents are clustered independently of each other, so in parallel (then every clustering on its own uses one process)
+            tasks = [(samples[indices], numMaxChildren, maxExtends) for indices in indicesOfParents]
+            clusterings = ProcessPool.map(Util, "performClustering", tasks, self.jobs)
+        else:
+            clusterings = [Util.performClustering(samples[indicesOfParents[0]], numMaxChildren, maxExtends, False, self.jobs)]
 
+        # results are in the order of the parents, so the numbering of the clusters is the same as clustering them one after another
+        clusters = np.empty(len(samples), dtype=int)
+        clusterOffset = 0
+        for indices, (clustering, unused) in zip(indicesOfParents, clusterings):
+            clusters[indices] = clustering + clusterOffset
             clusterOffset += max(clustering) + 1
 
-        return self._calculateLodHierarchy(points, lodDistances, hierarchy)
+        return clusters
 
     def copyOthers(self):
         # copy other files
@@ -1668,15 +1614,11 @@ class LodMapCreator:
             if not filename.endswith(".ymap.xml"):
                 continue
 
-            file = open(os.path.join(mapsDir, filename), 'r')
-            content = file.read()
-            file.close()
+            content = Util.readFile(os.path.join(mapsDir, filename))
 
             content = Ymap.fixMapExtents(content, self.ytypItems)
 
-            file = open(os.path.join(mapsDir, filename), 'w')
-            file.write(content)
-            file.close()
+            Util.writeFile(os.path.join(mapsDir, filename), content)
 
     def createManifest(self, reflection: bool) -> None:
         print("\tcreating manifest")
@@ -1687,7 +1629,7 @@ class LodMapCreator:
         manifest.writeManifest()
 
     def addLodAndSlodModelsToYtypDict(self, reflection: bool) -> None:
-        self.ytypItems |= YtypParser.readYtypDirectory(self.getOutputDirMetadata(reflection))
+        self.ytypItems.add(YtypParser.readYtypDirectory(self.getOutputDirMetadata(reflection)))
 
     def copyTextureDictionaries(self):
         texturesDir = os.path.join(os.path.dirname(__file__), "textures")
@@ -1,19 +1,20 @@
 import os
-import re
 
 from natsort import natsorted
 
+from common.Metrics import Metrics
 from common.Util import Util
-from common.ytyp.YtypItem import YtypItem
+from common.ymap.YmapParser import YmapParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class Manifest:
-    ytypItems: dict[str, YtypItem]
+    ytypItems: ArchetypeRegistry
     imapsToYtyps: dict[str, set[str]]
     mapsDir: str
     metadataDir: str
 
-    def __init__(self, ytypItems: dict[str, YtypItem], mapsDir: str, metadataDir: str):
+    def __init__(self, ytypItems: ArchetypeRegistry, mapsDir: str, metadataDir: str):
         self.ytypItems = ytypItems
         self.mapsDir = mapsDir
         self.metadataDir = metadataDir
@@ -24,17 +25,15 @@ class Manifest:
             if not filename.endswith(".ymap.xml"):
                 continue
 
-            file = open(os.path.join(self.mapsDir, filename), 'r')
-            content = file.read()
-            file.close()
+            content = Util.readFile(os.path.join(self.mapsDir, filename))
 
             self.parseYmapContent(Util.getMapnameFromFilename(filename), content)
 
     def parseYmapContent(self, mapName: str, content: str):
         ytyps = set()
 
-        for match in re.finditer('<Item type="CEntityDef">\\s*<archetypeName>([^<]+)</archetypeName>', content):
-            archetypeName = match.group(1).lower()
+        for entity in YmapParser.iterateEntitiesOfContent(content):
+            archetypeName = entity.archetypeName.lower()
 
             if archetypeName not in self.ytypItems:
                 print("WARNING: could not find archetype " + archetypeName + ". Proceeding without it but that means it is missing in manifest.")
@@ -74,4 +73,5 @@ class Manifest:
 	<Interiors/>
 </CPackFileMetaData>""")
 
+        Metrics.addFileWritten(file.tell())
         file.close()
@@ -0,0 +1,163 @@
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from common.Box import Box
+from common.Sphere import Sphere
+from common.Util import Util
+from common.texture.UV import UV
+
+
+class ModelWriter:
+    # Writes the .mesh and .odr files of LOD and SLOD models. The vertices and indices of a geometry are formatted in bulk
+    # (as numpy.savetxt does, i.e. one format string for many vertices) and a .mesh file is written part by part while
+    # formatting (see Util.writeFileParts), so that the whole content never has to be in memory at once.
+    # The output is the same as replacing the placeholders of the templates and formatting every float with Util.floatToStr.
+
+    # number of vertices (or planes of SLOD models or lines of indices) formatted at once
+    CHUNK_SIZE = 4096
+
+    NUM_INDICES_PER_LINE = 15
+
+    templateMesh: str
+    templateMeshAabb: str
+    templateMeshGeometry: str
+    templateOdr: str
+
+    def __init__(self, templateMesh: str, templateMeshAabb: str, templateMeshGeometry: str, templateOdr: str):
+        self.templateMesh = templateMesh
+        self.templateMeshAabb = templateMeshAabb
+        self.templateMeshGeometry = templateMeshGeometry
+        self.templateOdr = templateOdr
+
+    def writeMesh(self, path: str, bounds: list[Box], geometries: list[Iterable[str]]):
+        # geometries as returned by createGeometry
+        Util.writeFileParts(path, self.createMeshParts(bounds, geometries))
+
+    def createMeshParts(self, bounds: list[Box], geometries: list[Iterable[str]]) -> Iterator[str]:
+        beforeBounds, afterBounds = self.templateMesh.split("${BOUNDS}\n", 1)
+        beforeGeometries, afterGeometries = afterBounds.split("${GEOMETRIES}\n", 1)
+
+        yield beforeBounds
+        for box in bounds:
+            yield self.createAabb(box)
+        yield beforeGeometries
+        for geometry in geometries:
+            yield from geometry
+        yield afterGeometries
+
+    def createGeometry(self, shaderIndex: int, vertexDeclaration: str, numIndices: int, indices: Iterable[str], numVertices: int, vertices: Iterable[str]) -> Iterator[str]:
+        # indices and vertices as returned by formatIndices and formatLodVertices or formatSlodVertices.
+        # nothing is formatted until the mesh is written
+        beforeIndices, afterIndices = self.templateMeshGeometry.split("${INDICES}", 1)
+        beforeVertices, afterVertices = afterIndices.split("${VERTICES}\n", 1)
+
+        yield beforeIndices \
+            .replace("${SHADER_INDEX}", str(shaderIndex)) \
+            .replace("${VERTEX_DECLARATION}", vertexDeclaration) \
+            .replace("${INDICES.NUM}", str(numIndices))
+        yield from indices
+        yield beforeVertices.replace("${VERTICES.NUM}", str(numVertices))
+        yield from vertices
+        yield afterVertices
+
+    def createAabb(self, bbox: Box) -> str:
+        return self.templateMeshAabb \
+            .replace("${BBOX.MIN.X}", Util.floatToStr(bbox.min[0])) \
+            .replace("${BBOX.MIN.Y}", Util.floatToStr(bbox.min[1])) \
+            .replace("${BBOX.MIN.Z}", Util.floatToStr(bbox.min[2])) \
+            .replace("${BBOX.MAX.X}", Util.floatToStr(bbox.max[0])) \
+            .replace("${BBOX.MAX.Y}", Util.floatToStr(bbox.max[1])) \
+            .replace("${BBOX.MAX.Z}", Util.floatToStr(bbox.max[2]))
+
+    def writeOdr(self, path: str, bbox: Box, bsphere: Sphere, meshFilename: str, shaders: str):
+        contentModelOdr = self.templateOdr \
+            .replace("${BBOX.MIN.X}", Util.floatToStr(bbox.min[0])) \
+            .replace("${BBOX.MIN.Y}", Util.floatToStr(bbox.min[1])) \
+            .replace("${BBOX.MIN.Z}", Util.floatToStr(bbox.min[2])) \
+            .replace("${BBOX.MAX.X}", Util.floatToStr(bbox.max[0])) \
+            .replace("${BBOX.MAX.Y}", Util.floatToStr(bbox.max[1])) \
+            .replace("${BBOX.MAX.Z}", Util.floatToStr(bbox.max[2])) \
+            .replace("${BSPHERE.CENTER.X}", Util.floatToStr(bsphere.center[0])) \
+            .replace("${BSPHERE.CENTER.Y}", Util.floatToStr(bsphere.center[1])) \
+            .replace("${BSPHERE.CENTER.Z}", Util.floatToStr(bsphere.center[2])) \
+            .replace("${BSPHERE.RADIUS}", Util.floatToStr(bsphere.radius)) \
+            .replace("${MESH_FILENAME}", meshFilename) \
+            .replace("${SHADERS}\n", shaders)
+
+        Util.writeFile(path, contentModelOdr)
+
+    @staticmethod
+    def formatIndices(indices: list[int]) -> Iterator[str]:
+        # NUM_INDICES_PER_LINE indices per line, without a line break after the last line
+        indices = np.asarray(indices, dtype=int).tolist()
+        chunkSize = ModelWriter.CHUNK_SIZE * ModelWriter.NUM_INDICES_PER_LINE
+        for start in range(0, len(indices), chunkSize):
+            lines = []
+            for lineStart in range(start, min(start + chunkSize, len(indices)), ModelWriter.NUM_INDICES_PER_LINE):
+                lines.append("\t\t\t\t" + " ".join(map(str, indices[lineStart:lineStart + ModelWriter.NUM_INDICES_PER_LINE])))
+            yield ("\n" if start > 0 else "") + "\n".join(lines)
+
+    @staticmethod
+    def formatLodVertices(vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], translation: list[float]) -> Iterator[str]:
+        if len(vertices) == 0:
+            return
+
+        vertices = np.asarray(vertices, dtype=float) + np.asarray(translation, dtype=float)
+        normals = ModelWriter.normalize(np.asarray(normals, dtype=float))
+        textureUVs = np.asarray(textureUVs, dtype=float)
+
+        lineFormat = "\t\t\t\t%.8f %.8f %.8f / %.8f %.8f %.8f / 255 0 255 255 / %.8f %.8f\n"
+        values = np.column_stack((vertices, normals, textureUVs))
+        for start in range(0, len(values), ModelWriter.CHUNK_SIZE):
+            chunk = values[start:start + ModelWriter.CHUNK_SIZE]
+            yield (lineFormat * len(chunk)) % tuple(chunk.ravel().tolist())
+
+    @staticmethod
+    def formatSlodVertices(vertices: list[list[float]], sizes: list[list[float]], textureUVs: list[list[UV]], translation: list[float]) -> Iterator[str]:
+        # four vertices (one plane facing the camera) per given vertex
+        if len(vertices) == 0:
+            return
+
+        uvs = []
+        for i in range(len(vertices)):
+            uvMin = textureUVs[i][0]
+            uvMax = textureUVs[i][1]
+
+            # for a bit more variety randomly flip/mirror the texture
+            # yields same result for multiple runs and different SLOD levels (therefore do not use the translated vertex)
+            xyHash = Util.hashFloat(vertices[i][0]) ^ Util.hashFloat(vertices[i][1])
+            if xyHash % 2 == 0:
+                uvs.append([uvMax.u, uvMin.u, uvMin.v, uvMax.v])
+            else:
+                uvs.append([uvMin.u, uvMax.u, uvMin.v, uvMax.v])
+
+        centers = np.asarray(vertices, dtype=float) + np.asarray(translation, dtype=float)
+        sizes = np.asarray(sizes, dtype=float)
+        uvs = np.asarray(uvs, dtype=float)
+        minU, maxU, minV, maxV = uvs.T
+
+        planeFormat = ""
+        columns = []
+        for normal, uvPosition, u, v in [
+            ([-1, -0.1, 0], [0, 1], minU, maxV),
+            ([1, -0.1, 0], [1, 1], maxU, maxV),
+            ([1, 0, 1], [1, 0], maxU, minV),
+            ([-1, 0, 1], [0, 0], minU, minV)
+        ]:
+            planeFormat += "\t\t\t\t%.8f %.8f %.8f / " + Util.vectorToStr(Util.normalize(normal)) + " / 255 0 255 255 / 0 0 255 0 / " + \
+                Util.vectorToStr(uvPosition) + " / %.8f %.8f / %.8f %.8f / " + Util.vectorToStr([1, 1]) + "\n"
+            columns += [centers, u, v, sizes]
+
+        values = np.column_stack(columns)
+        for start in range(0, len(values), ModelWriter.CHUNK_SIZE):
+            chunk = values[start:start + ModelWriter.CHUNK_SIZE]
+            yield (planeFormat * len(chunk)) % tuple(chunk.ravel().tolist())
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        # same as Util.normalize for every row. the norms are calculated by a dot product of every row with itself
+        # (as numpy.linalg.norm does for a single vector) which may differ in the last bit from summing up the squares
+        norms = (vectors[:, np.newaxis, :] @ vectors[:, :, np.newaxis]).ravel() ** 0.5
+        isZero = np.abs(norms) < 1e-8
+        return np.where(isZero[:, np.newaxis], vectors, vectors / np.where(isZero, 1, norms)[:, np.newaxis])
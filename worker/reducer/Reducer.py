@@ -1,15 +1,16 @@
 import math
-from re import Match
 from natsort import natsorted
 from typing import Optional
 import numpy as np
 import os
 import re
 
+from common.ProcessPool import ProcessPool
 from common.Util import Util
+from common.ymap.EntityDefItem import EntityDefItem
+from common.ymap.EntityTable import EntityTable
 from common.ymap.Ymap import Ymap
-from common.ytyp.YtypItem import YtypItem
-from common.ytyp.YtypParser import YtypParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class Reducer:
@@ -19,21 +20,17 @@ class Reducer:
     defaultReducerResolution = 30.0
 
     defaultYmapPart: str
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
     prefix: str
     reducerResolution: float
     adaptScaling: bool
+    tiledClustering: bool
+    pointsToKeep: list[list[int]]
+    jobs: int
 
-    _PATTERN = re.compile(
-        '([\t ]*<Item type="CEntityDef">' +
-        '\\s*<archetypeName>([^<]+)</archetypeName>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*<scaleXY value=")([^"]+)("/>' +
-        '\\s*<scaleZ value=")([^"]+)("/>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*</Item>[\r\n]+)'
+    _PATTERN_SCALE = re.compile(
+        '(<scaleXY value=")[^"]+("/>' +
+        '\\s*<scaleZ value=")[^"]+("/>)'
     )
 
     groups = [
@@ -47,12 +44,16 @@ class Reducer:
         ("")  # everything else
     ]
 
-    def __init__(self, inputDir: str, outputDir: str, prefix: str, reducerResolution: Optional[float], adaptScaling: bool):
+    def __init__(self, inputDir: str, outputDir: str, prefix: str, reducerResolution: Optional[float], adaptScaling: bool, ytypItems: Optional[ArchetypeRegistry] = None, jobs: int = 1,
+            tiledClustering: bool = False):
         self.inputDir = inputDir
         self.outputDir = outputDir
         self.prefix = prefix
         self.reducerResolution = reducerResolution if reducerResolution else self.defaultReducerResolution
         self.adaptScaling = adaptScaling
+        self.ytypItems = ytypItems
+        self.jobs = jobs
+        self.tiledClustering = tiledClustering
 
     def run(self):
         print("running reducer...")
@@ -63,20 +64,23 @@ class Reducer:
         print("reducer DONE")
 
     def readYtyps(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "../..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
 
     def createOutputDir(self):
-        if os.path.exists(self.outputDir):
+        if Util.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
-        os.makedirs(self.outputDir)
+        Util.makeDirs(self.outputDir)
 
-    def calculatePointsToKeep(self, points: list[list[float]]) -> list[int]:
+    def calculatePointsToKeep(self, points: np.ndarray) -> list[int]:
         numPoints = len(points)
         if numPoints == 0:
             return []
+        elif numPoints == 1:
+            return [1]
 
-        clustering, unused, unused = Util.performClusteringMaxFurthestDistance(points, self.reducerResolution)
+        clustering, unused, unused = Util.performClusteringMaxFurthestDistance(points, self.reducerResolution, self.tiledClustering)
 
         clusterSizes = np.bincount(clustering)
 
@@ -124,72 +128,56 @@ class Reducer:
     def processFiles(self):
         numGroups = len(self.groups)
 
-        coords = []
-        for group in range(numGroups):
-            coords.append([])
-
-        countMaps = 0
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            countMaps += 1
-            print("\treading " + filename)
-
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
+        table = EntityTable.readDirectory(self.inputDir)
+        for mapName in table.mapNames:
+            print("\treading " + Util.getFilenameFromMapname(mapName))
+        countMaps = len(table.mapNames)
 
-            for matchobj in re.finditer(Reducer._PATTERN, content):
-                archetypeName = matchobj.group(2)
-                scaling = [float(matchobj.group(6)), float(matchobj.group(6)), float(matchobj.group(8))]
-                group = self.determineGroup(archetypeName, scaling)
-                if group < 0:
-                    continue
+        entityGroups = np.array([self.determineGroup(archetypeName) for archetypeName in table.archetypeNames], dtype=int)[table.entities["archetype"]]
+        positions = table.getPositions()
 
-                coords[group].append([float(matchobj.group(3)), float(matchobj.group(4)), float(matchobj.group(5))])
+        coords = []
+        for group in range(numGroups):
+            coords.append(positions[entityGroups == group])
 
         if not coords:
             return
 
         print("\treducing of " + str(countMaps) + " ymap files and in total " + str(len(coords)) + " entities")
 
-        pointsToKeep = []
+        self.pointsToKeep = []
         for group in range(numGroups):
-            pointsToKeep.append(self.calculatePointsToKeep(coords[group]))
-
-        counter = [0] * numGroups
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
+            self.pointsToKeep.append(self.calculatePointsToKeep(coords[group]))
 
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
+        # index of the first entity of each group per ymap file within pointsToKeep, so that files can be written independently
+        grouped = entityGroups >= 0
+        countsPerMap = np.zeros((countMaps, numGroups), dtype=int)
+        np.add.at(countsPerMap, (table.entities["map"][grouped], entityGroups[grouped]), 1)
+        counterPerMap = np.cumsum(countsPerMap, axis=0) - countsPerMap
 
-            content_new = re.sub(Reducer._PATTERN, lambda match: self.repl(match, pointsToKeep, counter), content)
+        filenames = [filename for filename in natsorted(Util.listDir(self.inputDir)) if filename.endswith(".ymap.xml")]
+        tasks = ((filename, Util.readFile(os.path.join(self.inputDir, filename)), counterPerMap[i].tolist()) for i, filename in enumerate(filenames))
 
-            content_new = Ymap.calculateAndReplaceLodDistance(content_new, self.ytypItems)
-            content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
+        for filename, content_new in zip(filenames, ProcessPool.map(self, "processFile", tasks, self.jobs)):
+            Util.writeFile(os.path.join(self.outputDir, filename.lower()), content_new)
 
-            f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-            f.write(content_new)
-            f.close()
+    def processFile(self, filename: str, content: str, counter: list[int]) -> str:
+        return Ymap.rewrite(content, self.ytypItems, lambda entity, entityContent: self.repl(entity, entityContent, self.pointsToKeep, counter))
 
-    def repl(self, matchobj: Match, pointsToKeep: list[list[int]], counter: list[int]) -> str:
-        archetypeName = matchobj.group(2)
-        scaling = [float(matchobj.group(6)), float(matchobj.group(6)), float(matchobj.group(8))]
+    def repl(self, entity: EntityDefItem, entityContent: str, pointsToKeep: list[list[int]], counter: list[int]) -> str:
+        archetypeName = entity.archetypeName
+        scaling = entity.scale
 
-        group = self.determineGroup(archetypeName, scaling)
+        group = self.determineGroup(archetypeName)
         if group < 0:
-            return matchobj.group(0)
+            return entityContent
 
         i = counter[group]
         counter[group] += 1
         if pointsToKeep[group][i] == 0:
             return ""
         elif not self.adaptScaling or group != 0:
-            return matchobj.group(0)
+            return entityContent
 
         # TODO consider scaleZ for position update (depending on rotation and offsetZ; see z-fixer)
         # TODO take into account the total area divided by the area of this entity
@@ -207,13 +195,13 @@ class Reducer:
         scaleXY = scaling[0] * max(scaleXY, 1)  # ensure scaling does not decrease
         scaleZ = scaling[2] * max(scaleZ, 1)  # ensure scaling does not decrease
 
-        return matchobj.group(1) + str(scaleXY) + matchobj.group(7) + str(scaleZ) + matchobj.group(9)
+        return Reducer._PATTERN_SCALE.sub(lambda match: match.group(1) + str(scaleXY) + match.group(2) + str(scaleZ) + match.group(3), entityContent, 1)
 
     def copyOthers(self):
         # copy other files
         Util.copyFiles(self.inputDir, self.outputDir, lambda filename: not filename.endswith(".ymap.xml"))
 
-    def determineGroup(self, archetypeName: str, scaling: list[float]) -> int:
+    def determineGroup(self, archetypeName: str) -> int:
         for group in range(len(self.groups)):
             if archetypeName.startswith(self.groups[group]):
                 return group
@@ -1,30 +1,48 @@
 from re import Match
+from typing import Optional
 from natsort import natsorted
 import numpy as np
 import transforms3d
 import os
 import re
 
+from common.BuildCache import BuildCache
 from common.Util import Util
 from common.ymap.Flag import Flag
 from common.ymap.LodLevel import LodLevel
 from common.ymap.Ymap import Ymap
-from common.ytyp.YtypItem import YtypItem
-from common.ytyp.YtypParser import YtypParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class Sanitizer:
     identityQuaternion = [1, -0, -0, -0]
 
+    _PATTERN_ENTITY = re.compile('(<Item type="CEntityDef">' +
+                                 '\\s*<archetypeName>)([^<]+)(</archetypeName>' +
+                                 '\\s*<flags value=")([^"]+)("\\s*/>' +
+                                 '(?:\\s*<[^/].*>)*?' +
+                                 '\\s*<rotation )x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"(/>' +
+                                 '(?:\\s*<[^/].*>)*?' +
+                                 '\\s*<childLodDist value=")[^"]+("/>' +
+                                 '\\s*<lodLevel>)([^<]+)(</lodLevel>' +
+                                 '\\s*<numChildren value="([^"]+)"/>' +
+                                 '(?:\\s*<[^/].*>)*?' +
+                                 '\\s*</Item>)', flags=re.M)
+
     inputDir: str
     outputDir: str
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
     lowercaseYtypItems: dict[str, str]
     fixedArchetypeNames: set[str]
+    jobs: int
+    buildCache: Optional[BuildCache]
 
-    def __init__(self, inputDir: str, outputDir: str):
+    def __init__(self, inputDir: str, outputDir: str, ytypItems: Optional[ArchetypeRegistry] = None, jobs: int = 1, buildCache: Optional[BuildCache] = None):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.ytypItems = ytypItems
+        self.jobs = jobs
+        self.buildCache = buildCache
 
     def run(self):
         print("running sanitizer...")
@@ -35,13 +53,14 @@ class Sanitizer:
         print("sanitizer DONE")
 
     def createOutputDir(self):
-        if os.path.exists(self.outputDir):
+        if Util.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
-        os.makedirs(self.outputDir)
+        Util.makeDirs(self.outputDir)
 
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
         self.lowercaseYtypItems = dict((k.lower(), k) for k, v in self.ytypItems.items())
 
     def repl(self, match: Match, fixedArchetypeNames: set[str]) -> str:
@@ -93,40 +112,24 @@ class Sanitizer:
                match.group(11) + lodLevel + match.group(13)
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml"):
-                self.processFile(filename)
+        filenames = [filename for filename in natsorted(Util.listDir(self.inputDir)) if filename.endswith(".ymap.xml")]
+        tasks = ((filename, Util.readFile(os.path.join(self.inputDir, filename))) for filename in filenames)
 
-    def processFile(self, filename: str):
-        print("\tprocessing " + filename)
+        for filename, content_new in zip(filenames, BuildCache.map(self.buildCache, "sanitizer", [], self, "processFile", tasks, self.jobs)):
+            Util.writeFile(os.path.join(self.outputDir, filename.lower()), content_new)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
+    def processFile(self, filename: str, content: str) -> str:
+        print("\tprocessing " + filename)
 
         fixedArchetypeNames = set()
-        content_new = re.sub('(<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>)([^<]+)(</archetypeName>' +
-                             '\\s*<flags value=")([^"]+)("\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<rotation )x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"(/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<childLodDist value=")[^"]+("/>' +
-                             '\\s*<lodLevel>)([^<]+)(</lodLevel>' +
-                             '\\s*<numChildren value="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>)', lambda match: self.repl(match, fixedArchetypeNames), content, flags=re.M)
+        content_new = Ymap.rewrite(content, self.ytypItems,
+            lambda entity, entityContent: Sanitizer._PATTERN_ENTITY.sub(lambda match: self.repl(match, fixedArchetypeNames), entityContent),
+            filename.lower()[:-9])
 
         for fixed in natsorted(fixedArchetypeNames):
             print("\t\t" + fixed)
 
-        content_new = Ymap.replaceName(content_new, filename.lower()[:-9])
-        content_new = Ymap.calculateAndReplaceLodDistance(content_new, self.ytypItems)
-        content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
-
-        f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-        f.write(content_new)
-        f.close()
+        return content_new
 
     def copyOthers(self):
         # copy other files
@@ -229,12 +229,15 @@ class BoundComposite:
             return
 
         file = open(path, 'w')
+        self.write(file)
+        file.close()
+
+    def write(self, file: IO):
         self.writeHeader(file)
         self.writeChildren(file)
         self.writeChildTransforms(file)
         self.writeChildFlags(file)
         file.write("}\n")
-        file.close()
 
     def writeHeader(self, file: IO):
         boundingGeometry = self.computeBoundingGeometry()
@@ -1,6 +1,7 @@
 import copy
+import io
 from re import Match
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 
@@ -9,8 +10,12 @@ import re
 
 from natsort import natsorted
 
+from common.BuildCache import BuildCache
+from common.ClusterCountSearch import ClusterCountSearch
 from common.Util import Util
+from common.ymap.EntityTable import EntityTable
 from common.ymap.Flag import Flag
+from common.ymap.LodLevel import LodLevel
 from worker.static_col_creator.BoundComposite import BoundComposite
 
 
@@ -22,6 +27,9 @@ class StaticCollisionCreator:
 
     inputDir: str
     outputDir: str
+    modelsDir: str
+    jobs: int
+    buildCache: Optional[BuildCache]
 
     _shouldArchetypeBeUsedInStaticCol: dict[str, bool]
     _entityColModels: dict[str, BoundComposite]
@@ -30,24 +38,12 @@ class StaticCollisionCreator:
     _entityIndex: int
     _clusters: Any
 
-    @staticmethod
-    def getRegExYmapCEntityDef():
-        return '\\s*<Item type="CEntityDef">' + \
-               '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-               '\\s*<flags value="([^"]+)"\\s*/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' + \
-               '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"\\s*/>' + \
-               '\\s*<scaleXY value="([^"]+)"\\s*/>' + \
-               '\\s*<scaleZ value="([^"]+)"\\s*/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<lodLevel>LODTYPES_DEPTH_(?:ORPHAN)?HD</lodLevel>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
-
-    def __init__(self, inputDir: str, outputDir: str):
+    def __init__(self, inputDir: str, outputDir: str, jobs: int = 1, buildCache: Optional[BuildCache] = None, modelsDir: Optional[str] = None):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.modelsDir = os.path.join(os.path.dirname(__file__), "..", "..", "resources", "models") if modelsDir is None else modelsDir
+        self.jobs = jobs
+        self.buildCache = buildCache
         self._shouldArchetypeBeUsedInStaticCol = {}
         self._entityColModels = {}
 
@@ -211,13 +207,13 @@ class StaticCollisionCreator:
 		}"""
 
     def getColModelPathCandidate(self, entity: str) -> str:
-        return os.path.join(os.path.dirname(__file__), "..", "..", "resources", "models", entity.lower(), entity.lower() + ".bound")
+        return os.path.join(self.modelsDir, entity.lower(), entity.lower() + ".bound")
 
     def isExistColModel(self, entity: str) -> bool:
         return os.path.exists(self.getColModelPathCandidate(entity))
 
     def getSkelModelPathCandidate(self, entity: str) -> str:
-        return os.path.join(os.path.dirname(__file__), "..", "..", "resources", "models", entity.lower(), entity.lower() + ".skel")
+        return os.path.join(self.modelsDir, entity.lower(), entity.lower() + ".skel")
 
     def isExistSkelModel(self, entity: str) -> bool:
         return os.path.exists(self.getSkelModelPathCandidate(entity))
@@ -229,35 +225,33 @@ class StaticCollisionCreator:
 
         return self._shouldArchetypeBeUsedInStaticCol[archetype]
 
-    def shouldEntityBeUsedInStaticCol(self, entity: str, flags: int, scale: list[float]) -> bool:
-        if not self.shouldArchetypeBeUsedInStaticCol(entity):
-            return False
+    def shouldEntitiesBeUsedInStaticCol(self, entities: EntityTable) -> np.ndarray:
+        used = entities.maskArchetypes(lambda archetypeName: self.shouldArchetypeBeUsedInStaticCol(archetypeName.lower()))
 
-        if not StaticCollisionCreator.IGNORE_PREVIOUS_FLAG_DISABLE_EMBEDED_COLLISION and flags & Flag.DISABLE_EMBEDDED_COLLISION:
-            return False
+        if not StaticCollisionCreator.IGNORE_PREVIOUS_FLAG_DISABLE_EMBEDED_COLLISION:
+            used &= (entities.entities["flags"] & Flag.DISABLE_EMBEDDED_COLLISION) == 0
 
-        if StaticCollisionCreator.IGNORE_IF_SCALING_IS_IDENTITY and scale == [1, 1, 1]:
-            return False
+        if StaticCollisionCreator.IGNORE_IF_SCALING_IS_IDENTITY:
+            used &= (entities.entities["scaleXY"] != 1) | (entities.entities["scaleZ"] != 1)
 
-        return True
+        return used
 
-    def replaceYmapCEntityDef(self, match: Match) -> str:
-        entity = match.group(1).lower()
-        flags = int(match.group(2))
+    def replaceYmapCEntityDef(self, entities: EntityTable, index: int, usedInStaticCol: bool, entityContent: str) -> str:
+        entity = entities.getArchetypeName(index).lower()
+        flags = int(entities.entities["flags"][index])
 
-        scale = [float(match.group(10)), float(match.group(10)), float(match.group(11))]
-
-        if not self.shouldEntityBeUsedInStaticCol(entity, flags, scale):
+        if not usedInStaticCol:
             if StaticCollisionCreator.IGNORE_PREVIOUS_FLAG_DISABLE_EMBEDED_COLLISION:
                 flags &= ~Flag.DISABLE_EMBEDDED_COLLISION
-                return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", match.group(0), flags=re.M)
+                return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", entityContent, count=1, flags=re.M)
             else:
-                return match.group(0)
+                return entityContent
 
         flags |= Flag.DISABLE_EMBEDDED_COLLISION
 
-        position = [float(match.group(3)), float(match.group(4)), float(match.group(5))]
-        rotationQuaternion = [float(match.group(9)), -float(match.group(6)), -float(match.group(7)), -float(match.group(8))]  # order is w, -x, -y, -z
+        position = entities.getPositions()[index].tolist()
+        rotationQuaternion = entities.getRotations()[index].tolist()  # order is w, -x, -y, -z
+        scale = entities.getScales()[index].tolist()
 
         boundComposite = self.getEntityColModel(entity)
 
@@ -268,7 +262,7 @@ class StaticCollisionCreator:
 
         self.mergeColChildren(cluster, boundComposite)
 
-        return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", match.group(0), flags=re.M)
+        return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", entityContent, count=1, flags=re.M)
 
     def getEntityColModel(self, entity: str) -> BoundComposite:
         if entity not in self._entityColModels:
@@ -392,37 +386,24 @@ class StaticCollisionCreator:
         self._colChildren[cluster].merge(boundComposite)
 
     def processFiles(self):
-        for mapFilename in natsorted(os.listdir(self.inputDir)):
-            if not mapFilename.endswith(".ymap.xml"):
-                continue
+        mapFilenames = [mapFilename for mapFilename in natsorted(Util.listDir(self.inputDir)) if mapFilename.endswith(".ymap.xml")]
+        tasks = ((mapFilename, Util.readFile(os.path.join(self.inputDir, mapFilename))) for mapFilename in mapFilenames)
 
-            self.processFile(mapFilename)
+        for mapFilename, (mapContentNew, colContents) in zip(mapFilenames, BuildCache.map(self.buildCache, "staticCol", [ClusterCountSearch.MINI_BATCH_MIN_POINTS, ClusterCountSearch.WARM_START], self, "processFile", tasks, self.jobs)):
+            Util.writeFile(os.path.join(self.getOutputDirMaps(), mapFilename), mapContentNew)
+            for colFilename, colContent in colContents.items():
+                Util.writeFile(os.path.join(self.getOutputDirCollisionModels(), colFilename), colContent)
 
-    def processFile(self, mapFilename: str):
+    # returns the adapted map content and the content of the collision models of that map
+    def processFile(self, mapFilename: str, mapContent: str) -> (str, dict[str, str]):
         print("\tprocessing " + mapFilename)
 
-        mapFile = open(os.path.join(self.inputDir, mapFilename), 'r')
-        mapContent = mapFile.read()
-        mapFile.close()
+        entities = EntityTable.readContent(mapContent, Util.getMapnameFromFilename(mapFilename))
+        entities = entities.select(entities.maskLodLevels([LodLevel.HD, LodLevel.ORPHAN_HD]))
+        usedInStaticCol = self.shouldEntitiesBeUsedInStaticCol(entities)
 
         # <!-- clustering
-        pattern = re.compile('[\t ]*<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '\\s*<flags value="([^"]+)"\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<scaleXY value="([^"]+)"/>' +
-                             '\\s*<scaleZ value="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<lodLevel>LODTYPES_DEPTH_(?:ORPHAN)?HD</lodLevel>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>[\r\n]+')
-
-        coords = []
-        for matchobj in re.finditer(pattern, mapContent):
-            if self.shouldEntityBeUsedInStaticCol(matchobj.group(1).lower(), int(matchobj.group(2)), [float(matchobj.group(6)), float(matchobj.group(7))]):
-                coords.append([float(matchobj.group(3)), float(matchobj.group(4)), float(matchobj.group(5))])
+        coords = entities.getPositions()[usedInStaticCol]
 
         foundScolModel = len(coords) > 0
 
@@ -440,14 +421,20 @@ class StaticCollisionCreator:
         # end of clustering -->
 
         self._entityIndex = 0
-        mapContentNew = re.sub(StaticCollisionCreator.getRegExYmapCEntityDef(), self.replaceYmapCEntityDef, mapContent, flags=re.M)
-
-        mapFileNew = open(os.path.join(self.getOutputDirMaps(), mapFilename), 'w')
-        mapFileNew.write(mapContentNew)
-        mapFileNew.close()
+        parts = []
+        last = 0
+        for i in range(len(entities)):
+            start, end = entities.entities["start"][i], entities.entities["end"][i]
+            parts.append(mapContent[last:start])
+            parts.append(self.replaceYmapCEntityDef(entities, i, usedInStaticCol[i], mapContent[start:end]))
+            last = end
+        parts.append(mapContent[last:])
+        mapContentNew = "".join(parts)
+
+        colContents = {}
 
         if not foundScolModel:
-            return
+            return mapContentNew, colContents
 
         mapName = Util.getMapnameFromFilename(mapFilename)
 
@@ -478,7 +465,12 @@ class StaticCollisionCreator:
                     colFilename = colDefaultFilename
                     bound = boundDefault
 
-                bound.writeToFile(os.path.join(self.getOutputDirCollisionModels(), colFilename))
+                if len(bound.children) == 0:
+                    continue
+
+                colContent = io.StringIO()
+                bound.write(colContent)
+                colContents[colFilename] = colContent.getvalue()
 
         # colItems = ""
         # for i in range(numClusters):
@@ -494,6 +486,8 @@ class StaticCollisionCreator:
         #		manifestFile.write(line)
         # manifestFile.close()
 
+        return mapContentNew, colContents
+
     def copyOthers(self):
         # copy other files
         Util.copyFiles(self.inputDir, self.getOutputDirMaps(), lambda filename: not filename.endswith(".ymap.xml"))
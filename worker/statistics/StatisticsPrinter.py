@@ -1,20 +1,22 @@
 import os
-import re
+from typing import Optional
 
 from natsort import natsorted
 
+from common.Util import Util
 from common.ymap.LodLevel import LodLevel
-from common.ytyp.YtypItem import YtypItem
-from common.ytyp.YtypParser import YtypParser
+from common.ymap.YmapParser import YmapParser
+from common.ytyp.ArchetypeRegistry import ArchetypeRegistry
 
 
 class StatisticsPrinter:
     countProps: dict[str, dict[str, int]]
     inputDir: str
-    ytypItems: dict[str, YtypItem]
+    ytypItems: Optional[ArchetypeRegistry]
 
-    def __init__(self, inputDir: str):
+    def __init__(self, inputDir: str, ytypItems: Optional[ArchetypeRegistry] = None):
         self.inputDir = inputDir
+        self.ytypItems = ytypItems
 
     def run(self):
         self.readYtypItems()
@@ -22,25 +24,19 @@ class StatisticsPrinter:
         self.processFiles()
 
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        if self.ytypItems is None:
+            self.ytypItems = ArchetypeRegistry.readResources()
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if not filename.endswith(".ymap.xml") or filename.endswith("_lod.ymap.xml"):
                 continue
 
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
+            for entity in YmapParser.iterateEntitiesOfFile(os.path.join(self.inputDir, filename)):
+                if entity.lodLevel != LodLevel.HD and entity.lodLevel != LodLevel.ORPHAN_HD:
+                    continue
 
-            expression = '<Item type="CEntityDef">' + \
-                         '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-                         '(?:\\s*<[^/].*>)*?' + \
-                         '\\s*<lodLevel>(?:' + LodLevel.HD + "|" + LodLevel.ORPHAN_HD + ')</lodLevel>' + \
-                         '(?:\\s*<[^/].*>)*?' + \
-                         '\\s*</Item>'
-
-            for match in re.finditer(expression, content):
-                archetypeName = match.group(1).lower()
+                archetypeName = entity.archetypeName.lower()
 
                 if archetypeName in self.ytypItems:
                     ytypName = self.ytypItems[archetypeName].parent
@@ -3,16 +3,17 @@ import math
 import numpy as np
 import os
 import random
-import re
 
 from numpy import ndarray
-from scipy.spatial import Delaunay, KDTree
+from scipy.spatial import Delaunay
 from scipy.spatial.distance import pdist
 import matplotlib.pyplot as pyplot
 
 from natsort import natsorted
 
+from common.SpatialIndex import SpatialIndex
 from common.Util import Util
+from common.ymap.YmapParser import YmapParser
 
 
 class VegetationCreator:
@@ -279,10 +280,10 @@ class VegetationCreator:
         print("vegetation creator DONE")
 
     def createOutputDir(self):
-        if os.path.exists(self.outputDir):
+        if Util.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
-        os.makedirs(self.outputDir)
+        Util.makeDirs(self.outputDir)
 
 
     def readTemplates(self):
@@ -301,7 +302,7 @@ class VegetationCreator:
         mapNames = []
         points = []
         archetypes = []
-        for filename in natsorted(os.listdir(self.inputDir)):
+        for filename in natsorted(Util.listDir(self.inputDir)):
             if filename.endswith(".ymap.xml"):
                 mapNames.append(Util.getMapnameFromFilename(filename))
                 self.processFile(filename, points, archetypes)
@@ -373,7 +374,7 @@ class VegetationCreator:
     @staticmethod
     def computeArchetypeNames(points: list[ndarray], archetypes: list[str]) -> list[str]:
         points2d = np.array(points)[:, :2]
-        kdTree = KDTree(points2d)
+        spatialIndex = SpatialIndex(points2d)
         todo = list(range(len(archetypes), len(points2d)))
         nthClosest = {}
         result = {i: archetypes[i] for i in range(len(archetypes))}
@@ -384,7 +385,7 @@ class VegetationCreator:
                 nthClosestCur = 1
 
             point2d = points2d[i]
-            nearestNeighborIndex = kdTree.query(point2d, nthClosestCur + 1)[1][nthClosestCur]
+            nearestNeighborIndex = spatialIndex.queryNearest(point2d, nthClosestCur + 1)[1][nthClosestCur]
             if nearestNeighborIndex in result:
                 result[i] = VegetationCreator.getRandomArchetypeWithinGroup(result[nearestNeighborIndex])
                 if i in nthClosest:
@@ -435,29 +436,17 @@ class VegetationCreator:
             .replace("${NAME}", mapName) \
             .replace("${ENTITIES}\n", contentEntities)
 
-        fileMap = open(os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)), 'w')
-        fileMap.write(map)
-        fileMap.close()
+        Util.writeFile(os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)), map)
 
     def processFile(self, filename: str, points: list[list[float]], archetypes: list[str]):
         print("\tprocessing " + filename)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
-
-        for match in re.finditer('<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>', content):
-
-            archetypeName = match.group(1)
+        for entity in YmapParser.iterateEntitiesOfFile(os.path.join(self.inputDir, filename)):
+            archetypeName = entity.archetypeName
             if archetypeName not in VegetationCreator.ARCHETYPE_GROUP_MAPPING:
                 continue
 
-            points.append([float(match.group(2)), float(match.group(3)), float(match.group(4))])
+            points.append(entity.position)
             archetypes.append(archetypeName)
 
     def getNewMapName(self, mapNames: list[str]):